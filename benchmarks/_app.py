@@ -0,0 +1,56 @@
+"""
+Utilidades compartidas por los benchmarks.
+
+Construye la app de src.main (create_app) sobre una base SQLite y carpetas
+temporales, para no tocar src/database/app.db.
+"""
+import json
+import os
+import sys
+import tempfile
+from datetime import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def crear_app_benchmark(**config):
+    """Crea una app con base de datos temporal y una capacitación activa todo el día"""
+    from src.main import create_app, inicializar_base_datos, today_co
+    from src.models.asistencia import db, Configuracion
+
+    root = tempfile.mkdtemp(prefix='bench_asistencia_')
+    app = create_app(dict({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(root, 'bench.db')}",
+        'ALMACEN_LOCAL_DIR': os.path.join(root, 'static'),
+        'PDF_CACHE_DIR': os.path.join(root, 'pdf'),
+        'REPORTES_DIR': os.path.join(root, 'reportes'),
+        'LOG_NIVEL': 'WARNING',
+    }, **config))
+
+    with app.app_context():
+        inicializar_base_datos()
+        Configuracion.query.update({'activo': False})
+        db.session.add(Configuracion(
+            nombre_capacitacion='Capacitación Benchmark',
+            ciudad_capacitacion='Bogotá',
+            modalidad_capacitacion='Presencial',
+            hora_inicio=time(0, 0),
+            hora_fin=time(23, 59, 59),
+            fecha_capacitacion=today_co(),
+            asesor_externo=' ',
+        ))
+        db.session.commit()
+
+    return app
+
+
+def app_desde_entorno():
+    """
+    App de src.main sobre la base indicada en BENCH_DATABASE_URI, para
+    servidores que la cargan en otro proceso (gunicorn, servidor de desarrollo).
+    BENCH_CONFIG (JSON, opcional) agrega configuración, p. ej. carpetas temporales.
+    """
+    from src.main import create_app
+    config = json.loads(os.environ.get('BENCH_CONFIG') or '{}')
+    config['SQLALCHEMY_DATABASE_URI'] = os.environ['BENCH_DATABASE_URI']
+    return create_app(config)
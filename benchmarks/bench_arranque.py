@@ -0,0 +1,78 @@
+"""
+Benchmark del arranque en frío de la app (lo que paga cada worker nuevo).
+
+Cada medición corre en un proceso Python nuevo y separa:
+- importar src.main
+- create_app() (sin conexión a la base de datos)
+- primera petición a /api/estado (abre la primera conexión)
+y lo compara con el arranque anterior, que además creaba el esquema y los
+datos iniciales (create_all + migraciones + índices + semilla) al importar.
+También informa si ReportLab quedó cargado.
+
+Uso:
+    python benchmarks/bench_arranque.py --repeticiones 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEDICION = r'''
+import json, sys, time
+inicio = time.perf_counter()
+from src.main import create_app, inicializar_base_datos
+importado = time.perf_counter()
+app = create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1]})
+creado = time.perf_counter()
+if sys.argv[2] == 'ansioso':
+    with app.app_context():
+        inicializar_base_datos()
+inicializado = time.perf_counter()
+respuesta = app.test_client().get('/api/estado')
+primera = time.perf_counter()
+print(json.dumps({
+    'importar_ms': (importado - inicio) * 1000,
+    'create_app_ms': (creado - importado) * 1000,
+    'inicializar_bd_ms': (inicializado - creado) * 1000,
+    'primera_peticion_ms': (primera - inicializado) * 1000,
+    'total_ms': (primera - inicio) * 1000,
+    'status': respuesta.status_code,
+    'reportlab_cargado': 'reportlab' in sys.modules,
+}))
+'''
+
+
+def medir(uri, modo):
+    salida = subprocess.run(
+        [sys.executable, '-c', MEDICION, uri, modo],
+        cwd=RAIZ, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    base = os.path.join(tempfile.mkdtemp(prefix='bench_arranque_'), 'arranque.db')
+    uri = f'sqlite:///{base}'
+    # Esquema creado una vez, como lo haría `flask inicializar-bd` en el despliegue
+    medir(uri, 'ansioso')
+
+    campos = ('importar_ms', 'create_app_ms', 'inicializar_bd_ms', 'primera_peticion_ms', 'total_ms')
+    print(f"{'modo':<10}" + ''.join(f'{campo:>22}' for campo in campos) + f"{'reportlab':>12}")
+    for modo in ('ansioso', 'perezoso'):
+        mediciones = [medir(uri, modo) for _ in range(args.repeticiones)]
+        medianas = {campo: statistics.median(m[campo] for m in mediciones) for campo in campos}
+        reportlab = any(m['reportlab_cargado'] for m in mediciones)
+        print(f'{modo:<10}' + ''.join(f'{medianas[campo]:>22.1f}' for campo in campos) + f'{str(reportlab):>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Benchmark de /api/estado con y sin el snapshot en memoria.
+
+Uso:
+    python benchmarks/bench_estado.py --peticiones 2000
+"""
+import argparse
+import time
+
+from _app import crear_app_benchmark
+from src.services.estado_cache import invalidar_snapshot
+
+
+def medir(app, peticiones):
+    client = app.test_client()
+    client.get('/api/estado')  # calentar
+
+    inicio = time.perf_counter()
+    for _ in range(peticiones):
+        response = client.get('/api/estado')
+        assert response.status_code == 200
+    duracion = time.perf_counter() - inicio
+
+    return peticiones / duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--peticiones', type=int, default=2000)
+    args = parser.parse_args()
+
+    invalidar_snapshot()
+    sin_cache = medir(crear_app_benchmark(ESTADO_CACHE_TTL=0), args.peticiones)
+
+    invalidar_snapshot()
+    con_cache = medir(crear_app_benchmark(), args.peticiones)
+
+    print(f"{'modo':<12}{'req/s':>10}")
+    print(f"{'sin caché':<12}{sin_cache:>10.1f}")
+    print(f"{'con caché':<12}{con_cache:>10.1f}")
+    print(f"mejora: x{con_cache / sin_cache:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark del PDF de varias capacitaciones: construcción serial vs. en paralelo.
+
+Genera capacitaciones sintéticas (sin base de datos) con firmas PNG y mide
+cuánto tarda cada modo para 1, 5 y 20 capacitaciones.
+
+Uso:
+    python benchmarks/bench_pdf_paralelo.py --asistentes 40 --procesos 4
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, time as hora
+from io import BytesIO
+from types import SimpleNamespace
+
+from _app import COLOMBIA_TZ  # noqa: F401  (agrega la raíz del repo a sys.path)
+from PIL import Image, ImageDraw
+
+from src.services.miniaturas import crear_miniatura
+from src.services.reporte_pdf import construir_pdf, construir_pdf_paralelo
+
+CANTIDADES = (1, 5, 20)
+
+
+def crear_firmas(static_dir, cantidad=10):
+    """Firmas sintéticas de 600x200 con trazos, como las del canvas"""
+    rutas = []
+    carpeta = os.path.join(static_dir, 'uploads', 'firmas')
+    os.makedirs(carpeta, exist_ok=True)
+    for i in range(cantidad):
+        imagen = Image.new('RGBA', (600, 200), (0, 0, 0, 0))
+        dibujo = ImageDraw.Draw(imagen)
+        dibujo.line([(20, 150 - i * 5), (200, 40), (380, 160), (580, 30 + i * 5)], fill='black', width=4)
+        nombre = f'firma_{i}.png'
+        imagen.save(os.path.join(carpeta, nombre))
+        rutas.append(f'uploads/firmas/{nombre}')
+    return rutas
+
+
+def crear_secciones(cantidad, asistentes_por_seccion, firmas):
+    secciones = []
+    for n in range(cantidad):
+        config = SimpleNamespace(
+            id=n + 1,
+            nombre_capacitacion=f'Capacitación {n + 1}',
+            ciudad_capacitacion='Bogotá',
+            modalidad_capacitacion='Presencial',
+            hora_inicio=hora(8, 0),
+            hora_fin=hora(10, 0),
+            asesor_externo='Asesor',
+            nombre_empresa='AUTOSNACK SAS',
+        )
+        capacitador = SimpleNamespace(nombre_completo='Capacitador', firma_digital=firmas[0])
+        asistentes = [
+            SimpleNamespace(
+                tipodocumento='CC',
+                numero_documento=str(1000000 + n * 1000 + i),
+                nombres_apellidos=f'Asistente {n}-{i}',
+                cargo='Conductor',
+                ciudad='Bogotá',
+                ruta=str(i % 30),
+                firma_digital=firmas[i % len(firmas)],
+            )
+            for i in range(asistentes_por_seccion)
+        ]
+        secciones.append((config, capacitador, asistentes))
+    return secciones
+
+
+def medir(funcion, *args, **kwargs):
+    inicio = time.perf_counter()
+    funcion(BytesIO(), *args, **kwargs)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--asistentes', type=int, default=40, help='asistentes por capacitación')
+    parser.add_argument('--procesos', type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    static_dir = tempfile.mkdtemp(prefix='bench_pdf_')
+    firmas = crear_firmas(static_dir)
+    miniaturas = {}
+    for ruta in firmas:
+        ruta_miniatura, ancho, alto = crear_miniatura(ruta, static_dir, 'asistente')
+        miniaturas[ruta] = (os.path.join(static_dir, ruta_miniatura), ancho, alto)
+
+    fecha = date.today()
+
+    # Calentar el pool para no medir el arranque de los procesos
+    construir_pdf_paralelo(BytesIO(), crear_secciones(2, 1, firmas), fecha, static_dir, miniaturas,
+                           procesos=args.procesos)
+
+    print(f"CPUs: {os.cpu_count()}  procesos: {args.procesos}  asistentes/capacitación: {args.asistentes}")
+    print(f"{'capacitaciones':<16}{'serial (s)':>12}{'paralelo (s)':>14}{'mejora':>9}")
+    for cantidad in CANTIDADES:
+        secciones = crear_secciones(cantidad, args.asistentes, firmas)
+        serial = medir(construir_pdf, secciones, fecha, static_dir, miniaturas)
+        paralelo = medir(construir_pdf_paralelo, secciones, fecha, static_dir, miniaturas,
+                         procesos=args.procesos)
+        print(f"{cantidad:<16}{serial:>12.3f}{paralelo:>14.3f}{serial / paralelo:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Prueba de carga: servidor de desarrollo (app.run) contra src.servidor (gunicorn).
+
+Levanta cada servidor en un proceso aparte sobre la misma base SQLite
+temporal y lo somete a `--concurrencia` clientes HTTP con conexiones
+persistentes durante `--segundos`. Mezcla de peticiones: 80 % GET
+/api/estado, 10 % GET /api/empleado/<documento> y 10 % POST /api/registrar
+(documentos únicos).
+
+Uso:
+    python benchmarks/bench_servidor.py --concurrencia 32 --segundos 15
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import time as hora
+from urllib.parse import urlencode
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+APP_SPEC = 'benchmarks._app:app_desde_entorno()'
+
+DESARROLLO = (
+    "import sys; sys.path.insert(0, '.'); "
+    "from benchmarks._app import app_desde_entorno; "
+    "app_desde_entorno().run(host='127.0.0.1', port=int(sys.argv[1]), debug=False)"
+)
+
+
+def preparar_base(uri):
+    """Esquema, datos iniciales y una capacitación abierta todo el día"""
+    from src.main import create_app, inicializar_base_datos, today_co
+    from src.models.asistencia import db, Configuracion
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri})
+    with app.app_context():
+        inicializar_base_datos()
+        config = Configuracion.query.first()
+        config.fecha_capacitacion = today_co()
+        config.hora_inicio = hora(0, 0)
+        config.hora_fin = hora(23, 59, 59)
+        config.activo = True
+        db.session.commit()
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def esperar_servidor(puerto, limite=30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=2)
+            conexion.request('GET', '/api/estado')
+            conexion.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'El servidor no respondió en el puerto {puerto}')
+
+
+def cliente(puerto, fin, latencias, errores, lock):
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+    propias = []
+    fallas = 0
+    while time.monotonic() < fin:
+        sorteo = random.random()
+        inicio = time.perf_counter()
+        try:
+            if sorteo < 0.8:
+                conexion.request('GET', '/api/estado')
+            elif sorteo < 0.9:
+                conexion.request('GET', f'/api/empleado/{random.randint(1, 10**9)}')
+            else:
+                cuerpo = urlencode({
+                    'nombres_apellidos': 'Carga Prueba', 'tipodocumento': 'CC',
+                    'numero_documento': uuid.uuid4().hex[:12], 'cargo': 'Operador Movil',
+                    'ruta': 'R1', 'ciudad': 'Bogotá'
+                })
+                conexion.request('POST', '/api/registrar', body=cuerpo,
+                                 headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status >= 500:
+                fallas += 1
+        except (OSError, http.client.HTTPException):
+            fallas += 1
+            conexion.close()
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+            continue
+        propias.append(time.perf_counter() - inicio)
+    conexion.close()
+    with lock:
+        latencias.extend(propias)
+        errores[0] += fallas
+
+
+def cargar(puerto, concurrencia, segundos):
+    latencias, errores, lock = [], [0], threading.Lock()
+    fin = time.monotonic() + segundos
+    hilos = [
+        threading.Thread(target=cliente, args=(puerto, fin, latencias, errores, lock))
+        for _ in range(concurrencia)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    latencias.sort()
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000 if latencias else 0
+    return {
+        'peticiones': len(latencias),
+        'req_s': len(latencias) / segundos,
+        'p50_ms': percentil(0.50),
+        'p95_ms': percentil(0.95),
+        'p99_ms': percentil(0.99),
+        'media_ms': statistics.fmean(latencias) * 1000 if latencias else 0,
+        'errores': errores[0],
+    }
+
+
+def medir(nombre, comando, puerto, entorno, args):
+    proceso = subprocess.Popen(comando, cwd=RAIZ, env=entorno,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_servidor(puerto)
+        resultado = cargar(puerto, args.concurrencia, args.segundos)
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+    resultado['servidor'] = nombre
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrencia', type=int, default=32)
+    parser.add_argument('--segundos', type=float, default=15)
+    parser.add_argument('--clase', choices=('gthread', 'gevent'), default='gthread')
+    parser.add_argument('--json', action='store_true', help='Salida en JSON')
+    args = parser.parse_args()
+
+    uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench_servidor_'), 'carga.db')}"
+    preparar_base(uri)
+    entorno = dict(os.environ, BENCH_DATABASE_URI=uri)
+
+    resultados = []
+    puerto = puerto_libre()
+    resultados.append(medir('desarrollo', [sys.executable, '-c', DESARROLLO, str(puerto)], puerto, entorno, args))
+    puerto = puerto_libre()
+    resultados.append(medir(
+        f'gunicorn-{args.clase}',
+        [sys.executable, '-m', 'src.servidor', '--app', APP_SPEC, '--bind', f'127.0.0.1:{puerto}', '--clase', args.clase],
+        puerto, entorno, args
+    ))
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"{'servidor':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>10}")
+    for r in resultados:
+        print(f"{r['servidor']:<18}{r['req_s']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errores']:>10}")
+    print(f"mejora: x{resultados[1]['req_s'] / max(resultados[0]['req_s'], 1e-9):.2f}")
+
+
+if __name__ == '__main__':
+    main()
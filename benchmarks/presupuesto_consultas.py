@@ -0,0 +1,172 @@
+"""
+Presupuesto de consultas SQL por endpoint (guardia contra N+1).
+
+Siembra la misma base con distintos tamaños (`--tamanos`, asistentes por
+capacitación), llama cada endpoint con src.services.consultas y verifica que:
+- no supere el máximo de consultas fijado en PRESUPUESTOS,
+- la cantidad no crezca con los datos (un N+1 crece con cada fila),
+- no repita una sentencia con los mismos parámetros.
+Sale con código 1 si algo falla y muestra las sentencias repetidas.
+
+Las escrituras de /api/registrar corren en el escritor de SQLite (otro
+hilo) y se cuentan en la petición que las pidió, con el SAVEPOINT y el
+RELEASE de su trabajo.
+
+Las mismas verificaciones corren con pytest (tests/test_presupuesto_consultas.py).
+
+Uso:
+    python benchmarks/presupuesto_consultas.py
+    python benchmarks/presupuesto_consultas.py --tamanos 10,200 --detalle
+    python -m pytest tests
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import uuid
+from urllib.parse import urlencode
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.bench_api import sembrar, data_url, firma_png  # noqa: E402
+
+# (método, ruta, máximo de consultas). {hoy} y {documento} se reemplazan.
+# Las de /api/estado y /api/empleado salen de cachés en memoria (1 = recarga).
+# /api/registrar: 5 sentencias más SAVEPOINT y RELEASE del escritor de SQLite
+PRESUPUESTOS = {
+    'estado': ('GET', '/api/estado', 1),
+    'empleado': ('GET', '/api/empleado/{documento}', 1),
+    'registrar': ('POST', '/api/registrar', 7),
+    'asistentes_api': ('GET', '/api/asistentes?fecha={hoy}', 1),
+    'asistentes': ('GET', '/admin/asistentes?fecha={hoy}', 4),
+    'buscar': ('GET', '/admin/asistentes/buscar?q=Pérez', 1),
+    'dashboard': ('GET', '/admin/dashboard', 1),
+    'configuraciones': ('GET', '/admin/configuraciones/listar?fecha={hoy}', 1),
+    'exportar_csv': ('GET', '/admin/exportar?formato=csv&fecha={hoy}', 1),
+    'generar_pdf': ('GET', '/admin/generar-pdf?fecha={hoy}', 5),
+}
+
+
+def formulario():
+    return urlencode({
+        'nombres_apellidos': 'Presupuesto Consultas',
+        'tipodocumento': 'CC',
+        'numero_documento': str(uuid.uuid4().int % 10**10),
+        'cargo': 'Conductor',
+        'ruta': 'R1',
+        'ciudad': 'Bogotá',
+        'firma_digital': data_url(firma_png('presupuesto')),
+    })
+
+
+def pedir(cliente, metodo, ruta):
+    if metodo == 'POST':
+        return cliente.post(ruta, data=formulario(), content_type='application/x-www-form-urlencoded')
+    respuesta = cliente.get(ruta)
+    respuesta.get_data()  # consumir respuestas en streaming (CSV)
+    return respuesta
+
+
+def medir(tamano, config, directorio):
+    """{endpoint: (status, RegistroConsultas)} sobre una base con `tamano` asistentes por capacitación"""
+    from src.main import create_app, today_co
+    from src.models.asistencia import db, Asistente, Empleado
+    from src.services.consultas import contar_consultas
+    from src.services.empleados import obtener_indice
+    from src.services.estado_cache import invalidar_snapshot
+
+    uri = f"sqlite:///{os.path.join(directorio, f'presupuesto_{tamano}.db')}"
+    sembrar(uri, config, capacitaciones=2, asistentes=tamano, reiniciar=False)
+    invalidar_snapshot()
+
+    app = create_app(dict(config, SQLALCHEMY_DATABASE_URI=uri))
+    cliente = app.test_client()
+    cliente.post('/admin/login', json={'usuario': 'admin', 'password': 'admin123'})
+    with app.app_context():
+        engine = db.engine
+        asistente = Asistente.query.first()
+        documento = asistente.numero_documento
+        # Un empleado de la nómina para /api/empleado (índice del proceso recargado)
+        db.session.add(Empleado(numero_documento=documento, nombres_apellidos=asistente.nombres_apellidos,
+                                cargo=asistente.cargo, ruta=asistente.ruta))
+        db.session.commit()
+        obtener_indice(app.config).invalidar()
+
+    valores = {'hoy': today_co().isoformat(), 'documento': documento}
+    resultados = {}
+    for nombre, (metodo, ruta, _) in PRESUPUESTOS.items():
+        ruta = ruta.format(**valores)
+        # Sin medir: cachés de proceso, miniaturas de las firmas, primer PDF
+        pedir(cliente, metodo, ruta)
+        if nombre == 'generar_pdf':
+            for archivo in glob.glob(os.path.join(config['PDF_CACHE_DIR'], '*.pdf')):
+                os.remove(archivo)
+        with contar_consultas(engine) as registro:
+            respuesta = pedir(cliente, metodo, ruta)
+        resultados[nombre] = (respuesta.status_code, registro)
+    return resultados
+
+
+def configuracion_prueba(directorio):
+    return {
+        'ALMACEN_BACKEND': 'local',
+        'ALMACEN_LOCAL_DIR': os.path.join(directorio, 'static'),
+        'PDF_CACHE_DIR': os.path.join(directorio, 'pdf'),
+        'REPORTES_DIR': os.path.join(directorio, 'reportes'),
+        'LOG_NIVEL': 'ERROR',
+    }
+
+
+def problemas(nombre, mediciones):
+    """Incumplimientos del presupuesto de un endpoint en {tamaño: resultados de medir()}"""
+    maximo = PRESUPUESTOS[nombre][2]
+    encontrados = []
+    for tamano, resultados in mediciones.items():
+        status, registro = resultados[nombre]
+        if status >= 400:
+            encontrados.append(f'status {status} con n={tamano}')
+        if registro.total > maximo:
+            encontrados.append(f'{registro.total} consultas con n={tamano}')
+        if registro.duplicadas():
+            encontrados.append(f'{len(registro.duplicadas())} sentencias duplicadas con n={tamano}')
+    if len({resultados[nombre][1].total for resultados in mediciones.values()}) > 1:
+        encontrados.append('crece con los datos')
+    return encontrados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanos', default='5,100', help='Asistentes por capacitación, separados por coma')
+    parser.add_argument('--detalle', action='store_true', help='Mostrar las sentencias repetidas de cada endpoint')
+    args = parser.parse_args()
+    tamanos = [int(t) for t in args.tamanos.split(',')]
+
+    directorio = tempfile.mkdtemp(prefix='presupuesto_consultas_')
+    config = configuracion_prueba(directorio)
+    mediciones = {tamano: medir(tamano, config, directorio) for tamano in tamanos}
+
+    fallas = []
+    print(f"{'endpoint':<18}{'máximo':>8}" + ''.join(f'{f"n={t}":>9}' for t in tamanos) + '  estado')
+    for nombre, (_, _, maximo) in PRESUPUESTOS.items():
+        totales = [mediciones[t][nombre][1].total for t in tamanos]
+        encontrados = problemas(nombre, mediciones)
+
+        estado = '✅' if not encontrados else '❌ ' + '; '.join(encontrados)
+        print(f'{nombre:<18}{maximo:>8}' + ''.join(f'{total:>9}' for total in totales) + f'  {estado}')
+        if encontrados:
+            fallas.append(nombre)
+        if encontrados or args.detalle:
+            registro = mediciones[tamanos[-1]][nombre][1]
+            if registro.repetidas():
+                print('    ' + registro.resumen().replace('\n', '\n    '))
+
+    if fallas:
+        print(f"\n❌ Fuera de presupuesto: {', '.join(fallas)}")
+        sys.exit(1)
+    print('\n✅ Todos los endpoints dentro del presupuesto')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Verificación de un backend de almacenamiento de firmas (local, bd o s3).
+
+1. Contrato del backend: guardar, leer, existe, listar, tocar, ruta_local
+   (descarga al caché) y borrar sobre un prefijo temporal.
+2. De punta a punta sobre una base SQLite temporal: registro con firma,
+   PDF con las firmas leídas del backend (con el caché local borrado, como
+   en otro nodo) y recolección de firmas huérfanas.
+3. Firma que otro nodo todavía no escribió: el PDF sale sin ella y no se
+   guarda en caché; cuando el original aparece, el siguiente PDF la incluye.
+Sale con código 1 si algo falla.
+
+S3 contra un servidor local (MinIO o moto):
+    docker run --rm -p 9000:9000 minio/minio server /data
+    python benchmarks/verificar_almacen.py --backend s3 --endpoint http://localhost:9000 \\
+        --bucket firmas --access-key minioadmin --secret-key minioadmin --crear-bucket
+
+    moto_server -p 9000   # sin docker (pip install "moto[server]")
+    python benchmarks/verificar_almacen.py --backend s3 --endpoint http://localhost:9000 \\
+        --bucket firmas --access-key prueba --secret-key prueba --region us-east-1 --crear-bucket
+
+Uso:
+    python benchmarks/verificar_almacen.py --backend bd
+"""
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from urllib.parse import urlencode
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.bench_api import sembrar, data_url, firma_png  # noqa: E402
+
+fallas = []
+
+
+def verificar(condicion, mensaje):
+    print(f"{'✅' if condicion else '❌'} {mensaje}")
+    if not condicion:
+        fallas.append(mensaje)
+
+
+def imagenes_en_pdf(contenido):
+    return contenido.count(b'/Subtype /Image')
+
+
+def pdfs_en_cache(config):
+    return glob.glob(os.path.join(config['PDF_CACHE_DIR'], '*.pdf'))
+
+
+def probar_contrato(almacen):
+    print(f'\n--- Contrato del backend {almacen.nombre} ---')
+    prefijo = f'verificacion/{uuid.uuid4().hex}'
+    clave = f'{prefijo}/firma.png'
+    datos = firma_png('contrato')
+
+    almacen.guardar(clave, datos)
+    verificar(almacen.existe(clave), 'existe() después de guardar')
+    verificar(almacen.leer(clave) == datos, 'leer() devuelve los mismos bytes')
+    verificar(almacen.leer(f'{prefijo}/no-existe.png') is None, 'leer() de una clave inexistente es None')
+    verificar([c for c, _, _ in almacen.listar(prefijo)] == [clave], 'listar() encuentra la clave bajo el prefijo')
+    almacen.tocar(clave)
+
+    if almacen.nombre != 'local':
+        shutil.rmtree(almacen.cache_dir, ignore_errors=True)
+    ruta = almacen.ruta_local(clave)
+    verificar(ruta is not None and open(ruta, 'rb').read() == datos, 'ruta_local() descarga el archivo al caché')
+
+    almacen.borrar(clave)
+    verificar(not almacen.existe(clave), 'borrar() elimina la clave')
+    verificar(almacen.ruta_local(clave) is None, 'ruta_local() de una clave borrada es None')
+
+
+def probar_punta_a_punta(config, directorio):
+    from src.main import create_app
+    from src.models.asistencia import db, Asistente
+    from src.services.almacen_firmas import recolectar_firmas
+    from src.services.almacenamiento import obtener_almacenamiento
+    from src.services.firmas import obtener_procesador
+
+    print('\n--- Registro, PDF y recolección ---')
+    uri = f"sqlite:///{os.path.join(directorio, 'almacen.db')}"
+    sembrar(uri, config, capacitaciones=1, asistentes=3, reiniciar=False)
+    app = create_app(dict(config, SQLALCHEMY_DATABASE_URI=uri))
+    cliente = app.test_client()
+    cliente.post('/admin/login', json={'usuario': 'admin', 'password': 'admin123'})
+    static_dir = os.path.join(app.root_path, 'static')
+    almacen = obtener_almacenamiento(app.config, static_dir)
+
+    respuesta = cliente.post('/api/registrar', content_type='application/x-www-form-urlencoded', data=urlencode({
+        'nombres_apellidos': 'Verificación Almacén', 'tipodocumento': 'CC',
+        'numero_documento': str(uuid.uuid4().int % 10**10), 'cargo': 'Conductor', 'ruta': 'R1',
+        'ciudad': 'Bogotá', 'firma_digital': data_url(firma_png('verificacion'))
+    }))
+    verificar(respuesta.status_code == 201, f'registro con firma ({respuesta.status_code})')
+    ruta_firma = (respuesta.get_json() or {}).get('asistente', {}).get('firma_digital')
+    obtener_procesador(app.config).esperar([ruta_firma], timeout=30)
+    verificar(ruta_firma is not None and almacen.existe(ruta_firma), 'la firma quedó en el backend')
+
+    if almacen.nombre != 'local':
+        # Como en otro nodo: sin copias locales, todo se lee del backend
+        shutil.rmtree(almacen.cache_dir, ignore_errors=True)
+    respuesta = cliente.get('/admin/generar-pdf')
+    contenido = respuesta.get_data()
+    with app.app_context():
+        firmas = db.session.query(Asistente).filter(Asistente.firma_digital.isnot(None)).count() + 1
+    verificar(respuesta.status_code == 200 and imagenes_en_pdf(contenido) >= firmas,
+              f'PDF con {imagenes_en_pdf(contenido)} imágenes (firmas: {firmas})')
+    verificar(len(pdfs_en_cache(config)) == 1, 'PDF completo guardado en caché')
+
+    print('\n--- Firma que otro nodo aún no escribió ---')
+    clave_tardia = f'uploads/firmas/zz/zz/{uuid.uuid4().hex}.png'
+    with app.app_context():
+        modelo = Asistente.query.first()
+        db.session.add(Asistente(
+            nombres_apellidos='Firma Tardía', tipodocumento='CC', numero_documento=str(uuid.uuid4().int % 10**10),
+            cargo=modelo.cargo, ruta=modelo.ruta, ciudad=modelo.ciudad, hora_llegada=modelo.hora_llegada,
+            fecha_registro=modelo.fecha_registro, firma_digital=clave_tardia, configuracion_id=modelo.configuracion_id
+        ))
+        db.session.commit()
+    for archivo in pdfs_en_cache(config):
+        os.remove(archivo)
+
+    respuesta = cliente.get('/admin/generar-pdf')
+    sin_firma = imagenes_en_pdf(respuesta.get_data())
+    verificar(respuesta.status_code == 200, 'PDF generado aunque falte una firma')
+    verificar(not pdfs_en_cache(config), 'el PDF incompleto no se guarda en caché')
+
+    almacen.guardar(clave_tardia, firma_png('tardia'))
+    respuesta = cliente.get('/admin/generar-pdf')
+    verificar(imagenes_en_pdf(respuesta.get_data()) == sin_firma + 1, 'con el original disponible el PDF la incluye')
+    verificar(len(pdfs_en_cache(config)) == 1, 'y ahora sí se guarda en caché')
+
+    huerfana = f'uploads/firmas/hu/er/{uuid.uuid4().hex}.png'
+    almacen.guardar(huerfana, firma_png('huerfana'))
+    with app.app_context():
+        recolectar_firmas(almacen, antiguedad_minima=0)
+    verificar(not almacen.existe(huerfana), 'la recolección borra firmas sin registro')
+    verificar(almacen.existe(ruta_firma), 'la recolección conserva las firmas registradas')
+    return almacen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=('local', 'bd', 's3'), default=os.environ.get('ALMACEN_BACKEND', 'local'))
+    parser.add_argument('--endpoint', default=os.environ.get('ALMACEN_S3_ENDPOINT'))
+    parser.add_argument('--bucket', default=os.environ.get('ALMACEN_S3_BUCKET'))
+    parser.add_argument('--region', default=os.environ.get('ALMACEN_S3_REGION'))
+    parser.add_argument('--access-key', default=os.environ.get('ALMACEN_S3_ACCESS_KEY'))
+    parser.add_argument('--secret-key', default=os.environ.get('ALMACEN_S3_SECRET_KEY'))
+    parser.add_argument('--crear-bucket', action='store_true', help='Crear el bucket si no existe')
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='verificar_almacen_')
+    config = {
+        'ALMACEN_BACKEND': args.backend,
+        'ALMACEN_LOCAL_DIR': os.path.join(directorio, 'static'),
+        'ALMACEN_CACHE_DIR': os.path.join(directorio, 'cache'),
+        'PDF_CACHE_DIR': os.path.join(directorio, 'pdf'),
+        'REPORTES_DIR': os.path.join(directorio, 'reportes'),
+        'PDF_PARALELO': False,
+        'LOG_NIVEL': 'ERROR',
+    }
+    if args.backend == 's3':
+        if not args.bucket:
+            parser.error('--bucket es obligatorio con --backend s3')
+        config.update({
+            'ALMACEN_S3_BUCKET': args.bucket,
+            'ALMACEN_S3_PREFIJO': f'verificacion-{int(time.time())}',
+            'ALMACEN_S3_ENDPOINT': args.endpoint,
+            'ALMACEN_S3_REGION': args.region,
+            'ALMACEN_S3_ACCESS_KEY': args.access_key,
+            'ALMACEN_S3_SECRET_KEY': args.secret_key,
+        })
+
+    if args.crear_bucket and args.backend == 's3':
+        from src.services.almacenamiento import crear_almacenamiento
+        cliente = crear_almacenamiento(config, config['ALMACEN_LOCAL_DIR']).cliente
+        try:
+            cliente.head_bucket(Bucket=args.bucket)
+        except Exception:
+            cliente.create_bucket(Bucket=args.bucket)
+
+    # Primero el recorrido completo: con 'bd' crea la tabla archivos_blob
+    almacen = probar_punta_a_punta(config, directorio)
+    probar_contrato(almacen)
+
+    if fallas:
+        print(f'\n❌ {len(fallas)} verificaciones fallaron')
+        sys.exit(1)
+    print(f'\n✅ Backend {args.backend} verificado')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,20 @@
+"""
+Punto de entrada de la aplicación.
+
+create_app() solo arma la app (configuración, blueprints, comandos): no se
+conecta a la base de datos ni importa ReportLab, así cada worker de gunicorn
+arranca rápido aunque la base esté lenta. El esquema y los datos iniciales
+se crean con un comando explícito, una vez por despliegue:
+
+    flask --app src.main inicializar-bd
+    python -m src.servidor          (gunicorn con workers/hilos calculados)
+
+`python src/main.py` (desarrollo) inicializa la base y levanta el servidor.
+"""
+import logging
 import os
 import sys
+import click
 from datetime import date, time, datetime
 from zoneinfo import ZoneInfo
 
@@ -8,8 +23,21 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.asistencia import db, Configuracion, Administrador, Capacitador
+from src.models.migraciones import aplicar_migraciones, MigracionError
+from src.services.contadores import inicializar_contadores, reconstruir_contadores
+from src.services.almacen_firmas import recolectar_firmas
+from src.services.almacenamiento import obtener_almacenamiento
+from src.services.bitacora import configurar_bitacora
+from src.services.busqueda import crear_indice_busqueda
+from src.services.consultas import configurar_conteo_consultas
+from src.services.empleados import importar_empleados, ImportacionError
+from src.services.escritor_sqlite import configurar_sqlite
+from src.services.metricas import configurar_metricas
 from src.routes.asistencia import asistencia_bp
 from src.routes.admin import admin_bp
+from src.routes.metricas import metricas_bp
+
+logger = logging.getLogger(__name__)
 
 # --- Configuración de zona horaria ---
 COLOMBIA_TZ = ZoneInfo("America/Bogota")
@@ -26,63 +54,53 @@ def current_time_co():
     """Devuelve solo la hora actual en Colombia como objeto time (naïve)."""
     return now_co().time()
 
-# --- App Flask ---
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-
-CORS(app)
-
-# Registrar blueprints
-app.register_blueprint(asistencia_bp, url_prefix='/api')
-app.register_blueprint(admin_bp, url_prefix='/admin')
-
-# ✅ CONFIGURACIÓN MEJORADA DE BASE DE DATOS
-DATABASE_URL = os.environ.get('DATABASE_URL')
-
-if DATABASE_URL:
-    # PostgreSQL en producción (Supabase)
-    # Supabase usa 'postgres://' pero SQLAlchemy necesita 'postgresql://'
-    if DATABASE_URL.startswith('postgres://'):
-        DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
-    
-    # Agregar parámetros de conexión para mejorar compatibilidad
-    if '?' not in DATABASE_URL:
-        DATABASE_URL += '?'
-    else:
-        DATABASE_URL += '&'
-    
-    # Agregar opciones de conexión
-    DATABASE_URL += 'connect_timeout=10'
-    
-    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'pool_pre_ping': True,  # Verifica conexiones antes de usarlas
-        'pool_recycle': 300,    # Recicla conexiones cada 5 minutos
-        'pool_size': 10,        # Tamaño del pool de conexiones
-        'max_overflow': 20,     # Conexiones adicionales permitidas
-        'connect_args': {
-            'connect_timeout': 10,
-            'keepalives': 1,
-            'keepalives_idle': 30,
-            'keepalives_interval': 10,
-            'keepalives_count': 5,
+def configurar_base_datos(app):
+    """URI y opciones del pool según DATABASE_URL (PostgreSQL) o SQLite local"""
+    # ✅ CONFIGURACIÓN MEJORADA DE BASE DE DATOS
+    DATABASE_URL = os.environ.get('DATABASE_URL')
+
+    if DATABASE_URL:
+        # PostgreSQL en producción (Supabase)
+        # Supabase usa 'postgres://' pero SQLAlchemy necesita 'postgresql://'
+        if DATABASE_URL.startswith('postgres://'):
+            DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+        
+        # Agregar parámetros de conexión para mejorar compatibilidad
+        if '?' not in DATABASE_URL:
+            DATABASE_URL += '?'
+        else:
+            DATABASE_URL += '&'
+        
+        # Agregar opciones de conexión
+        DATABASE_URL += 'connect_timeout=10'
+        
+        app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_pre_ping': True,  # Verifica conexiones antes de usarlas
+            'pool_recycle': 300,    # Recicla conexiones cada 5 minutos
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),       # Tamaño del pool de conexiones
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),  # Conexiones adicionales permitidas
+            'connect_args': {
+                'connect_timeout': 10,
+                'keepalives': 1,
+                'keepalives_idle': 30,
+                'keepalives_interval': 10,
+                'keepalives_count': 5,
+            }
         }
-    }
-    print("✅ Usando PostgreSQL (Supabase)")
-else:
-    # SQLite para desarrollo local
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-    print("✅ Usando SQLite (desarrollo local)")
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-# Hacer disponibles las funciones de timezone
-app.config['NOW_CO'] = now_co
-app.config['TODAY_CO'] = today_co
-app.config['CURRENT_TIME_CO'] = current_time_co
-app.config['COLOMBIA_TZ'] = COLOMBIA_TZ
+        logger.info("✅ Usando PostgreSQL (Supabase)")
+    else:
+        # SQLite para desarrollo local
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+        logger.info("✅ Usando SQLite (desarrollo local)")
+
+    # ✅ SQLite: PRAGMA de producción y escritor único (ver services/escritor_sqlite)
+    for variable in ('SQLITE_ESCRITOR', 'SQLITE_BUSY_TIMEOUT_MS', 'SQLITE_MMAP_BYTES',
+                     'SQLITE_LOTE_MAXIMO', 'SQLITE_ESPERA_LOTE_MS', 'SQLITE_ESPERA_RESULTADO'):
+        if os.environ.get(variable):
+            app.config[variable] = int(os.environ[variable])
+
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 def crear_datos_iniciales():
     """Crea datos iniciales si no existen (usando fecha en Colombia)."""
@@ -110,40 +128,148 @@ def crear_datos_iniciales():
             db.session.add(config)
         
         db.session.commit()
-        print("✅ Datos iniciales creados/verificados correctamente")
+        logger.info("✅ Datos iniciales creados/verificados correctamente")
     except Exception as e:
-        print(f"⚠️ Error al crear datos iniciales: {e}")
+        logger.warning("⚠️ Error al crear datos iniciales: %s", e)
         db.session.rollback()
 
-# Inicializar base de datos con manejo de errores mejorado
-try:
-    with app.app_context():
-        print("🔄 Intentando conectar a la base de datos...")
-        db.create_all()
-        print("✅ Tablas creadas/verificadas correctamente")
-        crear_datos_iniciales()
-except Exception as e:
-    print(f"❌ Error al inicializar la base de datos: {e}")
-    print("⚠️ La aplicación continuará, pero puede que necesites verificar la conexión")
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+def inicializar_base_datos():
+    """Crea tablas, índices y datos iniciales. Debe llamarse dentro de un app context."""
+    logger.info("🔄 Intentando conectar a la base de datos...")
+    db.create_all()
+    aplicar_migraciones()
+    crear_indice_busqueda()
+    logger.info("✅ Tablas creadas/verificadas correctamente")
+    crear_datos_iniciales()
+    inicializar_contadores()
+
+def registrar_comandos(app):
+    """Comandos `flask --app src.main ...` de mantenimiento"""
+
+    @app.cli.command('inicializar-bd')
+    def inicializar_bd_comando():
+        """Crea tablas, índices y datos iniciales (idempotente)."""
+        try:
+            inicializar_base_datos()
+        except MigracionError as e:
+            raise click.ClickException(str(e))
+
+    @app.cli.command('reconstruir-contadores')
+    @click.option('--fecha', default=None, help='Solo esta fecha (YYYY-MM-DD); por defecto todas')
+    def reconstruir_contadores_comando(fecha):
+        """Recalcula los contadores del dashboard desde la tabla de asistentes."""
+        fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date() if fecha else None
+        filas = reconstruir_contadores(fecha_obj)
+        click.echo(f"✅ Contadores reconstruidos ({filas} filas)")
+
+    @app.cli.command('limpiar-firmas')
+    @click.option('--simular', is_flag=True, help='Solo informar, sin borrar archivos')
+    def limpiar_firmas_comando(simular):
+        """Borra las firmas que no usa ningún asistente ni capacitador."""
+        almacen = obtener_almacenamiento(app.config, app.static_folder)
+        resultado = recolectar_firmas(almacen, simular=simular)
+        accion = 'por borrar' if simular else 'borrados'
+        click.echo(f"✅ {resultado['revisados']} archivos revisados, {resultado['borrados']} {accion} "
+                   f"({resultado['bytes_liberados'] / 1024:.1f} KB)")
+
+    @app.cli.command('importar-empleados')
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--lote', default=1000, show_default=True, help='Filas por UPSERT')
+    def importar_empleados_comando(archivo, lote):
+        """Importa la nómina de empleados desde un CSV (separador , o ;)."""
+        try:
+            with open(archivo, encoding='utf-8-sig', errors='replace', newline='') as lineas:
+                resultado = importar_empleados(lineas, lote=lote)
+        except ImportacionError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"✅ {resultado['leidas']} filas leídas, {resultado['guardadas']} guardadas, "
+                   f"{resultado['rechazadas']} rechazadas")
+        for error in resultado['errores']:
+            click.echo(f"   - {error}")
+
+def create_app(config=None):
+    """
+    Construye la app Flask sin tocar la base de datos.
+    - config: diccionario que sobrescribe la configuración (pruebas, benchmarks)
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    # Primero la bitácora, para que los mensajes de configuración pasen por ella
+    configurar_bitacora(app, config)
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+
+    CORS(app)
+
+    # Registrar blueprints
+    app.register_blueprint(asistencia_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(metricas_bp)
+
+    configurar_base_datos(app)
+
+    # ✅ Backend de firmas: 'local' (carpeta static), 'bd' o 's3' (varias instancias)
+    app.config['ALMACEN_BACKEND'] = os.environ.get('ALMACEN_BACKEND', 'local')
+    for variable in ('ALMACEN_CACHE_DIR', 'ALMACEN_S3_BUCKET', 'ALMACEN_S3_PREFIJO', 'ALMACEN_S3_ENDPOINT',
+                     'ALMACEN_S3_REGION', 'ALMACEN_S3_ACCESS_KEY', 'ALMACEN_S3_SECRET_KEY'):
+        if os.environ.get(variable):
+            app.config[variable] = os.environ[variable]
+
+    # Hacer disponibles las funciones de timezone
+    app.config['NOW_CO'] = now_co
+    app.config['TODAY_CO'] = today_co
+    app.config['CURRENT_TIME_CO'] = current_time_co
+    app.config['COLOMBIA_TZ'] = COLOMBIA_TZ
+
+    if config:
+        app.config.update(config)
+
+    # No abre conexiones: el pool se crea con la primera consulta
+    db.init_app(app)
+    configurar_sqlite(app)
+    configurar_metricas(app)
+    configurar_conteo_consultas(app)
+    registrar_comandos(app)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+                return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "index.html not found", 404
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
+
+    return app
+
+_app = None
+
+def __getattr__(nombre):
+    # Compatibilidad con `gunicorn main:app`: la app se construye al pedirla
+    global _app
+    if nombre == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
 
 
 if __name__ == '__main__':
+    os.environ.setdefault('LOG_FORMATO', 'texto')
+    app = create_app()
+    try:
+        with app.app_context():
+            inicializar_base_datos()
+    except Exception as e:
+        logger.exception("❌ Error al inicializar la base de datos: %s", e)
+        logger.warning("⚠️ La aplicación continuará, pero puede que necesites verificar la conexión")
+
     port = int(os.environ.get('PORT', 5001))
     debug = os.environ.get('FLASK_ENV') != 'production'
-    app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=debug)
@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date, time
+import unicodedata
 from zoneinfo import ZoneInfo
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -23,6 +24,10 @@ def current_time_colombia():
 
 class Configuracion(db.Model):
     __tablename__ = 'configuracion'
+    __table_args__ = (
+        # /api/estado y los registros buscan la capacitación activa de hoy
+        db.Index('ix_configuracion_fecha_activo', 'fecha_capacitacion', 'activo'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nombre_capacitacion = db.Column(db.String(200), nullable=False)
@@ -101,6 +106,9 @@ class Configuracion(db.Model):
 class Capacitador(db.Model):
     """Modelo para registrar información del capacitador"""
     __tablename__ = 'capacitadores'
+    __table_args__ = (
+        db.Index('ix_capacitadores_configuracion', 'configuracion_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nombre_completo = db.Column(db.String(200), nullable=False)
@@ -126,11 +134,33 @@ class Capacitador(db.Model):
         return f'<Capacitador {self.nombre_completo}>'
 
 
+def sin_tildes(texto):
+    """'José GÓMEZ' -> 'jose gomez': minúsculas y sin tildes, como se indexa la búsqueda"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto or '')).lower()
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def _nombre_busqueda(contexto):
+    # Default por fila: también aplica a los INSERT masivos de registro_lote
+    return sin_tildes(contexto.get_current_parameters().get('nombres_apellidos'))
+
+
 class Asistente(db.Model):
     __tablename__ = 'asistentes'
+    __table_args__ = (
+        # ✅ Un documento solo puede registrarse una vez por capacitación
+        db.Index('uq_asistentes_configuracion_documento', 'configuracion_id', 'numero_documento', unique=True),
+        # Listados, dashboard y PDF filtran por fecha o capacitación y ordenan por llegada
+        db.Index('ix_asistentes_fecha_hora', 'fecha_registro', 'hora_llegada'),
+        db.Index('ix_asistentes_configuracion_hora', 'configuracion_id', 'hora_llegada'),
+        # Paginación por cursor (hora_llegada, id) sin filtros
+        db.Index('ix_asistentes_hora_id', 'hora_llegada', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     nombres_apellidos = db.Column(db.String(200), nullable=False)
+    # Copia de nombres_apellidos sin tildes para el índice de búsqueda de SQLite
+    nombre_busqueda = db.Column(db.String(200), default=_nombre_busqueda)
     tipodocumento = db.Column(db.String(50), nullable=False)
     numero_documento = db.Column(db.String(50), nullable=False)
     cargo = db.Column(db.String(100), nullable=False)
@@ -185,4 +215,133 @@ class Administrador(db.Model):
         return {
             'id': self.id,
             'usuario': self.usuario
-        }
\ No newline at end of file
+        }
+
+class MiniaturaFirma(db.Model):
+    """Versión reducida de una firma, lista para el PDF (con sus dimensiones)"""
+    __tablename__ = 'miniaturas_firma'
+    
+    ruta_original = db.Column(db.String(500), primary_key=True)
+    ruta_miniatura = db.Column(db.String(500), nullable=False)
+    tipo = db.Column(db.String(20), nullable=False)  # 'asistente' o 'capacitador'
+    ancho = db.Column(db.Float, nullable=False)  # Puntos en el PDF
+    alto = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: now_colombia())
+    
+    def __repr__(self):
+        return f'<MiniaturaFirma {self.ruta_original}>'
+
+
+class TrabajoReporte(db.Model):
+    """Generación de un reporte (PDF o exportación) en segundo plano"""
+    __tablename__ = 'trabajos_reporte'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)  # 'pdf', 'csv' o 'xlsx'
+    parametros = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')
+    progreso = db.Column(db.Integer, nullable=False, default=0)
+    mensaje = db.Column(db.String(500))
+    ruta_archivo = db.Column(db.String(500))
+    nombre_archivo = db.Column(db.String(300))
+    mimetype = db.Column(db.String(100))
+    admin_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=lambda: now_colombia())
+    updated_at = db.Column(db.DateTime, default=lambda: now_colombia())
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<TrabajoReporte {self.id} {self.estado}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'progreso': self.progreso,
+            'mensaje': self.mensaje,
+            'nombre_archivo': self.nombre_archivo,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None,
+        }
+
+
+class ContadorAsistencia(db.Model):
+    """
+    Totales de asistentes por (capacitación, fecha), por cargo y por ruta.
+    Se actualizan en la misma transacción del registro; el dashboard los lee
+    sin recorrer la tabla de asistentes.
+    - dimension: 'total', 'cargo' o 'ruta' (para 'total', valor = '')
+    """
+    __tablename__ = 'contadores_asistencia'
+    __table_args__ = (
+        db.Index(
+            'uq_contadores_configuracion_fecha_dimension',
+            'configuracion_id', 'fecha', 'dimension', 'valor',
+            unique=True
+        ),
+        db.Index('ix_contadores_fecha', 'fecha'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    configuracion_id = db.Column(db.Integer, db.ForeignKey('configuracion.id'), nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+    dimension = db.Column(db.String(10), nullable=False)
+    valor = db.Column(db.String(100), nullable=False, default='')
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ContadorAsistencia {self.configuracion_id} {self.fecha} {self.dimension}={self.valor}: {self.cantidad}>'
+
+
+class ArchivoBlob(db.Model):
+    """Contenido de un archivo (firma o miniatura) guardado en la base de datos"""
+    __tablename__ = 'archivos_blob'
+    
+    clave = db.Column(db.String(300), primary_key=True)  # ruta relativa a static
+    datos = db.Column(db.LargeBinary, nullable=False)
+    tamano = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: now_colombia())
+    
+    def __repr__(self):
+        return f'<ArchivoBlob {self.clave} ({self.tamano} bytes)>'
+
+
+class ClaveRegistro(db.Model):
+    """Clave de idempotencia enviada por el cliente con cada registro del lote"""
+    __tablename__ = 'claves_registro'
+    
+    clave = db.Column(db.String(64), primary_key=True)
+    asistente_id = db.Column(db.Integer, db.ForeignKey('asistentes.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: now_colombia())
+    
+    def __repr__(self):
+        return f'<ClaveRegistro {self.clave} -> {self.asistente_id}>'
+
+
+class Empleado(db.Model):
+    """Empleado conocido (nómina importada desde CSV) para autocompletar el registro"""
+    __tablename__ = 'empleados'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    numero_documento = db.Column(db.String(50), unique=True, nullable=False)
+    tipodocumento = db.Column(db.String(50), nullable=False, default='CC')
+    nombres_apellidos = db.Column(db.String(200), nullable=False)
+    cargo = db.Column(db.String(100), nullable=False)
+    ruta = db.Column(db.String(100), nullable=False)
+    ciudad = db.Column(db.String(100))
+    activo = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.DateTime, default=lambda: now_colombia(), onupdate=lambda: now_colombia())
+    
+    def __repr__(self):
+        return f'<Empleado {self.numero_documento}>'
+    
+    def to_dict(self):
+        return {
+            'numero_documento': self.numero_documento,
+            'tipodocumento': self.tipodocumento,
+            'nombres_apellidos': self.nombres_apellidos,
+            'cargo': self.cargo,
+            'ruta': self.ruta,
+            'ciudad': self.ciudad,
+        }
@@ -0,0 +1,185 @@
+"""
+Migraciones de esquema que db.create_all() no aplica sobre tablas existentes.
+
+create_all() solo crea tablas nuevas; los índices agregados después a
+__table_args__ no llegan a las bases ya desplegadas. Aquí se crean con
+CREATE INDEX ... (checkfirst), que funciona igual en SQLite y PostgreSQL.
+
+Las columnas nuevas (nullable) se agregan con ALTER TABLE ... ADD COLUMN y
+asistentes.nombre_busqueda se llena en Python para las filas existentes.
+
+Antes de los índices, los documentos de asistentes guardados con puntos o
+espacios ('1.023') se normalizan ('1023'), como se guardan los registros
+nuevos; así el índice único los trata como el mismo documento.
+"""
+import logging
+
+from sqlalchemy import inspect, func, select, or_, update, bindparam, text
+
+from src.models.asistencia import db, Asistente, Capacitador, Configuracion, sin_tildes
+from src.services.empleados import normalizar_documento
+
+LOTE_RELLENO = 1000
+MAX_PROBLEMAS_REPORTADOS = 50
+
+logger = logging.getLogger(__name__)
+
+
+class MigracionError(RuntimeError):
+    """La base tiene datos que impiden aplicar una migración"""
+
+
+def _documentos_duplicados(engine):
+    """
+    Retorna {(configuracion_id, numero_documento): [ids]} de los documentos
+    registrados más de una vez en la misma capacitación.
+    """
+    repetidos = select(Asistente.configuracion_id, Asistente.numero_documento).group_by(
+        Asistente.configuracion_id,
+        Asistente.numero_documento
+    ).having(func.count(Asistente.id) > 1).subquery()
+    consulta = select(Asistente.id, Asistente.configuracion_id, Asistente.numero_documento).join(
+        repetidos,
+        (Asistente.configuracion_id == repetidos.c.configuracion_id)
+        & (Asistente.numero_documento == repetidos.c.numero_documento)
+    ).order_by(Asistente.configuracion_id, Asistente.numero_documento, Asistente.id)
+
+    duplicados = {}
+    with engine.connect() as conn:
+        for asistente_id, configuracion_id, documento in conn.execute(consulta):
+            duplicados.setdefault((configuracion_id, documento), []).append(asistente_id)
+    return duplicados
+
+
+def _agregar_columnas(engine, inspector):
+    """Agrega a las tablas existentes las columnas nullable que les falten"""
+    agregadas = []
+    for modelo in (Configuracion, Capacitador, Asistente):
+        tabla = modelo.__table__
+        existentes = {c['name'] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in existentes or not columna.nullable:
+                continue
+            tipo = columna.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}'))
+            agregadas.append(f'{tabla.name}.{columna.name}')
+    if agregadas:
+        logger.info("✅ Columnas agregadas: %s", ', '.join(agregadas))
+    return agregadas
+
+
+def llenar_nombre_busqueda(engine):
+    """Calcula nombre_busqueda de los asistentes que no lo tienen, por lotes"""
+    pendientes = select(Asistente.id, Asistente.nombres_apellidos).where(
+        Asistente.nombre_busqueda.is_(None)
+    ).order_by(Asistente.id).limit(LOTE_RELLENO)
+    actualizacion = update(Asistente).where(Asistente.id == bindparam('_id')).values(
+        nombre_busqueda=bindparam('_nombre')
+    )
+
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            filas = conn.execute(pendientes).all()
+            if not filas:
+                break
+            conn.execute(actualizacion, [{'_id': i, '_nombre': sin_tildes(nombre)} for i, nombre in filas])
+        total += len(filas)
+    if total:
+        logger.info("✅ nombre_busqueda calculado para %s asistentes", total)
+    return total
+
+
+def normalizar_documentos(engine):
+    """
+    Normaliza numero_documento de los asistentes guardados sin normalizar.
+    Una fila cuyo documento normalizado ya existe en la misma capacitación no
+    se toca (es un duplicado). Retorna (actualizadas, conflictos) con
+    conflictos = [(id, configuracion_id, numero_documento)].
+    """
+    sin_normalizar = select(Asistente.id, Asistente.configuracion_id, Asistente.numero_documento).where(or_(
+        *(Asistente.numero_documento.contains(caracter) for caracter in '., \t-')
+    )).order_by(Asistente.id)
+
+    actualizadas, conflictos = 0, []
+    with engine.begin() as conn:
+        filas = conn.execute(sin_normalizar).all()
+        if not filas:
+            return 0, []
+
+        normalizados = {normalizar_documento(documento) for _, _, documento in filas}
+        ocupados = set(conn.execute(
+            select(Asistente.configuracion_id, Asistente.numero_documento)
+            .where(Asistente.numero_documento.in_(normalizados))
+        ).all())
+
+        for asistente_id, configuracion_id, documento in filas:
+            llave = (configuracion_id, normalizar_documento(documento))
+            if llave in ocupados:
+                conflictos.append((asistente_id, configuracion_id, documento))
+                continue
+            conn.execute(update(Asistente).where(Asistente.id == asistente_id).values(numero_documento=llave[1]))
+            ocupados.add(llave)
+            actualizadas += 1
+
+    if actualizadas:
+        logger.info("✅ %s documentos de asistentes normalizados", actualizadas)
+    return actualizadas, conflictos
+
+
+def aplicar_migraciones():
+    """
+    Agrega columnas, normaliza datos y crea los índices faltantes. Lanza
+    MigracionError si hay documentos repetidos en una capacitación (el
+    índice único no se puede crear). Debe llamarse dentro de un app context.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    creados = []
+
+    _agregar_columnas(engine, inspector)
+    llenar_nombre_busqueda(engine)
+    _, conflictos = normalizar_documentos(engine)
+    problemas = [
+        f"asistente {asistente_id} (capacitación {configuracion_id}): el documento {documento!r} "
+        f"ya está registrado como {normalizar_documento(documento)}"
+        for asistente_id, configuracion_id, documento in conflictos
+    ]
+
+    for modelo in (Configuracion, Capacitador, Asistente):
+        tabla = modelo.__table__
+        existentes = {ix['name'] for ix in inspector.get_indexes(tabla.name)}
+
+        for indice in tabla.indexes:
+            if indice.name in existentes:
+                continue
+
+            if indice.unique and modelo is Asistente:
+                duplicados = _documentos_duplicados(engine)
+                if duplicados:
+                    # Sin el índice nada impediría registrar más duplicados
+                    problemas.extend(
+                        f"capacitación {configuracion_id}, documento {documento}: asistentes "
+                        f"{', '.join(str(i) for i in ids)}"
+                        for (configuracion_id, documento), ids in duplicados.items()
+                    )
+                    continue
+
+            indice.create(bind=engine, checkfirst=True)
+            creados.append(indice.name)
+
+    if creados:
+        logger.info("✅ Índices creados: %s", ', '.join(creados))
+
+    if problemas:
+        detalle = '\n'.join(f'  - {problema}' for problema in problemas[:MAX_PROBLEMAS_REPORTADOS])
+        if len(problemas) > MAX_PROBLEMAS_REPORTADOS:
+            detalle += f'\n  ... y {len(problemas) - MAX_PROBLEMAS_REPORTADOS} más'
+        raise MigracionError(
+            f"Hay {len(problemas)} documentos repetidos en la misma capacitación; no se puede crear "
+            f"uq_asistentes_configuracion_documento. Elimine los registros sobrantes y vuelva a "
+            f"ejecutar `flask --app src.main inicializar-bd`:\n{detalle}"
+        )
+
+    return creados
@@ -1,32 +1,40 @@
-from flask import Blueprint, request, jsonify, session, send_file, current_app
-from src.models.asistencia import db, Administrador, Configuracion, Asistente, Capacitador
+from flask import Blueprint, request, jsonify, session, send_file, current_app, Response, stream_with_context
+from src.models.asistencia import db, Administrador, Configuracion, Asistente, Capacitador, TrabajoReporte
+from src.services.estado_cache import invalidar_snapshot, obtener_snapshot, TTL_POR_DEFECTO
+from src.services.contadores import resumen_del_dia
+from src.services.eventos_asistencia import version_actual as version_registros, esperar_registro
+from src.services.firmas import obtener_procesador
+from src.services.escritor_sqlite import obtener_escritor
+from src.services.reportes import generar_pdf_lista, crear_trabajo, marcar_interrumpido, ReporteError
+from src.services.busqueda import filtro_busqueda, buscar_asistentes
+from src.services.empleados import importar_empleados, ImportacionError
+from src.services.exportacion import consultar_filas, generar_csv, generar_xlsx, xlsx_disponible, TAMANO_LOTE_POR_DEFECTO
 from datetime import datetime, date
 import os
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER
+from io import BytesIO, TextIOWrapper
 from werkzeug.utils import secure_filename
-from reportlab.lib.utils import ImageReader
 from functools import wraps
-import tempfile
+from sqlalchemy.orm import joinedload
+import base64
+import json
+import logging
+import time
 
 admin_bp = Blueprint('admin', __name__)
+logger = logging.getLogger(__name__)
 
-UPLOAD_FOLDER = "static/firmas"
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 
-# Crear carpeta si no existe
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def today_colombia():
+    """Obtiene la fecha actual en Colombia"""
+    return current_app.config['TODAY_CO']()
+
+
 def requiere_autenticacion(f):
     """Decorador para rutas que requieren autenticación"""
     @wraps(f)
@@ -91,7 +99,7 @@ def verificar_sesion():
 def obtener_configuracion():
     """Obtiene la configuración ACTIVA actual"""
     try:
-        print("🔍 Buscando configuración activa...")
+        logger.debug("🔍 Buscando configuración activa...")
         
         # ✅ Buscar la configuración activa
         config = Configuracion.query.filter_by(activo=True).first()
@@ -101,18 +109,16 @@ def obtener_configuracion():
             config = Configuracion.query.order_by(Configuracion.id.desc()).first()
         
         if not config:
-            print("❌ No se encontró ninguna configuración")
+            logger.warning("❌ No se encontró ninguna configuración")
             return jsonify({'error': 'No hay configuración'}), 404
         
-        print(f"✅ Configuración encontrada: ID={config.id}, Nombre={config.nombre_capacitacion}")
+        logger.debug("✅ Configuración encontrada: ID=%s, Nombre=%s", config.id, config.nombre_capacitacion)
         
         result = config.to_dict()
         return jsonify(result)
     
     except Exception as e:
-        import traceback
-        print("❌ ERROR en /admin/configuracion:")
-        traceback.print_exc()
+        logger.exception("❌ ERROR en /admin/configuracion")
         return jsonify({'error': str(e)}), 500
 
 
@@ -122,8 +128,7 @@ def crear_nueva_configuracion():
     """Crea una NUEVA configuración en lugar de actualizar la existente"""
     try:
         data = request.get_json()
-        print("🔍 Datos recibidos para nueva configuración:")
-        print(data)
+        logger.info("🔍 Datos recibidos para nueva configuración", extra={'datos': data})
         
         # ✅ CREAR una nueva configuración en lugar de actualizar
         nueva_config = Configuracion(
@@ -146,8 +151,9 @@ def crear_nueva_configuracion():
         
         db.session.add(nueva_config)
         db.session.commit()
+        invalidar_snapshot()
         
-        print(f"✅ Nueva configuración creada con ID: {nueva_config.id}")
+        logger.info("✅ Nueva configuración creada con ID: %s", nueva_config.id)
         
         return jsonify({
             'mensaje': 'Nueva configuración creada exitosamente',
@@ -155,65 +161,114 @@ def crear_nueva_configuracion():
         })
     
     except Exception as e:
-        import traceback
         db.session.rollback()
-        print("❌ ERROR al crear configuración:")
-        traceback.print_exc()
+        logger.exception("❌ ERROR al crear configuración")
         return jsonify({'error': str(e)}), 500
 
 
+def construir_filtros_asistentes(args):
+    """
+    Traduce los filtros del listado de asistentes (fecha, capacitacion_id,
+    busqueda, cargo, ruta) a una lista de condiciones SQLAlchemy.
+    Lanza ValueError si la fecha o la capacitación no son válidas.
+    """
+    fecha_filtro = args.get('fecha', '')
+    capacitacion_id = args.get('capacitacion_id', '')
+    busqueda = args.get('busqueda', '')
+    cargo_filtro = args.get('cargo', '')
+    ruta_filtro = args.get('ruta', '')
+
+    condiciones = []
+
+    # ✅ Filtro por capacitación (PRIORITARIO)
+    if capacitacion_id:
+        condiciones.append(Asistente.configuracion_id == int(capacitacion_id))
+
+    # Filtro por fecha (opcional)
+    if fecha_filtro:
+        try:
+            fecha_obj = datetime.strptime(fecha_filtro, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Formato de fecha inválido')
+        condiciones.append(Asistente.fecha_registro == fecha_obj)
+
+    # Otros filtros
+    if busqueda:
+        # ✅ Usa el índice de búsqueda (pg_trgm / FTS5), sin distinguir tildes
+        condiciones.append(filtro_busqueda(busqueda))
+
+    if cargo_filtro:
+        condiciones.append(Asistente.cargo.contains(cargo_filtro))
+
+    if ruta_filtro:
+        condiciones.append(Asistente.ruta.contains(ruta_filtro))
+
+    return condiciones
+
+
+def codificar_cursor(asistente):
+    """Cursor opaco con la posición (hora_llegada, id) del último asistente"""
+    valor = f"{asistente.hora_llegada.isoformat()}|{asistente.id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Retorna (hora_llegada, id) a partir del cursor; ValueError si no es válido"""
+    try:
+        hora, id_ = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(hora), int(id_)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+
 @admin_bp.route('/asistentes', methods=['GET'])
 @requiere_autenticacion
 def listar_asistentes_admin():
-    """Lista todos los asistentes con filtros"""
+    """
+    Lista los asistentes con filtros, paginados por cursor (hora_llegada, id).
+    - limite: tamaño de página (por defecto ADMIN_PAGINA_POR_DEFECTO)
+    - cursor: valor de 'siguiente_cursor' de la página anterior
+    """
     try:
         fecha_filtro = request.args.get('fecha', '')
         capacitacion_id = request.args.get('capacitacion_id', '')
-        busqueda = request.args.get('busqueda', '')
-        cargo_filtro = request.args.get('cargo', '')
-        ruta_filtro = request.args.get('ruta', '')
-        
-        # Construir query base
-        query = Asistente.query
-        
-        # ✅ Filtro por capacitación (PRIORITARIO)
-        if capacitacion_id:
-            query = query.filter_by(configuracion_id=int(capacitacion_id))
-        
-        # Filtro por fecha (opcional)
-        if fecha_filtro:
+        cursor = request.args.get('cursor', '')
+
+        limite_maximo = current_app.config.get('ADMIN_PAGINA_MAXIMA', 500)
+        try:
+            limite = int(request.args.get('limite', current_app.config.get('ADMIN_PAGINA_POR_DEFECTO', 100)))
+        except ValueError:
+            return jsonify({'error': 'Límite inválido'}), 400
+        limite = max(1, min(limite, limite_maximo))
+
+        try:
+            condiciones = construir_filtros_asistentes(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Página actual: el nombre de la capacitación llega en el mismo SELECT
+        query = Asistente.query.options(joinedload(Asistente.configuracion)).filter(*condiciones)
+
+        if cursor:
             try:
-                fecha_obj = datetime.strptime(fecha_filtro, '%Y-%m-%d').date()
-                query = query.filter_by(fecha_registro=fecha_obj)
-            except ValueError:
-                return jsonify({'error': 'Formato de fecha inválido'}), 400
-        
-        # Otros filtros
-        if busqueda:
+                hora_cursor, id_cursor = decodificar_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             query = query.filter(
-                (Asistente.nombres_apellidos.contains(busqueda)) |
-                (Asistente.numero_documento.contains(busqueda))
+                (Asistente.hora_llegada > hora_cursor) |
+                ((Asistente.hora_llegada == hora_cursor) & (Asistente.id > id_cursor))
             )
-        
-        if cargo_filtro:
-            query = query.filter(Asistente.cargo.contains(cargo_filtro))
-        
-        if ruta_filtro:
-            query = query.filter(Asistente.ruta.contains(ruta_filtro))
 
-        # Ejecutar consulta con orden por hora de llegada
-        asistentes = query.order_by(Asistente.hora_llegada).all()
+        # Ejecutar consulta con orden por hora de llegada (+1 para saber si hay más)
+        asistentes = query.order_by(Asistente.hora_llegada, Asistente.id).limit(limite + 1).all()
+        hay_mas = len(asistentes) > limite
+        asistentes = asistentes[:limite]
 
-        # Obtener estadísticas
-        total_asistentes = len(asistentes)
-        cargos_unicos = list(set([a.cargo for a in asistentes]))
-        rutas_unicas = list(set([a.ruta for a in asistentes]))
+        # Estadísticas sobre todos los registros filtrados, calculadas en SQL
+        total_asistentes = db.session.query(db.func.count(Asistente.id)).filter(*condiciones).scalar()
+        cargos_unicos = [c for (c,) in db.session.query(Asistente.cargo).filter(*condiciones).distinct()]
+        rutas_unicas = [r for (r,) in db.session.query(Asistente.ruta).filter(*condiciones).distinct()]
 
-        asistentes_con_info = []
-        for asistente in asistentes:
-            asistente_dict = asistente.to_dict()
-            asistentes_con_info.append(asistente_dict)
-        
         return jsonify({
             'asistentes': [asistente.to_dict() for asistente in asistentes],
             'estadisticas': {
@@ -221,6 +276,11 @@ def listar_asistentes_admin():
                 'cargos': cargos_unicos,
                 'rutas': rutas_unicas
             },
+            'paginacion': {
+                'limite': limite,
+                'hay_mas': hay_mas,
+                'siguiente_cursor': codificar_cursor(asistentes[-1]) if hay_mas else None
+            },
             'filtros_aplicados': {
                 'fecha': fecha_filtro,
                 'capacitacion_id': capacitacion_id
@@ -228,79 +288,233 @@ def listar_asistentes_admin():
         })
     
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error al listar asistentes: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
-@admin_bp.route('/dashboard', methods=['GET'])
+@admin_bp.route('/asistentes/buscar', methods=['GET'])
 @requiere_autenticacion
-def dashboard():
-    """Obtiene estadísticas para el dashboard"""
+def buscar_asistentes_admin():
+    """
+    Búsqueda por nombre o documento en todo el histórico, ordenada por
+    relevancia. Acepta los mismos filtros del listado (q = texto buscado).
+    """
     try:
-        fecha_hoy = date.today()
-        
-        # Asistentes de hoy
-        asistentes_hoy = Asistente.query.filter_by(fecha_registro=fecha_hoy).count()
-        
-        # Asistentes por cargo
-        asistentes_por_cargo = db.session.query(
-            Asistente.cargo, 
-            db.func.count(Asistente.id)
-        ).filter_by(fecha_registro=fecha_hoy).group_by(Asistente.cargo).all()
-        
-        # Asistentes por ruta
-        asistentes_por_ruta = db.session.query(
-            Asistente.ruta, 
-            db.func.count(Asistente.id)
-        ).filter_by(fecha_registro=fecha_hoy).group_by(Asistente.ruta).all()
-        
-        # Configuración actual
-        config = Configuracion.query.first()
-        
+        busqueda = request.args.get('q', '').strip()
+        if not busqueda:
+            return jsonify({'error': 'Debe indicar el texto a buscar (q)'}), 400
+
+        try:
+            limite = max(1, min(int(request.args.get('limite', 50)), current_app.config.get('ADMIN_PAGINA_MAXIMA', 500)))
+        except ValueError:
+            return jsonify({'error': 'Límite inválido'}), 400
+
+        filtros = {k: v for k, v in request.args.items() if k != 'busqueda'}
+        try:
+            condiciones = construir_filtros_asistentes(filtros)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        resultados = buscar_asistentes(busqueda, condiciones, limite)
+
         return jsonify({
-            'asistentes_hoy': asistentes_hoy,
-            'por_cargo': dict(asistentes_por_cargo),
-            'por_ruta': dict(asistentes_por_ruta),
-            'sistema_activo': config.esta_en_horario() if config else False,
-            'fecha': fecha_hoy.strftime('%Y-%m-%d')
+            'asistentes': [
+                dict(asistente.to_dict(), puntaje=round(float(puntaje), 4) if puntaje is not None else None)
+                for asistente, puntaje in resultados
+            ],
+            'total': len(resultados),
+            'busqueda': busqueda
         })
-    
+
     except Exception as e:
+        logger.exception("❌ Error al buscar asistentes: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
-def ajustar_firma(ruta_firma, es_capacitador=False):
+@admin_bp.route('/asistentes/stream', methods=['GET'])
+@requiere_autenticacion
+def stream_asistentes():
     """
-    Ajusta la imagen de la firma para que se vea bien sin deformar la celda.
-    - es_capacitador: True para firmas de capacitadores
+    Canal Server-Sent Events con los asistentes que llegan hoy.
+    Cada evento 'asistentes' trae solo los registros nuevos y los
+    contadores actualizados del día.
+    - capacitacion_id: opcional, solo esa capacitación
+    - desde: último id recibido; el navegador lo envía solo al reconectar
+      (cabecera Last-Event-ID). Sin él, se empieza desde el registro más reciente.
+    En PostgreSQL los ids se asignan en el INSERT pero las transacciones
+    pueden confirmar en otro orden: el id 101 puede aparecer después de
+    enviar el 102. Por eso cada consulta vuelve a revisar los últimos
+    ADMIN_STREAM_VENTANA ids por debajo del mayor enviado y salta los que
+    ya se enviaron (al reconectar se reenvía esa ventana; el navegador
+    descarta las filas que ya tiene).
+    Los registros que llegan mientras el cliente lee se agrupan en un solo
+    evento de hasta ADMIN_STREAM_LOTE filas: el servidor no consulta el
+    siguiente lote hasta que el anterior se escribió en la conexión.
     """
+    app = current_app._get_current_object()
+    heartbeat = app.config.get('ADMIN_STREAM_HEARTBEAT', 15)
+    duracion_maxima = app.config.get('ADMIN_STREAM_MAX_SEGUNDOS', 300)
+    tamano_lote = app.config.get('ADMIN_STREAM_LOTE', 100)
+    intervalo_minimo = app.config.get('ADMIN_STREAM_INTERVALO_MINIMO', 1.0)
+    ventana = app.config.get('ADMIN_STREAM_VENTANA', 100)
+
+    capacitacion_id = request.args.get('capacitacion_id', type=int)
+    desde = request.headers.get('Last-Event-ID') or request.args.get('desde')
     try:
-        firma_reader = ImageReader(ruta_firma)
-        
-        # Tamaños equilibrados
-        if es_capacitador:
-            max_width = 70
-            max_height = 25
+        ultimo_id = int(desde) if desde else None
+    except ValueError:
+        return jsonify({'error': 'Último id inválido'}), 400
+
+    # Ids ya enviados dentro de la ventana (id > ultimo_id - ventana)
+    enviados = set()
+
+    def consultar(ultimo_id):
+        # ✅ Contexto propio por iteración: la conexión a la BD no queda
+        # tomada mientras el stream espera
+        with app.app_context():
+            fecha_hoy = app.config['TODAY_CO']()
+            condiciones = [Asistente.fecha_registro == fecha_hoy]
+            if capacitacion_id:
+                condiciones.append(Asistente.configuracion_id == capacitacion_id)
+
+            if ultimo_id is None:
+                # Primera conexión: solo los contadores, sin reenviar el
+                # historial; lo ya confirmado en la ventana cuenta como enviado
+                ultimo_id = db.session.query(db.func.max(Asistente.id)).scalar() or 0
+                enviados.update(id_ for (id_,) in db.session.query(Asistente.id).filter(
+                    Asistente.id > ultimo_id - ventana, Asistente.id <= ultimo_id, *condiciones
+                ))
+                nuevos = []
+            else:
+                piso = ultimo_id - ventana
+                enviados.difference_update([id_ for id_ in enviados if id_ <= piso])
+                condiciones.append(Asistente.id > piso)
+                if enviados:
+                    condiciones.append(Asistente.id.notin_(enviados))
+                nuevos = Asistente.query.options(joinedload(Asistente.configuracion)).filter(
+                    *condiciones
+                ).order_by(Asistente.id).limit(tamano_lote).all()
+                if not nuevos:
+                    return ultimo_id, None, False
+                enviados.update(asistente.id for asistente in nuevos)
+                ultimo_id = max(ultimo_id, nuevos[-1].id)
+
+            datos = {
+                'asistentes': [asistente.to_dict() for asistente in nuevos],
+                'contadores': resumen_del_dia(fecha_hoy, capacitacion_id),
+                'fecha': fecha_hoy.strftime('%Y-%m-%d')
+            }
+            return ultimo_id, datos, len(nuevos) == tamano_lote
+
+    def generar():
+        nonlocal ultimo_id
+        inicio = time.monotonic()
+
+        yield f"retry: {heartbeat * 1000}\n\n"
+
+        while time.monotonic() - inicio < duracion_maxima:
+            # La versión se toma antes de consultar para no perder un aviso
+            version = version_registros()
+            ultimo_id, datos, hay_mas = consultar(ultimo_id)
+
+            if datos:
+                yield f"id: {ultimo_id}\nevent: asistentes\ndata: {json.dumps(datos)}\n\n"
+                if hay_mas:
+                    continue
+                if datos['asistentes']:
+                    # Agrupar las ráfagas de registros en el siguiente evento
+                    time.sleep(intervalo_minimo)
+            else:
+                yield ": keep-alive\n\n"
+
+            restante = duracion_maxima - (time.monotonic() - inicio)
+            espera = min(heartbeat, restante)
+            if espera <= 0:
+                break
+            esperar_registro(version, espera)
+
+    return Response(
+        generar(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@admin_bp.route('/exportar', methods=['GET'])
+@requiere_autenticacion
+def exportar_asistentes():
+    """
+    Exporta los asistentes filtrados (mismos filtros que /admin/asistentes)
+    como CSV o XLSX. La respuesta se envía por bloques mientras se lee la BD.
+    - formato: 'csv' (por defecto) o 'xlsx'
+    """
+    try:
+        formato = request.args.get('formato', 'csv').lower()
+        if formato not in ('csv', 'xlsx'):
+            return jsonify({'error': 'Formato no soportado. Use csv o xlsx'}), 400
+
+        if formato == 'xlsx' and not xlsx_disponible():
+            return jsonify({'error': 'La exportación a XLSX requiere openpyxl'}), 501
+
+        try:
+            condiciones = construir_filtros_asistentes(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        tamano_lote = current_app.config.get('EXPORTACION_TAMANO_LOTE', TAMANO_LOTE_POR_DEFECTO)
+        filas = consultar_filas(condiciones, tamano_lote)
+        sufijo = request.args.get('fecha') or today_colombia().strftime('%Y-%m-%d')
+
+        if formato == 'csv':
+            contenido = generar_csv(filas, tamano_lote)
+            mimetype = 'text/csv; charset=utf-8'
         else:
-            max_width = 75
-            max_height = 25
+            contenido = generar_xlsx(filas)
+            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+        return Response(
+            stream_with_context(contenido),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename="asistentes_{sufijo}.{formato}"',
+                'X-Accel-Buffering': 'no'
+            }
+        )
 
-        width, height = firma_reader.getSize()
-        aspect = height / float(width)
+    except Exception as e:
+        logger.exception("❌ Error en el stream de asistentes: %s", e)
+        return jsonify({'error': str(e)}), 500
 
-        # Escalado proporcional
-        if width > max_width:
-            width = max_width
-            height = width * aspect
-        if height > max_height:
-            height = max_height
-            width = height / aspect
 
-        return Image(ruta_firma, width=width, height=height)
+@admin_bp.route('/dashboard', methods=['GET'])
+@requiere_autenticacion
+def dashboard():
+    """Obtiene estadísticas para el dashboard (desde los contadores materializados)"""
+    try:
+        ahora = current_app.config['NOW_CO']()
+        fecha_hoy = ahora.date()
+        
+        resumen = resumen_del_dia(fecha_hoy)
+        
+        # ✅ Capacitación activa de hoy (snapshot en memoria, no la primera de la tabla)
+        snapshot = obtener_snapshot(
+            ahora,
+            ttl=current_app.config.get('ESTADO_CACHE_TTL', TTL_POR_DEFECTO)
+        )
+        
+        return jsonify({
+            'asistentes_hoy': resumen['total'],
+            'por_cargo': resumen['por_cargo'],
+            'por_ruta': resumen['por_ruta'],
+            'sistema_activo': snapshot.activo and snapshot.esta_en_horario(ahora.time()),
+            'fecha': fecha_hoy.strftime('%Y-%m-%d')
+        })
+    
     except Exception as e:
-        print(f"⚠️ Error ajustando firma: {e}")
-        return ""
+        return jsonify({'error': str(e)}), 500
 
 
 @admin_bp.route('/generar-pdf', methods=['GET'])
@@ -308,7 +522,7 @@ def ajustar_firma(ruta_firma, es_capacitador=False):
 def generar_pdf():
     """Genera un PDF con la lista de asistencia (una o todas las capacitaciones)"""
     try:
-        fecha_filtro = request.args.get('fecha', date.today().strftime('%Y-%m-%d'))
+        fecha_filtro = request.args.get('fecha', today_colombia().strftime('%Y-%m-%d'))
         capacitacion_id = request.args.get('capacitacion_id', None)
 
         try:
@@ -316,284 +530,155 @@ def generar_pdf():
         except ValueError:
             return jsonify({'error': 'Formato de fecha inválido. Use YYYY-MM-DD'}), 400
 
-        # Construir query según filtro
-        query = Asistente.query.filter_by(fecha_registro=fecha_obj)
-        
-        if capacitacion_id:
-            query = query.filter_by(configuracion_id=int(capacitacion_id))
-            capacitaciones = [Configuracion.query.get(int(capacitacion_id))]
-            
-            if not capacitaciones[0]:
-                return jsonify({'error': 'Capacitación no encontrada'}), 404
-        else:
-            asistentes_temp = query.all()
-            if not asistentes_temp:
-                return jsonify({'error': 'No hay asistentes registrados para esta fecha'}), 404
-                
-            capacitaciones_ids = list(set([a.configuracion_id for a in asistentes_temp]))
-            capacitaciones = Configuracion.query.filter(Configuracion.id.in_(capacitaciones_ids)).all()
-
-        asistentes = query.order_by(Asistente.hora_llegada).all()
-
-        if not asistentes:
-            return jsonify({'error': 'No hay asistentes registrados para los filtros seleccionados'}), 404
-
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        temp_path = temp_file.name
-        temp_file.close()
-
-        doc = SimpleDocTemplate(temp_path, pagesize=A4)
-        story = []
-        styles = getSampleStyleSheet()
-
-        # Iterar por cada capacitación
-        for idx, config in enumerate(capacitaciones):
-            asistentes_capacitacion = [a for a in asistentes if a.configuracion_id == config.id]
-            
-            if not asistentes_capacitacion:
-                continue
-
-            # ✅ Buscar capacitador de ESTA capacitación específica
-            capacitador = Capacitador.query.filter_by(
-                configuracion_id=config.id  # ← CAMBIO PRINCIPAL
-            ).first()
-
-            # ======== Encabezado Superior ========
-            logo_path = os.path.join(current_app.root_path, 'static', 'logotipo.png')
-            if os.path.exists(logo_path):
-                logo = Image(logo_path)
-                logo._restrictSize(1.5*inch, 1.5*inch)
-            else:
-                logo = Paragraph("LOGO", styles['Normal'])
-
-            titulo_centro = [
-                Paragraph("<b>GESTIÓN DEL TALENTO HUMANO</b>",
-                          ParagraphStyle(name='SmallTitle', fontSize=12, alignment=TA_CENTER)),
-                Spacer(1, 4),
-                Paragraph("<b>REGISTRO DE ASISTENCIA</b>",
-                          ParagraphStyle(name='MainTitle', fontSize=16, alignment=TA_CENTER))
-            ]
-
-            info_derecha = [
-                Paragraph("<b>Código: FR-TH-01</b>", 
-                          ParagraphStyle(name='InfoStyle', fontSize=9, alignment=TA_CENTER)),
-                Paragraph("<b>Versión: 04</b>", 
-                          ParagraphStyle(name='InfoStyle', fontSize=9, alignment=TA_CENTER)),
-                Paragraph("<b>Fecha de actualización:</b><br/>12/Nov/2025", 
-                          ParagraphStyle(name='InfoStyle', fontSize=9, alignment=TA_CENTER))
-            ]
-
-            encabezado_data = [[logo, titulo_centro, info_derecha]]
-            encabezado_table = Table(encabezado_data, colWidths=[1.8*inch, 4.4*inch, 1.8*inch])
-            encabezado_table.setStyle(TableStyle([ 
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-                ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-                ('ALIGN', (2, 0), (2, 0), 'CENTER'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-
-            story.append(encabezado_table)
-            story.append(Spacer(1, 6))
-
-            # ======== Información del capacitador de ESTA capacitación ========
-            nombre_instructor = ""
-            firma_img = Paragraph("", styles['Normal'])
-            
-            if capacitador:
-                print(f"✅ Capacitador de '{config.nombre_capacitacion}': {capacitador.nombre_completo}")
-                nombre_instructor = capacitador.nombre_completo
-
-                if capacitador.firma_digital:
-                    ruta_firma = os.path.join(current_app.root_path, 'static', capacitador.firma_digital)
-                    if os.path.exists(ruta_firma):
-                        firma_img = ajustar_firma(ruta_firma, es_capacitador=True)
-            else:
-                print(f"⚠️ No hay capacitador registrado para '{config.nombre_capacitacion}'")
-
-            # ... (resto del código del PDF sin cambios) ...
-            
-            intensidad_horaria = ""
-            if config.hora_inicio and config.hora_fin:
-                intensidad_horaria = f"{config.hora_inicio.strftime('%H:%M')} - {config.hora_fin.strftime('%H:%M')}"
-
-            style_label = ParagraphStyle(
-                name='Label',
-                fontSize=7,
-                fontName='Helvetica-Bold',
-                alignment=TA_CENTER
-            )
-            
-            style_value = ParagraphStyle(
-                name='Value',
-                fontSize=7,
-                fontName='Helvetica',
-                alignment=TA_CENTER
-            )
-
-            col_width = 8*inch / 6
-            
-            info_general = [
-                [Paragraph('<b>TEMA:</b>', style_label), 
-                Paragraph(config.nombre_capacitacion or '', style_value), 
-                '', '', '', ''],
-                
-                [Paragraph('<b>CIUDAD:</b>', style_label),
-                Paragraph(config.ciudad_capacitacion or '', style_value),
-                Paragraph('<b>MODALIDAD:</b>', style_label),
-                Paragraph(config.modalidad_capacitacion or '', style_value),
-                Paragraph('<b>FECHA:</b>', style_label),
-                Paragraph(fecha_obj.strftime('%d/%m/%Y'), style_value)],
-                
-                [Paragraph('<b>INTENSIDAD HORARIA:</b>', style_label),
-                Paragraph(intensidad_horaria, style_value),
-                Paragraph('<b>ENTIDAD CAPACITADORA:</b>', style_label),
-                '',
-                Paragraph(config.asesor_externo or config.nombre_empresa or '', style_value),
-                ''],
-                
-                [Paragraph('<b>NOMBRE DEL CAPACITADOR:</b>', style_label),
-                '',
-                Paragraph(nombre_instructor, style_value),
-                Paragraph('<b>FIRMA DEL CAPACITADOR:</b>', style_label),
-                '',
-                firma_img]
-            ]
-
-            col_widths = [col_width] * 6
-
-            tabla_info = Table(info_general, colWidths=col_widths)
-            tabla_info.setStyle(TableStyle([
-                ('SPAN', (1, 0), (5, 0)),
-                ('SPAN', (2, 2), (3, 2)),
-                ('SPAN', (4, 2), (5, 2)),
-                ('SPAN', (0, 3), (1, 3)),
-                ('SPAN', (3, 3), (4, 3)),
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-                ('TOPPADDING', (0, 0), (-1, -1), 3),
-                ('LEFTPADDING', (0, 0), (-1, -1), 2),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 2),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-
-            story.append(tabla_info)
-            story.append(Spacer(1, 12))
-
-            # ======== Tabla de asistentes ========
-            style_header = ParagraphStyle(
-                name='Header',
-                fontSize=7,
-                fontName='Helvetica-Bold',
-                alignment=TA_CENTER,
-                leading=8
-            )
-            
-            style_data = ParagraphStyle(
-                name='Data',
-                fontSize=8,
-                fontName='Helvetica',
-                alignment=TA_CENTER,
-                leading=7
+        try:
+            archivo = generar_pdf_lista(fecha_obj, capacitacion_id, current_app.config, current_app.root_path)
+        except ReporteError as e:
+            return jsonify({'error': e.mensaje}), e.status
+
+        if not archivo.temporal:
+            return send_file(
+                archivo.ruta,
+                as_attachment=True,
+                download_name=archivo.nombre,
+                mimetype=archivo.mimetype
             )
-            
-            data = [[
-                Paragraph('<b>N°</b>', style_header),
-                Paragraph('<b>Tipo de documento</b>', style_header),
-                Paragraph('<b>Número de documento</b>', style_header),
-                Paragraph('<b>Nombre y apellidos completos</b>', style_header),
-                Paragraph('<b>Cargo</b>', style_header),
-                Paragraph('<b>Ciudad</b>', style_header),
-                Paragraph('<b>Firma</b>', style_header),
-                Paragraph('<b>N° Ruta</b>', style_header)
-            ]]
-
-            for i, asistente in enumerate(asistentes_capacitacion, 1):
-                firma_asistente = Paragraph("", styles['Normal'])
-                if asistente.firma_digital:
-                    firma_path = os.path.join(current_app.root_path, 'static', asistente.firma_digital)
-                    if os.path.exists(firma_path):
-                        firma_asistente = ajustar_firma(firma_path, es_capacitador=False)
-
-                data.append([
-                    Paragraph(str(i), style_data),
-                    Paragraph(asistente.tipodocumento or 'CC', style_data),
-                    Paragraph(asistente.numero_documento, style_data),
-                    Paragraph(asistente.nombres_apellidos, style_data),
-                    Paragraph(asistente.cargo, style_data),
-                    Paragraph(asistente.ciudad, style_data),
-                    firma_asistente,
-                    Paragraph(asistente.ruta, style_data)
-                ])
-
-            row_heights = [28] + [23] * len(asistentes_capacitacion)
-            
-            table = Table(data, 
-                         colWidths=[
-                             0.3*inch, 0.7*inch, 0.9*inch, 2.2*inch,
-                             1.3*inch, 0.8*inch, 1.2*inch, 0.6*inch   
-                         ],
-                         rowHeights=row_heights)
-            
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 7),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ('TOPPADDING', (0, 0), (-1, -1), 4),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 5),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-            
-            story.append(table)
-            story.append(Spacer(1, 15))
-            story.append(Paragraph(
-                f"<b>Total de asistentes:</b> {len(asistentes_capacitacion)}", 
-                styles['Normal']
-            ))
-            
-            if len(capacitaciones) > 1 and idx < len(capacitaciones) - 1:
-                story.append(Spacer(1, 0.5*inch))
-                story.append(Paragraph("<br/><hr/><br/>", styles['Normal']))
-
-        if len(capacitaciones) > 1:
-            story.append(Spacer(1, 20))
-            story.append(Paragraph(
-                f"<b>Total general de asistentes:</b> {len(asistentes)}", 
-                ParagraphStyle(name='TotalGeneral', fontSize=12, fontName='Helvetica-Bold')
-            ))
-
-        doc.build(story)
-
-        print(f"✅ PDF generado exitosamente: {temp_path}")
-
-        if capacitacion_id and len(capacitaciones) == 1:
-            nombre_cap = capacitaciones[0].nombre_capacitacion.replace(" ", "_")[:30]
-            nombre_archivo = f"Lista_{nombre_cap}_{fecha_filtro}.pdf"
-        else:
-            nombres_caps = "_".join([cap.nombre_capacitacion.replace(" ", "_")[:15] for cap in capacitaciones])
-            nombre_archivo = f"Lista_{nombres_caps}_{fecha_filtro}.pdf"
 
+        # Sin todas las firmas no se guarda en caché: se envía y se borra
+        with open(archivo.ruta, 'rb') as contenido_pdf:
+            contenido = BytesIO(contenido_pdf.read())
+        os.remove(archivo.ruta)
         return send_file(
-            temp_path,
+            contenido,
             as_attachment=True,
-            download_name=nombre_archivo,
-            mimetype='application/pdf'
+            download_name=archivo.nombre,
+            mimetype=archivo.mimetype
         )
 
     except Exception as e:
-        print(f"❌ Error al generar PDF: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error al generar PDF: %s", e)
         return jsonify({'error': f'Error al generar PDF: {str(e)}'}), 500
+
+
+@admin_bp.route('/reportes', methods=['POST'])
+@requiere_autenticacion
+def crear_reporte():
+    """
+    Encola la generación de un reporte y responde de inmediato (202).
+    - tipo: 'pdf', 'csv' o 'xlsx'
+    - pdf: fecha (YYYY-MM-DD) y capacitacion_id opcional
+    - csv/xlsx: mismos filtros que /admin/asistentes
+    El avance se consulta en GET /admin/reportes/<id>.
+    """
+    try:
+        data = request.get_json() or {}
+        tipo = str(data.get('tipo', 'pdf')).lower()
+
+        campos = ('fecha', 'capacitacion_id', 'busqueda', 'cargo', 'ruta')
+        parametros = {campo: str(data[campo]) for campo in campos if data.get(campo)}
+
+        # Validar los filtros antes de encolar
+        if tipo == 'pdf':
+            parametros.setdefault('fecha', today_colombia().strftime('%Y-%m-%d'))
+            try:
+                datetime.strptime(parametros['fecha'], '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'error': 'Formato de fecha inválido. Use YYYY-MM-DD'}), 400
+        else:
+            try:
+                construir_filtros_asistentes(parametros)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        try:
+            trabajo = crear_trabajo(current_app._get_current_object(), tipo, parametros, session.get('admin_id'))
+        except ReporteError as e:
+            return jsonify({'error': e.mensaje}), e.status
+
+        return jsonify({'success': True, 'trabajo': trabajo.to_dict()}), 202
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("❌ Error al crear reporte: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/reportes/<trabajo_id>', methods=['GET'])
+@requiere_autenticacion
+def estado_reporte(trabajo_id):
+    """Estado y progreso de un reporte encolado"""
+    trabajo = db.session.get(TrabajoReporte, trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Reporte no encontrado'}), 404
+
+    return jsonify(marcar_interrumpido(trabajo).to_dict())
+
+
+@admin_bp.route('/reportes/<trabajo_id>/archivo', methods=['GET'])
+@requiere_autenticacion
+def descargar_reporte(trabajo_id):
+    """Descarga el archivo de un reporte terminado"""
+    trabajo = db.session.get(TrabajoReporte, trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Reporte no encontrado'}), 404
+
+    if trabajo.estado != 'completado':
+        return jsonify({'error': 'El reporte aún no está listo', 'estado': trabajo.estado}), 409
+
+    if not trabajo.ruta_archivo or not os.path.exists(trabajo.ruta_archivo):
+        return jsonify({'error': 'El archivo del reporte ya no está disponible'}), 410
+
+    return send_file(
+        trabajo.ruta_archivo,
+        as_attachment=True,
+        download_name=trabajo.nombre_archivo,
+        mimetype=trabajo.mimetype
+    )
+
+
+@admin_bp.route('/firmas/cola', methods=['GET'])
+@requiere_autenticacion
+def estado_cola_firmas():
+    """Profundidad de la cola de firmas y tiempos de procesamiento recientes"""
+    return jsonify(obtener_procesador(current_app.config).estadisticas())
+
+
+@admin_bp.route('/bd/escritor', methods=['GET'])
+@requiere_autenticacion
+def estado_escritor_sqlite():
+    """Cola y lotes recientes del escritor de SQLite (404 con PostgreSQL)"""
+    escritor = obtener_escritor(current_app.config)
+    if escritor is None:
+        return jsonify({'error': 'El escritor de SQLite no está activo'}), 404
+    return jsonify(escritor.estadisticas())
+
+
+@admin_bp.route('/empleados/importar', methods=['POST'])
+@requiere_autenticacion
+def importar_nomina():
+    """
+    Importa la nómina de empleados desde un CSV (campo 'archivo'). El archivo
+    se lee fila por fila y se guarda por lotes; los documentos existentes se
+    actualizan.
+    """
+    try:
+        archivo = request.files.get('archivo')
+        if not archivo or not archivo.filename:
+            return jsonify({'error': 'Debe adjuntar un archivo CSV'}), 400
+        
+        lineas = TextIOWrapper(archivo.stream, encoding='utf-8-sig', errors='replace', newline='')
+        try:
+            resultado = importar_empleados(lineas)
+        except ImportacionError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.info("✅ Nómina importada: %s empleados, %s filas rechazadas", resultado['guardadas'], resultado['rechazadas'])
+        return jsonify(resultado), 200
     
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("❌ Error al importar nómina: %s", e)
+        return jsonify({'error': str(e)}), 500
+
 
 @admin_bp.route('/configuraciones/listar', methods=['GET'])
 @requiere_autenticacion
@@ -639,6 +724,7 @@ def toggle_configuracion(config_id):
         
         config.activo = not config.activo
         db.session.commit()
+        invalidar_snapshot()
         
         return jsonify({
             'mensaje': f'Configuración {"activada" if config.activo else "desactivada"}',
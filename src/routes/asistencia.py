@@ -1,15 +1,27 @@
-from flask import Blueprint, request, jsonify, current_app
-from src.models.asistencia import db, Asistente, Configuracion, Capacitador
+from flask import Blueprint, request, jsonify, current_app, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from src.models.asistencia import db, Asistente, Configuracion, Capacitador, ClaveRegistro
+from src.services.estado_cache import obtener_snapshot, version_actual, esperar_cambio, TTL_POR_DEFECTO
+from src.services.firmas import preparar_firma, obtener_procesador, FirmaInvalidaError
+from src.services.contadores import incrementar_contadores
+from src.services.escritor_sqlite import escribir
+from src.services.eventos_asistencia import notificar_registro
+from src.services.registro_lote import registrar_lote, LoteInvalidoError, LOTE_MAXIMO_POR_DEFECTO
+from src.services.empleados import (
+    obtener_indice, obtener_limite_consultas, completar_registro, normalizar_documento, datos_publicos
+)
+from src.services.idempotencia import obtener_almacen_idempotencia, leer_clave, ClaveIdempotenciaError
 from datetime import datetime, date
-from io import BytesIO
-from PIL import Image
 import os
 from werkzeug.utils import secure_filename
-import uuid
-import base64
+import json
+import logging
+import time
 
 # ✅ Crear el blueprint correctamente
 asistencia_bp = Blueprint('asistencia', __name__)
+logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
@@ -19,12 +31,6 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def crear_directorio_uploads():
-    """Crea el directorio de uploads si no existe"""
-    upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'firmas')
-    os.makedirs(upload_dir, exist_ok=True)
-    return upload_dir
-
 # ✅ FUNCIONES AUXILIARES PARA MANEJAR ZONA HORARIA
 def now_colombia():
     """Obtiene la hora actual en Colombia"""
@@ -38,85 +44,231 @@ def current_time_colombia():
     """Obtiene solo la hora actual en Colombia (sin fecha)"""
     return current_app.config['CURRENT_TIME_CO']()
 
-@asistencia_bp.route('/estado', methods=['GET'])
-def obtener_estado():
-    """Obtiene el estado actual del sistema"""
-    try:
-        print("🔍 Solicitando estado del sistema...")
-        
-        # ✅ Usar fecha de Colombia en lugar de date.today()
-        hoy_colombia = today_colombia()
-        hora_actual_colombia = current_time_colombia()
-        
-        print(f"📅 Fecha Colombia: {hoy_colombia}")
-        print(f"🕐 Hora Colombia: {hora_actual_colombia}")
-        
-        # ✅ Buscar configuración para HOY en Colombia
-        config = Configuracion.query.filter(
-            Configuracion.activo == True,
-            Configuracion.fecha_capacitacion == hoy_colombia
-        ).first()
-        
-        if not config:
-            print("❌ No hay capacitaciones programadas para hoy")
-            return jsonify({
-                'disponible': False,
-                'mensaje': 'No hay capacitaciones programadas para hoy',
-                'configuracion': None,
-                'debug_info': {
-                    'fecha_actual_colombia': hoy_colombia.isoformat(),
-                    'hora_actual_colombia': hora_actual_colombia.strftime('%H:%M:%S')
-                }
-            }), 200
-        
-        # ✅ Verificar si está en horario (comparar time con time)
-        esta_en_horario = (config.hora_inicio <= hora_actual_colombia <= config.hora_fin)
-        disponible = config.activo and esta_en_horario
-        
-        print(f"⏰ Horario configurado: {config.hora_inicio} - {config.hora_fin}")
-        print(f"⏰ Hora actual: {hora_actual_colombia}")
-        print(f"✅ Está en horario: {esta_en_horario}")
-        print(f"✅ Sistema disponible: {disponible}")
-        
-        response_data = {
-            'disponible': disponible,
-            'configuracion': config.to_dict(),
+def construir_estado(ahora_colombia, snapshot=None):
+    """
+    Calcula la respuesta de /api/estado para un instante dado.
+    Usa el snapshot en memoria de la configuración de hoy.
+    """
+    hoy_colombia = ahora_colombia.date()
+    hora_actual_colombia = ahora_colombia.time()
+    
+    # ✅ Snapshot de la configuración de HOY (se reutiliza entre peticiones)
+    if snapshot is None:
+        snapshot = obtener_snapshot(
+            ahora_colombia,
+            ttl=current_app.config.get('ESTADO_CACHE_TTL', TTL_POR_DEFECTO)
+        )
+    
+    if not snapshot.hay_configuracion:
+        return {
+            'disponible': False,
+            'mensaje': 'No hay capacitaciones programadas para hoy',
+            'configuracion': None,
             'debug_info': {
                 'fecha_actual_colombia': hoy_colombia.isoformat(),
-                'hora_actual_colombia': hora_actual_colombia.strftime('%H:%M:%S'),
-                'fecha_capacitacion': config.fecha_capacitacion.isoformat(),
-                'hora_inicio': config.hora_inicio.strftime('%H:%M'),
-                'hora_fin': config.hora_fin.strftime('%H:%M'),
-                'es_dia_correcto': (hoy_colombia == config.fecha_capacitacion),
-                'esta_en_horario': esta_en_horario,
-                'activo': config.activo
+                'hora_actual_colombia': hora_actual_colombia.strftime('%H:%M:%S')
             }
         }
-        
-        if not disponible:
-            if not config.activo:
-                response_data['mensaje'] = 'El formulario está desactivado'
-            elif hoy_colombia != config.fecha_capacitacion:
-                response_data['mensaje'] = f'La capacitación está programada para {config.fecha_capacitacion.strftime("%d/%m/%Y")}'
-            else:
-                response_data['mensaje'] = f'El formulario está disponible de {config.hora_inicio.strftime("%H:%M")} a {config.hora_fin.strftime("%H:%M")}'
+    
+    # ✅ Verificar si está en horario (comparar time con time)
+    esta_en_horario = snapshot.esta_en_horario(hora_actual_colombia)
+    disponible = snapshot.activo and esta_en_horario
+    
+    response_data = {
+        'disponible': disponible,
+        'configuracion': snapshot.config_dict,
+        'debug_info': {
+            'fecha_actual_colombia': hoy_colombia.isoformat(),
+            'hora_actual_colombia': hora_actual_colombia.strftime('%H:%M:%S'),
+            'fecha_capacitacion': snapshot.fecha_capacitacion.isoformat(),
+            'hora_inicio': snapshot.hora_inicio.strftime('%H:%M'),
+            'hora_fin': snapshot.hora_fin.strftime('%H:%M'),
+            'es_dia_correcto': (hoy_colombia == snapshot.fecha_capacitacion),
+            'esta_en_horario': esta_en_horario,
+            'activo': snapshot.activo
+        }
+    }
+    
+    if not disponible:
+        if not snapshot.activo:
+            response_data['mensaje'] = 'El formulario está desactivado'
+        elif hoy_colombia != snapshot.fecha_capacitacion:
+            response_data['mensaje'] = f'La capacitación está programada para {snapshot.fecha_capacitacion.strftime("%d/%m/%Y")}'
         else:
-            response_data['mensaje'] = 'Formulario disponible'
-        
-        print(f"✅ Estado enviado: disponible={disponible}")
-        return jsonify(response_data), 200
+            response_data['mensaje'] = f'El formulario está disponible de {snapshot.hora_inicio.strftime("%H:%M")} a {snapshot.hora_fin.strftime("%H:%M")}'
+    else:
+        response_data['mensaje'] = 'Formulario disponible'
+    
+    return response_data
+
+
+@asistencia_bp.route('/estado', methods=['GET'])
+def obtener_estado():
+    """Obtiene el estado actual del sistema"""
+    try:
+        return jsonify(construir_estado(now_colombia())), 200
     
     except Exception as e:
-        print(f"❌ Error en /api/estado: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error en /api/estado: %s", e)
         return jsonify({'error': str(e), 'disponible': False}), 500
 
+
+@asistencia_bp.route('/estado/stream', methods=['GET'])
+def stream_estado():
+    """
+    Canal Server-Sent Events del estado del sistema.
+    Solo envía un evento cuando cambia la disponibilidad o la capacitación
+    activa; entre eventos manda un comentario de keep-alive. La conexión se
+    cierra después de ESTADO_STREAM_MAX_SEGUNDOS y el navegador reconecta solo.
+    """
+    app = current_app._get_current_object()
+    heartbeat = app.config.get('ESTADO_STREAM_HEARTBEAT', 15)
+    duracion_maxima = app.config.get('ESTADO_STREAM_MAX_SEGUNDOS', 300)
+
+    def calcular():
+        # ✅ Contexto propio por iteración: la conexión a la BD se libera
+        # en cada vuelta en lugar de quedar tomada mientras dure el stream
+        with app.app_context():
+            ahora = app.config['NOW_CO']()
+            snapshot = obtener_snapshot(ahora, ttl=app.config.get('ESTADO_CACHE_TTL', TTL_POR_DEFECTO))
+            return construir_estado(ahora, snapshot), snapshot.valido_hasta, ahora
+
+    def generar():
+        inicio = time.monotonic()
+        ultima_clave = None
+        version = version_actual()
+
+        yield f"retry: {heartbeat * 1000}\n\n"
+
+        while time.monotonic() - inicio < duracion_maxima:
+            estado, valido_hasta, ahora = calcular()
+            configuracion = estado.get('configuracion') or {}
+            clave = (estado['disponible'], configuracion.get('id'))
+
+            if clave != ultima_clave:
+                ultima_clave = clave
+                yield f"event: estado\ndata: {json.dumps(estado)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+
+            # Dormir hasta el próximo límite de horario, un cambio del admin
+            # o el siguiente keep-alive (lo que ocurra primero)
+            restante = duracion_maxima - (time.monotonic() - inicio)
+            espera = min(heartbeat, restante, max((valido_hasta - ahora).total_seconds(), 0.5))
+            if espera <= 0:
+                break
+            version = esperar_cambio(version, espera)
+
+    return Response(
+        generar(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@asistencia_bp.route('/empleado/<documento>', methods=['GET'])
+def buscar_empleado(documento):
+    """
+    Datos públicos de un empleado de la nómina para autocompletar el
+    formulario: nombre enmascarado, tipo de documento y cargo. Nombre
+    completo y ruta los completa el servidor al registrar.
+    """
+    try:
+        if not obtener_limite_consultas(current_app.config).permitir(request.remote_addr):
+            respuesta = jsonify({'error': 'Demasiadas consultas, intente en un minuto'})
+            respuesta.headers['Retry-After'] = '60'
+            return respuesta, 429
+
+        empleado = obtener_indice(current_app.config).buscar(documento)
+        if not empleado:
+            return jsonify({'error': 'Empleado no encontrado'}), 404
+        
+        respuesta = jsonify(datos_publicos(empleado))
+        respuesta.headers['Cache-Control'] = 'private, max-age=60'
+        return respuesta
+    
+    except Exception as e:
+        logger.exception("❌ Error al buscar empleado: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+def respuesta_registrada(clave, numero_documento):
+    """
+    Respuesta 201 original de un registro ya hecho con esta clave de
+    idempotencia (en otro proceso o antes del TTL en memoria), o None.
+    Si el asistente ya no existe, la clave se borra y se registra de nuevo.
+    """
+    registro = db.session.get(ClaveRegistro, clave)
+    if registro is None:
+        return None
+
+    asistente = db.session.get(Asistente, registro.asistente_id)
+    if asistente is None:
+        logger.warning("⚠️ Clave %s apunta al asistente %s, que ya no existe: se descarta",
+                       clave, registro.asistente_id)
+        escribir(lambda session: session.query(ClaveRegistro).filter_by(clave=clave).delete())
+        return None
+    if normalizar_documento(asistente.numero_documento) != normalizar_documento(numero_documento):
+        raise ClaveIdempotenciaError('La clave de idempotencia ya se usó con otros datos', 422)
+
+    return 201, {
+        'mensaje': 'Asistencia registrada exitosamente',
+        'asistente': asistente.to_dict(),
+        'capacitacion': asistente.configuracion.nombre_capacitacion
+    }
+
 @asistencia_bp.route('/registrar', methods=['POST'])
 def registrar_asistencia():
-    """Registra la asistencia de un trabajador"""
+    """
+    Registra la asistencia de un trabajador. Con el encabezado
+    Idempotency-Key, los reintentos reciben la respuesta del primer envío
+    sin volver a procesar la firma.
+    """
+    try:
+        clave = leer_clave(request.headers)
+    except ClaveIdempotenciaError as e:
+        return jsonify({'error': e.mensaje}), e.status
+
+    if not clave:
+        return _registrar_asistencia(None)
+
+    # ✅ Antes de cualquier trabajo con la imagen. La huella es el documento
+    # normalizado, igual que en respuesta_registrada: '1.023' y '1023' son el mismo
+    numero_documento = request.form.get('numero_documento', '').strip()
+    almacen = obtener_almacen_idempotencia(current_app.config)
     try:
-        print("🔍 Intentando registrar asistencia...")
+        guardada = almacen.reservar(clave, normalizar_documento(numero_documento))
+    except ClaveIdempotenciaError as e:
+        return jsonify({'error': e.mensaje}), e.status
+
+    if guardada is not None:
+        logger.info("🔁 Reintento con clave %s: se devuelve la respuesta original", clave)
+        status, cuerpo = guardada
+        return jsonify(cuerpo), status
+
+    respuesta, status = None, 500
+    try:
+        guardada = respuesta_registrada(clave, numero_documento)
+        if guardada is not None:
+            status, cuerpo = guardada
+            respuesta = jsonify(cuerpo)
+        else:
+            respuesta, status = _registrar_asistencia(clave)
+    except ClaveIdempotenciaError as e:
+        respuesta, status = jsonify({'error': e.mensaje}), e.status
+    finally:
+        if status == 201:
+            almacen.completar(clave, status, respuesta.get_json())
+        else:
+            # Errores y rechazos no se guardan: el cliente puede corregir y reintentar
+            almacen.liberar(clave)
+    return respuesta, status
+
+def _registrar_asistencia(clave):
+    """Valida y guarda el registro; `clave` es la de idempotencia (o None)"""
+    try:
+        logger.debug("🔍 Intentando registrar asistencia...")
         
         # ✅ Usar fecha y hora de Colombia
         hoy_colombia = today_colombia()
@@ -142,13 +294,18 @@ def registrar_asistencia():
                 'error': f'El formulario está disponible de {config.hora_inicio.strftime("%H:%M")} a {config.hora_fin.strftime("%H:%M")}'
             }), 403
         
-        # Obtener datos del formulario
-        nombres_apellidos = request.form.get('nombres_apellidos', '').strip()
-        tipodocumento = request.form.get('tipodocumento', '').strip()
-        numero_documento = request.form.get('numero_documento', '').strip()
-        cargo = request.form.get('cargo', '').strip()
-        ruta = request.form.get('ruta', '').strip()
-        ciudad = request.form.get('ciudad', '').strip()
+        # Obtener datos del formulario; con un empleado de la nómina basta el
+        # documento (nombre, cargo y ruta salen de la nómina)
+        datos = completar_registro({
+            campo: request.form.get(campo, '').strip()
+            for campo in ('nombres_apellidos', 'tipodocumento', 'numero_documento', 'cargo', 'ruta', 'ciudad')
+        }, current_app.config)
+        nombres_apellidos = datos['nombres_apellidos']
+        tipodocumento = datos['tipodocumento']
+        numero_documento = datos['numero_documento']
+        cargo = datos['cargo']
+        ruta = datos['ruta']
+        ciudad = datos['ciudad']
         
         # Validar campos obligatorios
         if not all([nombres_apellidos, tipodocumento, numero_documento, cargo, ruta, ciudad]):
@@ -156,42 +313,23 @@ def registrar_asistencia():
                 'error': 'Todos los campos son obligatorios'
             }), 400
         
-        asistente_existente = Asistente.query.filter_by(
-            numero_documento=numero_documento,
-            configuracion_id=config.id
-        ).first()
-        
-        if asistente_existente:
-            return jsonify({
-                'error': f'Ya está registrado en esta capacitación: {config.nombre_capacitacion}'
-            }), 409
-        
-        # ✅ PROCESAR FIRMA DIGITAL (base64)
-        firma_path = None
+        # ✅ VALIDAR FIRMA DIGITAL (base64); el archivo se escribe en segundo plano
+        trabajo_firma = None
         firma_digital_data = request.form.get('firma_digital', '').strip()
         
         if firma_digital_data:
             try:
-                upload_dir = crear_directorio_uploads()
-                unique_filename = f"{uuid.uuid4().hex}.png"
-                file_path = os.path.join(upload_dir, unique_filename)
-
-                if firma_digital_data.startswith("data:image"):
-                    firma_digital_data = firma_digital_data.split(",", 1)[1]
-
-                image_data = base64.b64decode(firma_digital_data)
-                image = Image.open(BytesIO(image_data)).convert("RGBA")
-                image.save(file_path, format="PNG")
-
-                firma_path = f"uploads/firmas/{unique_filename}"
-                print(f"✅ Firma guardada correctamente en: {file_path}")
-                
-            except Exception as e:
-                print(f"❌ Error al guardar firma: {str(e)}")
-                firma_path = None
+                trabajo_firma = preparar_firma(
+                    firma_digital_data,
+                    os.path.join(current_app.root_path, 'static'),
+                    'uploads/firmas',
+                    current_app.config
+                )
+            except FirmaInvalidaError as e:
+                logger.warning("❌ Error al guardar firma: %s", e)
         
         # ✅ Usar hora de Colombia para registro
-        nuevo_asistente = Asistente(
+        fila = dict(
             nombres_apellidos=nombres_apellidos,
             tipodocumento=tipodocumento,
             numero_documento=numero_documento,
@@ -199,27 +337,98 @@ def registrar_asistencia():
             ruta=ruta,
             ciudad=ciudad,
             hora_llegada=now_co,  # ✅ Hora de Colombia
-            firma_digital=firma_path,
+            firma_digital=trabajo_firma.ruta_relativa if trabajo_firma else None,
             fecha_registro=hoy_colombia,  # ✅ Fecha de Colombia
             configuracion_id=config.id
         )
         
-        db.session.add(nuevo_asistente)
-        db.session.commit()
+        # ✅ El índice único (configuracion_id, numero_documento) detecta duplicados;
+        # los contadores del dashboard se actualizan en la misma transacción
+        try:
+            asistente = escribir(lambda session: _guardar_asistente(session, fila, clave))
+        except IntegrityError:
+            db.session.rollback()
+            # La misma clave pudo registrarse en otro proceso al mismo tiempo
+            guardada = respuesta_registrada(clave, numero_documento) if clave else None
+            if guardada is not None:
+                status, cuerpo = guardada
+                return jsonify(cuerpo), status
+            return jsonify({
+                'error': f'Ya está registrado en esta capacitación: {config.nombre_capacitacion}'
+            }), 409
+        
+        if trabajo_firma:
+            obtener_procesador(current_app.config).encolar(trabajo_firma)
         
-        print(f"✅ Asistente registrado: {nombres_apellidos}")
+        # ✅ Avisar a los paneles de administración conectados
+        notificar_registro()
+        
+        logger.info("✅ Asistente registrado: %s", nombres_apellidos)
         
         return jsonify({
             'mensaje': 'Asistencia registrada exitosamente',
-            'asistente': nuevo_asistente.to_dict(),
+            'asistente': asistente,
             'capacitacion': config.nombre_capacitacion
         }), 201
     
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Error en registro: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error en registro: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+def _guardar_asistente(session, fila, clave):
+    """Trabajo de escritura del registro (sin commit); retorna el asistente como dict"""
+    asistente = Asistente(**fila)
+    session.add(asistente)
+    if clave:
+        session.flush()
+        session.add(ClaveRegistro(clave=clave, asistente_id=asistente.id))
+    incrementar_contadores(session, asistente)
+    session.flush()
+    return asistente.to_dict()
+
+@asistencia_bp.route('/registrar/lote', methods=['POST'])
+def registrar_lote_asistencia():
+    """
+    Registra varios asistentes en una sola petición (cola sin conexión del
+    formulario). Cuerpo JSON: {"registros": [{"clave": ..., campos del
+    formulario, "firma_digital", "configuracion_id", "registrado_en"}]}.
+    Responde 200 con el resultado de cada registro, en el mismo orden.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        ahora = now_colombia()
+        snapshot = obtener_snapshot(ahora, ttl=current_app.config.get('ESTADO_CACHE_TTL', TTL_POR_DEFECTO))
+
+        try:
+            resultados, trabajos_firma = registrar_lote(
+                data.get('registros'),
+                ahora,
+                os.path.join(current_app.root_path, 'static'),
+                current_app.config,
+                config_activa=snapshot,
+                lote_maximo=current_app.config.get('REGISTRO_LOTE_MAXIMO', LOTE_MAXIMO_POR_DEFECTO)
+            )
+        except LoteInvalidoError as e:
+            return jsonify({'error': e.mensaje}), e.status
+
+        procesador = obtener_procesador(current_app.config)
+        for trabajo_firma in trabajos_firma:
+            procesador.encolar(trabajo_firma)
+
+        resumen = {estado: 0 for estado in ('creado', 'duplicado', 'rechazado')}
+        for resultado in resultados:
+            resumen[resultado['estado']] += 1
+
+        if resumen['creado']:
+            notificar_registro()
+        logger.info("✅ Lote procesado: %s", resumen)
+
+        return jsonify({'resultados': resultados, 'resumen': resumen}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("❌ Error en registro por lote: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @asistencia_bp.route('/asistentes', methods=['GET'])
@@ -230,7 +439,10 @@ def listar_asistentes():
         fecha_filtro = request.args.get('fecha', today_colombia().strftime('%Y-%m-%d'))
         fecha_obj = datetime.strptime(fecha_filtro, '%Y-%m-%d').date()
         
-        asistentes = Asistente.query.filter_by(fecha_registro=fecha_obj).all()
+        # ✅ El nombre de la capacitación llega en el mismo SELECT (to_dict lo usa)
+        asistentes = Asistente.query.options(joinedload(Asistente.configuracion)).filter_by(
+            fecha_registro=fecha_obj
+        ).all()
         
         return jsonify({
             'asistentes': [asistente.to_dict() for asistente in asistentes],
@@ -245,7 +457,7 @@ def listar_asistentes():
 def registrar_capacitador():
     """Registra la información del capacitador para una capacitación específica"""
     try:
-        print("🔍 Intentando registrar capacitador...")
+        logger.debug("🔍 Intentando registrar capacitador...")
         
         # ✅ Usar fecha y hora de Colombia
         hoy_colombia = today_colombia()
@@ -290,56 +502,53 @@ def registrar_capacitador():
                 'error': f'Ya existe un capacitador registrado para esta capacitación: {config.nombre_capacitacion}'
             }), 409
         
-        # Procesar firma digital
-        firma_path = None
+        # Validar firma digital; el archivo se escribe en segundo plano
+        trabajo_firma = None
         if firma_digital_data:
             try:
-                upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'firmas_capacitadores')
-                os.makedirs(upload_dir, exist_ok=True)
-                
-                unique_filename = f"capacitador_{uuid.uuid4().hex}.png"
-                file_path = os.path.join(upload_dir, unique_filename)
-                
-                if firma_digital_data.startswith("data:image"):
-                    firma_digital_data = firma_digital_data.split(",")[1]
-                
-                image_data = base64.b64decode(firma_digital_data)
-                image = Image.open(BytesIO(image_data)).convert("RGBA")
-                image.save(file_path, format="PNG")
-                
-                firma_path = f"uploads/firmas_capacitadores/{unique_filename}"
-                print(f"✅ Firma de capacitador guardada: {firma_path}")
-            except Exception as e:
-                print(f"❌ Error al guardar firma del capacitador: {str(e)}")
-                firma_path = None
+                trabajo_firma = preparar_firma(
+                    firma_digital_data,
+                    os.path.join(current_app.root_path, 'static'),
+                    'uploads/firmas_capacitadores',
+                    current_app.config
+                )
+            except FirmaInvalidaError as e:
+                logger.warning("❌ Error al guardar firma del capacitador: %s", e)
         
         # ✅ Usar fecha y hora de Colombia
-        nuevo_capacitador = Capacitador(
+        fila = dict(
             nombre_completo=nombre_completo,
-            firma_digital=firma_path,
+            firma_digital=trabajo_firma.ruta_relativa if trabajo_firma else None,
             fecha_registro=hoy_colombia,  # ✅ Fecha de Colombia
             hora_registro=hora_actual_colombia,  # ✅ Hora de Colombia
             configuracion_id=config.id
         )
         
-        db.session.add(nuevo_capacitador)
-        db.session.commit()
+        capacitador = escribir(lambda session: _guardar_capacitador(session, fila))
+        
+        if trabajo_firma:
+            obtener_procesador(current_app.config).encolar(trabajo_firma)
         
-        print(f"✅ Capacitador registrado: {nombre_completo}")
+        logger.info("✅ Capacitador registrado: %s", nombre_completo)
         
         return jsonify({
             'mensaje': 'Información del capacitador registrada exitosamente',
-            'capacitador': nuevo_capacitador.to_dict(),
+            'capacitador': capacitador,
             'capacitacion': config.nombre_capacitacion
         }), 201
     
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Error al registrar capacitador: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error al registrar capacitador: %s", e)
         return jsonify({'error': str(e)}), 500
 
+def _guardar_capacitador(session, fila):
+    """Trabajo de escritura del capacitador (sin commit); retorna el capacitador como dict"""
+    capacitador = Capacitador(**fila)
+    session.add(capacitador)
+    session.flush()
+    return capacitador.to_dict()
+
 # ✅ RUTA DE PRUEBA para verificar que el blueprint funciona
 @asistencia_bp.route('/test', methods=['GET'])
 def test():
@@ -354,7 +563,10 @@ def test():
         'hora_colombia': hora_colombia.strftime('%H:%M:%S'),
         'rutas_disponibles': [
             '/api/estado',
+            '/api/estado/stream',
             '/api/registrar',
+            '/api/registrar/lote',
+            '/api/empleado/<documento>',
             '/api/asistentes',
             '/api/capacitador/registrar',
             '/api/test'
@@ -0,0 +1,21 @@
+import hmac
+import os
+
+from flask import Blueprint, Response, current_app, request
+
+from src.services.metricas import exponer
+
+metricas_bp = Blueprint('metricas', __name__)
+
+
+@metricas_bp.route('/metrics', methods=['GET'])
+def metricas():
+    """Métricas en formato Prometheus (con METRICAS_TOKEN exige 'Authorization: Bearer <token>')"""
+    token = current_app.config.get('METRICAS_TOKEN') or os.environ.get('METRICAS_TOKEN')
+    if token:
+        enviado = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(enviado.encode(), token.encode()):
+            return Response('No autorizado\n', status=401, mimetype='text/plain')
+
+    cuerpo, content_type = exponer()
+    return Response(cuerpo, content_type=content_type)
@@ -0,0 +1,134 @@
+"""
+Almacén de firmas direccionado por contenido.
+
+Cada firma se guarda con el hash SHA-256 de los bytes recibidos como nombre
+y repartida en subcarpetas por los primeros caracteres del hash
+(uploads/firmas/ab/cd/abcd....png), así ningún directorio acumula cientos
+de miles de archivos y la misma imagen enviada dos veces ocupa un solo
+archivo. Antes de decodificar se limitan los bytes y los píxeles declarados
+en el encabezado; al guardar, la imagen se vuelve a codificar como PNG
+optimizado o WebP sin pérdida.
+
+Los archivos se leen y escriben a través del backend de almacenamiento
+(ver almacenamiento.py). recolectar_firmas() borra los que ya no
+referencia ningún Asistente ni Capacitador (comando `flask limpiar-firmas`).
+"""
+import hashlib
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from src.models.asistencia import db, Asistente, Capacitador, MiniaturaFirma
+
+SUBCARPETAS = ('uploads/firmas', 'uploads/firmas_capacitadores')
+FORMATOS_SALIDA = {'png': 'PNG', 'webp': 'WEBP'}
+FORMATO_POR_DEFECTO = 'png'
+MAX_BYTES_POR_DEFECTO = 2 * 1024 * 1024
+MAX_PIXELES_POR_DEFECTO = 4_000_000
+# Archivos más nuevos que esto no se borran (pueden estar recién escritos)
+ANTIGUEDAD_MINIMA_GC = 3600
+
+
+class LimiteFirmaError(ValueError):
+    """La firma supera el tamaño o la cantidad de píxeles permitidos"""
+
+
+def configuracion_almacen(config):
+    """(formato, max_bytes, max_pixeles) desde app.config"""
+    formato = str(config.get('FIRMAS_FORMATO', FORMATO_POR_DEFECTO)).lower()
+    if formato not in FORMATOS_SALIDA:
+        formato = FORMATO_POR_DEFECTO
+    return (
+        formato,
+        config.get('FIRMAS_MAX_BYTES', MAX_BYTES_POR_DEFECTO),
+        config.get('FIRMAS_MAX_PIXELES', MAX_PIXELES_POR_DEFECTO),
+    )
+
+
+def verificar_limites(imagen, tamano_bytes, max_bytes, max_pixeles):
+    """Valida bytes y dimensiones con la imagen solo abierta (sin decodificar)"""
+    if tamano_bytes > max_bytes:
+        raise LimiteFirmaError(f'La firma supera el tamaño máximo ({max_bytes} bytes)')
+
+    ancho, alto = imagen.size
+    if ancho <= 0 or alto <= 0 or ancho * alto > max_pixeles:
+        raise LimiteFirmaError(f'La firma supera el máximo de píxeles ({ancho}x{alto})')
+
+
+def ruta_por_contenido(datos, subcarpeta, formato=FORMATO_POR_DEFECTO):
+    """Ruta relativa a static: subcarpeta/ab/cd/<sha256>.<formato>"""
+    digest = hashlib.sha256(datos).hexdigest()
+    return f"{subcarpeta}/{digest[:2]}/{digest[2:4]}/{digest}.{formato}"
+
+
+def guardar_codificada(datos, clave, almacen):
+    """
+    Decodifica la imagen, la normaliza a RGBA y la guarda en el almacén
+    (PNG optimizado o WebP sin pérdida según la extensión de la clave). Si
+    la clave ya existe no se vuelve a escribir: el nombre es el hash del
+    contenido.
+    """
+    if almacen.existe(clave):
+        # Renovar la fecha: la recolección respeta los archivos recientes
+        almacen.tocar(clave)
+        return False
+
+    formato = FORMATOS_SALIDA[clave.rsplit('.', 1)[-1].lower()]
+    imagen = Image.open(BytesIO(datos)).convert("RGBA")
+
+    salida = BytesIO()
+    if formato == 'PNG':
+        imagen.save(salida, format='PNG', optimize=True)
+    else:
+        imagen.save(salida, format='WEBP', lossless=True, quality=100, method=6)
+
+    almacen.guardar(clave, salida.getvalue())
+    return True
+
+
+def _referenciadas():
+    """Rutas de firma que aún usa alguna fila"""
+    referencias = set()
+    for modelo in (Asistente, Capacitador):
+        consulta = db.select(modelo.firma_digital).where(
+            modelo.firma_digital.isnot(None)
+        ).distinct().execution_options(yield_per=5000)
+        referencias.update(ruta for (ruta,) in db.session.execute(consulta))
+    return referencias
+
+
+def recolectar_firmas(almacen, simular=False, antiguedad_minima=ANTIGUEDAD_MINIMA_GC):
+    """
+    Borra las firmas (y sus miniaturas) que no referencia ningún Asistente
+    ni Capacitador. Debe llamarse dentro de un app context.
+    Retorna {'revisados', 'borrados', 'bytes_liberados'}.
+    """
+    referencias = _referenciadas()
+    limite = time.time() - antiguedad_minima
+    resultado = {'revisados': 0, 'borrados': 0, 'bytes_liberados': 0}
+    huerfanas = []
+
+    for subcarpeta in SUBCARPETAS:
+        for clave, tamano, modificado in almacen.listar(subcarpeta):
+            resultado['revisados'] += 1
+            if clave in referencias or modificado > limite:
+                continue
+
+            huerfanas.append(clave)
+            resultado['borrados'] += 1
+            resultado['bytes_liberados'] += tamano
+            if not simular:
+                almacen.borrar(clave)
+
+    if huerfanas and not simular:
+        # Miniaturas del PDF generadas a partir de las firmas borradas
+        for inicio in range(0, len(huerfanas), 500):
+            lote = huerfanas[inicio:inicio + 500]
+            miniaturas = MiniaturaFirma.query.filter(MiniaturaFirma.ruta_original.in_(lote)).all()
+            for miniatura in miniaturas:
+                almacen.borrar(miniatura.ruta_miniatura)
+                db.session.delete(miniatura)
+        db.session.commit()
+
+    return resultado
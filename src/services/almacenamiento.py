@@ -0,0 +1,323 @@
+"""
+Almacenamiento de archivos (firmas y miniaturas) desacoplado del disco local.
+
+El registro y el PDF guardan y leen por clave (la ruta relativa a static,
+p. ej. 'uploads/firmas/ab/cd/<hash>.png') a través de un backend:
+
+- 'local': carpeta static de la app (comportamiento original, un solo nodo)
+- 'bd':    tabla archivos_blob en la misma base de datos
+- 's3':    cualquier API compatible con S3 (AWS, MinIO...); requiere boto3
+
+Con 'bd' y 's3' varias instancias de la app pueden atender detrás de un
+balanceador. Para que el PDF siga siendo rápido, ruta_local() descarga cada
+archivo una sola vez a un caché en disco (los archivos no cambian: el
+nombre es el hash del contenido).
+"""
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+
+from sqlalchemy.orm import Session
+
+from src.models.asistencia import db, ArchivoBlob, now_colombia
+
+BACKENDS = ('local', 'bd', 's3')
+CACHE_DIR_POR_DEFECTO = os.path.join(tempfile.gettempdir(), 'registro_asistencia_archivos')
+
+
+class AlmacenamientoError(RuntimeError):
+    """El backend configurado no está disponible o falló"""
+
+
+def _escribir_atomico(destino, datos):
+    """Escribe en un temporal del mismo directorio y lo reemplaza de una vez"""
+    directorio = os.path.dirname(destino)
+    os.makedirs(directorio, exist_ok=True)
+    fd, temporal = tempfile.mkstemp(suffix='.tmp', dir=directorio)
+    try:
+        with os.fdopen(fd, 'wb') as archivo:
+            archivo.write(datos)
+        os.replace(temporal, destino)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+class Almacenamiento(ABC):
+    """
+    Interfaz común. Las subclases implementan leer/guardar/existe/borrar/
+    listar/tocar (un backend incompleto falla al crearse); ruta_local()
+    agrega el caché de lectura en disco.
+    """
+    nombre = None
+
+    def __init__(self, cache_dir=CACHE_DIR_POR_DEFECTO):
+        self.cache_dir = cache_dir
+
+    @abstractmethod
+    def guardar(self, clave, datos):
+        """Crea o reemplaza el archivo de la clave"""
+
+    @abstractmethod
+    def leer(self, clave):
+        """Bytes del archivo o None si no existe"""
+
+    @abstractmethod
+    def existe(self, clave):
+        """True si la clave tiene un archivo"""
+
+    @abstractmethod
+    def borrar(self, clave):
+        """Elimina el archivo (sin error si no existe)"""
+
+    @abstractmethod
+    def listar(self, prefijo):
+        """Genera (clave, tamano, modificado_epoch) de las claves bajo `prefijo`"""
+
+    @abstractmethod
+    def tocar(self, clave):
+        """Renueva la fecha del archivo (la recolección respeta los recientes)"""
+
+    def _ruta_cache(self, clave):
+        return os.path.join(self.cache_dir, *clave.split('/'))
+
+    def ruta_local(self, clave):
+        """
+        Ruta de un archivo local con el contenido de la clave (para Pillow y
+        ReportLab), descargándolo al caché la primera vez. None si no existe.
+        """
+        ruta = self._ruta_cache(clave)
+        if os.path.exists(ruta):
+            return ruta
+
+        datos = self.leer(clave)
+        if datos is None:
+            return None
+        _escribir_atomico(ruta, datos)
+        return ruta
+
+    def _guardar_cache(self, clave, datos):
+        # Escritura a través del caché: el PDF de este nodo no vuelve a descargarlo
+        _escribir_atomico(self._ruta_cache(clave), datos)
+
+    def _borrar_cache(self, clave):
+        try:
+            os.remove(self._ruta_cache(clave))
+        except OSError:
+            pass
+
+
+class AlmacenamientoLocal(Almacenamiento):
+    """Archivos bajo una carpeta local (por defecto, static de la app)"""
+    nombre = 'local'
+
+    def __init__(self, raiz):
+        super().__init__(cache_dir=raiz)
+        self.raiz = raiz
+
+    def _ruta(self, clave):
+        return os.path.join(self.raiz, *clave.split('/'))
+
+    def guardar(self, clave, datos):
+        _escribir_atomico(self._ruta(clave), datos)
+
+    def leer(self, clave):
+        try:
+            with open(self._ruta(clave), 'rb') as archivo:
+                return archivo.read()
+        except FileNotFoundError:
+            return None
+
+    def existe(self, clave):
+        return os.path.exists(self._ruta(clave))
+
+    def borrar(self, clave):
+        try:
+            os.remove(self._ruta(clave))
+        except OSError:
+            pass
+
+    def tocar(self, clave):
+        try:
+            os.utime(self._ruta(clave), None)
+        except OSError:
+            pass
+
+    def ruta_local(self, clave):
+        # Ya es local: no hace falta caché
+        ruta = self._ruta(clave)
+        return ruta if os.path.exists(ruta) else None
+
+    def listar(self, prefijo):
+        raiz = self._ruta(prefijo)
+        for directorio, _, archivos in os.walk(raiz):
+            for nombre in archivos:
+                ruta = os.path.join(directorio, nombre)
+                try:
+                    info = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                clave = os.path.relpath(ruta, self.raiz).replace(os.sep, '/')
+                yield clave, info.st_size, info.st_mtime
+
+
+class AlmacenamientoBD(Almacenamiento):
+    """
+    Archivos como BLOB en la tabla archivos_blob. Usa sesiones propias sobre
+    el engine, así funciona también desde los hilos de firmas (sin app context).
+    """
+    nombre = 'bd'
+
+    def __init__(self, engine, cache_dir=CACHE_DIR_POR_DEFECTO):
+        super().__init__(cache_dir=cache_dir)
+        self.engine = engine
+
+    def guardar(self, clave, datos):
+        with Session(self.engine) as sesion:
+            sesion.merge(ArchivoBlob(clave=clave, datos=datos, tamano=len(datos), created_at=now_colombia()))
+            sesion.commit()
+        self._guardar_cache(clave, datos)
+
+    def leer(self, clave):
+        with Session(self.engine) as sesion:
+            return sesion.scalar(db.select(ArchivoBlob.datos).where(ArchivoBlob.clave == clave))
+
+    def existe(self, clave):
+        with Session(self.engine) as sesion:
+            return sesion.scalar(db.select(ArchivoBlob.clave).where(ArchivoBlob.clave == clave)) is not None
+
+    def borrar(self, clave):
+        with Session(self.engine) as sesion:
+            sesion.execute(db.delete(ArchivoBlob).where(ArchivoBlob.clave == clave))
+            sesion.commit()
+        self._borrar_cache(clave)
+
+    def tocar(self, clave):
+        with Session(self.engine) as sesion:
+            sesion.execute(
+                db.update(ArchivoBlob).where(ArchivoBlob.clave == clave).values(created_at=now_colombia())
+            )
+            sesion.commit()
+
+    def listar(self, prefijo):
+        consulta = db.select(
+            ArchivoBlob.clave, ArchivoBlob.tamano, ArchivoBlob.created_at
+        ).where(ArchivoBlob.clave.startswith(prefijo.rstrip('/') + '/'))
+        with Session(self.engine) as sesion:
+            filas = sesion.execute(consulta).all()
+        for clave, tamano, creado in filas:
+            # created_at se guarda con la hora de Colombia
+            modificado = creado.replace(tzinfo=now_colombia().tzinfo).timestamp() if creado else 0
+            yield clave, tamano, modificado
+
+
+class AlmacenamientoS3(Almacenamiento):
+    """Bucket de una API compatible con S3 (AWS, MinIO, etc.)"""
+    nombre = 's3'
+
+    def __init__(self, bucket, prefijo='', endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, cache_dir=CACHE_DIR_POR_DEFECTO):
+        super().__init__(cache_dir=cache_dir)
+        try:
+            import boto3
+        except ImportError as e:
+            raise AlmacenamientoError('El backend s3 requiere boto3') from e
+
+        self.bucket = bucket
+        self.prefijo = prefijo.strip('/')
+        self.cliente = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key
+        )
+
+    def _clave_s3(self, clave):
+        return f"{self.prefijo}/{clave}" if self.prefijo else clave
+
+    def guardar(self, clave, datos):
+        self.cliente.put_object(Bucket=self.bucket, Key=self._clave_s3(clave), Body=datos)
+        self._guardar_cache(clave, datos)
+
+    def leer(self, clave):
+        try:
+            respuesta = self.cliente.get_object(Bucket=self.bucket, Key=self._clave_s3(clave))
+        except self.cliente.exceptions.NoSuchKey:
+            return None
+        return respuesta['Body'].read()
+
+    def existe(self, clave):
+        from botocore.exceptions import ClientError
+        try:
+            self.cliente.head_object(Bucket=self.bucket, Key=self._clave_s3(clave))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def borrar(self, clave):
+        self.cliente.delete_object(Bucket=self.bucket, Key=self._clave_s3(clave))
+        self._borrar_cache(clave)
+
+    def tocar(self, clave):
+        # S3 no cambia LastModified en sitio: copiar el objeto sobre sí mismo
+        # (REPLACE es obligatorio para una copia a la misma clave)
+        from botocore.exceptions import ClientError
+        clave_s3 = self._clave_s3(clave)
+        try:
+            self.cliente.copy_object(
+                Bucket=self.bucket, Key=clave_s3,
+                CopySource={'Bucket': self.bucket, 'Key': clave_s3},
+                MetadataDirective='REPLACE'
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+
+    def listar(self, prefijo):
+        paginador = self.cliente.get_paginator('list_objects_v2')
+        inicio = len(self.prefijo) + 1 if self.prefijo else 0
+        for pagina in paginador.paginate(Bucket=self.bucket, Prefix=self._clave_s3(prefijo.rstrip('/') + '/')):
+            for objeto in pagina.get('Contents', []):
+                yield objeto['Key'][inicio:], objeto['Size'], objeto['LastModified'].timestamp()
+
+
+def crear_almacenamiento(config, static_dir, engine=None):
+    """Construye el backend indicado en ALMACEN_BACKEND"""
+    backend = str(config.get('ALMACEN_BACKEND', 'local')).lower()
+    cache_dir = config.get('ALMACEN_CACHE_DIR', CACHE_DIR_POR_DEFECTO)
+
+    if backend == 'local':
+        return AlmacenamientoLocal(config.get('ALMACEN_LOCAL_DIR') or static_dir)
+    if backend == 'bd':
+        return AlmacenamientoBD(engine if engine is not None else db.engine, cache_dir=cache_dir)
+    if backend == 's3':
+        return AlmacenamientoS3(
+            bucket=config['ALMACEN_S3_BUCKET'],
+            prefijo=config.get('ALMACEN_S3_PREFIJO', ''),
+            endpoint_url=config.get('ALMACEN_S3_ENDPOINT'),
+            region=config.get('ALMACEN_S3_REGION'),
+            access_key=config.get('ALMACEN_S3_ACCESS_KEY'),
+            secret_key=config.get('ALMACEN_S3_SECRET_KEY'),
+            cache_dir=cache_dir
+        )
+
+    raise AlmacenamientoError(f'Backend de almacenamiento desconocido: {backend}. Use {", ".join(BACKENDS)}')
+
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def obtener_almacenamiento(config, static_dir):
+    """Retorna el backend del proceso, configurado desde app.config"""
+    global _almacen
+    if _almacen is None:
+        with _almacen_lock:
+            if _almacen is None:
+                _almacen = crear_almacenamiento(config, static_dir)
+    return _almacen
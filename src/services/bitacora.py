@@ -0,0 +1,203 @@
+"""
+Bitácora (logging) de la aplicación sin escrituras en el hilo de la petición.
+
+Los módulos usan `logging.getLogger(__name__)`. configurar_bitacora(app)
+conecta el logger 'src' a un QueueHandler: la petición solo arma el
+registro y lo pone en una cola; un QueueListener en un hilo aparte lo
+escribe en stdout. Así un colector de logs lento no agrega latencia.
+
+Cada registro lleva el id de la petición (encabezado X-Request-ID o uno
+nuevo, que se devuelve en la respuesta), el método, la ruta y los
+milisegundos transcurridos. Al terminar cada petición se escribe una línea
+'peticion' con el status y la duración total.
+
+Configuración (app.config o variables de entorno):
+- LOG_FORMATO: 'json' (por defecto) o 'texto'
+- LOG_NIVEL: nivel general (INFO)
+- LOG_NIVELES: niveles por módulo, p. ej.
+  'src.routes.asistencia=WARNING,src.services.firmas=DEBUG'
+- LOG_MUESTREO: fracción de peticiones que se registran por endpoint (los
+  avisos y errores siempre se registran). Por defecto /api/estado al 1 %:
+  'asistencia.obtener_estado=0.01'
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+LOGGER_RAIZ = 'src'
+ENCABEZADO_ID = 'X-Request-ID'
+MUESTREO_POR_DEFECTO = 'asistencia.obtener_estado=0.01'
+CAMPOS_ESTANDAR = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+logger = logging.getLogger(__name__)
+
+# Endpoint -> fracción de peticiones registradas
+_muestreo = {}
+_listener = None
+# Proceso dueño del hilo escritor: tras un fork (workers de gunicorn) el hilo
+# no existe en el hijo y hay que crear otro
+_listener_pid = None
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos extra del contexto"""
+
+    def format(self, record):
+        datos = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in CAMPOS_ESTANDAR and not clave.startswith('_'):
+                datos[clave] = valor
+        if record.exc_text:
+            datos['excepcion'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FormatoTexto(logging.Formatter):
+    """Formato legible para desarrollo"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        texto = super().format(record)
+        if getattr(record, 'duracion_ms', None) is not None and getattr(record, 'evento', None) == 'peticion':
+            texto += f" ({record.duracion_ms} ms)"
+        return texto
+
+
+class ContextoPeticion(logging.Filter):
+    """
+    Agrega request_id, método, ruta y ms transcurridos, y descarta los
+    registros de las peticiones que no salieron en el muestreo. Corre en el
+    hilo de la petición (antes de encolar).
+    """
+
+    def filter(self, record):
+        if not has_request_context() or 'request_id' not in g:
+            return True
+
+        if not g.get('registrar_peticion', True) and record.levelno < logging.WARNING:
+            return False
+
+        record.request_id = g.request_id
+        record.metodo = request.method
+        record.ruta = request.path
+        if not hasattr(record, 'duracion_ms'):
+            record.duracion_ms = round((time.perf_counter() - g.inicio_peticion) * 1000, 2)
+        return True
+
+
+class ColaConContexto(logging.handlers.QueueHandler):
+    """
+    QueueHandler que deja el mensaje ya interpolado y la traza de la
+    excepción como texto (el formateador corre en el hilo del listener).
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def _leer(app, config, clave, por_defecto=None):
+    return config.get(clave) or app.config.get(clave) or os.environ.get(clave) or por_defecto
+
+
+def _pares(texto):
+    """'a=1,b=2' -> {'a': '1', 'b': '2'}"""
+    pares = {}
+    for parte in (texto or '').split(','):
+        if '=' in parte:
+            clave, valor = parte.split('=', 1)
+            pares[clave.strip()] = valor.strip()
+    return pares
+
+
+def _antes_de_peticion():
+    g.request_id = (request.headers.get(ENCABEZADO_ID) or uuid.uuid4().hex[:16])[:64]
+    g.inicio_peticion = time.perf_counter()
+    fraccion = _muestreo.get(request.endpoint)
+    g.registrar_peticion = fraccion is None or random.random() < fraccion
+
+
+def _despues_de_peticion(respuesta):
+    if 'request_id' not in g:
+        return respuesta
+    respuesta.headers[ENCABEZADO_ID] = g.request_id
+    duracion = round((time.perf_counter() - g.inicio_peticion) * 1000, 2)
+    nivel = logging.WARNING if respuesta.status_code >= 500 else logging.INFO
+    logger.log(nivel, '%s %s %s', request.method, request.path, respuesta.status_code, extra={
+        'evento': 'peticion',
+        'status': respuesta.status_code,
+        'duracion_ms': duracion,
+        'endpoint': request.endpoint,
+    })
+    return respuesta
+
+
+def configurar_bitacora(app, config=None):
+    """
+    Conecta el logger 'src' a la cola y arranca el escritor en segundo plano.
+    - config: diccionario que sobrescribe app.config (el de create_app)
+    """
+    global _listener, _listener_pid
+    config = config or {}
+
+    raiz = logging.getLogger(LOGGER_RAIZ)
+    raiz.setLevel(_leer(app, config, 'LOG_NIVEL', 'INFO').upper())
+    raiz.propagate = False
+    for modulo, nivel in _pares(_leer(app, config, 'LOG_NIVELES')).items():
+        logging.getLogger(modulo).setLevel(nivel.upper())
+
+    _muestreo.clear()
+    _muestreo.update({
+        endpoint: float(fraccion)
+        for endpoint, fraccion in _pares(_leer(app, config, 'LOG_MUESTREO', MUESTREO_POR_DEFECTO)).items()
+    })
+
+    if _listener is None or _listener_pid != os.getpid():
+        salida = logging.StreamHandler(sys.stdout)
+        salida.setFormatter(FormatoTexto() if _leer(app, config, 'LOG_FORMATO', 'json') == 'texto' else FormatoJSON())
+
+        cola = queue.SimpleQueue()
+        manejador = ColaConContexto(cola)
+        manejador.addFilter(ContextoPeticion())
+        raiz.handlers[:] = [manejador]
+
+        _listener = logging.handlers.QueueListener(cola, salida)
+        _listener.start()
+        _listener_pid = os.getpid()
+        atexit.register(detener_bitacora)
+
+    app.before_request(_antes_de_peticion)
+    app.after_request(_despues_de_peticion)
+
+
+def detener_bitacora():
+    """Vacía la cola y detiene el escritor (al salir del proceso)"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener = None
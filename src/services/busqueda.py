@@ -0,0 +1,231 @@
+"""
+Búsqueda de asistentes por nombre o documento con índice.
+
+`nombres_apellidos.contains(...)` es un LIKE '%...%' que recorre toda la
+tabla de asistentes en cada búsqueda. Aquí la búsqueda usa un índice según
+el motor:
+
+- PostgreSQL: índice GIN con pg_trgm sobre unaccent(lower(nombre || ' ' ||
+  documento)). Sigue siendo búsqueda por subcadena, sin distinguir tildes ni
+  mayúsculas, y se ordena por similitud (word_similarity).
+- SQLite: tabla virtual FTS5 asistentes_fts con el tokenizador trigram,
+  mantenida con triggers, sobre asistentes.nombre_busqueda (el nombre en
+  minúsculas y sin tildes, calculado en Python con sin_tildes() al
+  insertar) y el documento. La búsqueda se normaliza igual, así 'Gomez'
+  encuentra 'Gómez' sin depender de la versión de SQLite. Cada palabra se
+  compara como subcadena, igual que en PostgreSQL y que el LIKE original
+  ('mez' encuentra 'Gómez', '3456' el documento 1023456), y se ordena por
+  bm25. El trigram no indexa palabras de menos de 3 caracteres: esas se
+  filtran con LIKE sobre las filas que ya coincidieron (o sobre toda la
+  tabla si no hay otra palabra).
+
+Si el índice no existe (extensiones no disponibles, otro motor) se usa el
+LIKE original. crear_indice_busqueda() crea el índice y lo llena la primera
+vez; es idempotente.
+"""
+import logging
+import re
+
+from sqlalchemy import text, func, literal_column, or_, table, column
+from sqlalchemy.orm import joinedload
+
+from src.models.asistencia import db, Asistente, sin_tildes
+
+# Función IMMUTABLE (requisito para indexar): unaccent() por sí sola es STABLE
+SQL_POSTGRES = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    CREATE OR REPLACE FUNCTION busqueda_normalizada(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT unaccent('unaccent', lower($1)) $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_asistentes_busqueda_trgm ON asistentes
+    USING gin (busqueda_normalizada(nombres_apellidos || ' ' || numero_documento) gin_trgm_ops)
+    """,
+)
+
+# Palabras más cortas no tienen trigramas: se buscan con LIKE
+LONGITUD_MINIMA_FTS = 3
+
+SQL_SQLITE = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS asistentes_fts USING fts5(
+        nombre_busqueda, numero_documento,
+        content='asistentes', content_rowid='id',
+        tokenize='trigram case_sensitive 0'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS asistentes_fts_insert AFTER INSERT ON asistentes BEGIN
+        INSERT INTO asistentes_fts(rowid, nombre_busqueda, numero_documento)
+        VALUES (new.id, new.nombre_busqueda, new.numero_documento);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS asistentes_fts_delete AFTER DELETE ON asistentes BEGIN
+        INSERT INTO asistentes_fts(asistentes_fts, rowid, nombre_busqueda, numero_documento)
+        VALUES ('delete', old.id, old.nombre_busqueda, old.numero_documento);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS asistentes_fts_update AFTER UPDATE ON asistentes BEGIN
+        INSERT INTO asistentes_fts(asistentes_fts, rowid, nombre_busqueda, numero_documento)
+        VALUES ('delete', old.id, old.nombre_busqueda, old.numero_documento);
+        INSERT INTO asistentes_fts(rowid, nombre_busqueda, numero_documento)
+        VALUES (new.id, new.nombre_busqueda, new.numero_documento);
+    END
+    """,
+)
+
+ASISTENTES_FTS = table('asistentes_fts', column('rowid'))
+
+logger = logging.getLogger(__name__)
+
+# Motor -> si el índice está disponible (se consulta una vez por proceso)
+_disponible = {}
+
+
+def crear_indice_busqueda(engine=None):
+    """
+    Crea el índice de búsqueda del motor actual (y lo llena si es nuevo).
+    Retorna True si quedó disponible. Debe llamarse dentro de un app context.
+    """
+    engine = engine if engine is not None else db.engine
+    dialecto = engine.dialect.name
+    _disponible.pop(engine.url, None)
+
+    try:
+        if dialecto == 'postgresql':
+            with engine.begin() as conn:
+                for sentencia in SQL_POSTGRES:
+                    conn.execute(text(sentencia))
+        elif dialecto == 'sqlite':
+            with engine.begin() as conn:
+                definicion = conn.execute(text(
+                    "SELECT sql FROM sqlite_master WHERE name = 'asistentes_fts'"
+                )).scalar()
+                if definicion is not None and 'nombre_busqueda' not in definicion:
+                    # Índice de una versión anterior (sobre nombres_apellidos): se
+                    # rehace junto con sus triggers
+                    for trigger in ('insert', 'delete', 'update'):
+                        conn.execute(text(f"DROP TRIGGER IF EXISTS asistentes_fts_{trigger}"))
+                    conn.execute(text("DROP TABLE asistentes_fts"))
+                    definicion = None
+                for sentencia in SQL_SQLITE:
+                    conn.execute(text(sentencia))
+                if definicion is None:
+                    conn.execute(text("INSERT INTO asistentes_fts(asistentes_fts) VALUES ('rebuild')"))
+        else:
+            return False
+    except Exception as e:
+        logger.warning("⚠️ No se pudo crear el índice de búsqueda (%s): %s", dialecto, e)
+        return False
+
+    logger.info("✅ Índice de búsqueda de asistentes listo (%s)", dialecto)
+    return True
+
+
+def _indice_disponible():
+    engine = db.engine
+    if engine.url not in _disponible:
+        dialecto = engine.dialect.name
+        if dialecto == 'postgresql':
+            consulta = "SELECT to_regclass('ix_asistentes_busqueda_trgm') IS NOT NULL"
+        elif dialecto == 'sqlite':
+            consulta = "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE name = 'asistentes_fts')"
+        else:
+            consulta = None
+        with engine.connect() as conn:
+            _disponible[engine.url] = bool(conn.execute(text(consulta)).scalar()) if consulta else False
+    return _disponible[engine.url]
+
+
+def _consulta_fts(busqueda):
+    """
+    'José  Pér 12' -> ('"jose" "per"', ['12']): sin tildes ni mayúsculas,
+    las palabras de 3 o más caracteres como subcadenas del trigram (todas
+    obligatorias) y las cortas aparte, para filtrarlas con LIKE.
+    """
+    palabras = re.findall(r'\w+', sin_tildes(busqueda))
+    largas = [p for p in palabras if len(p) >= LONGITUD_MINIMA_FTS]
+    cortas = [p for p in palabras if len(p) < LONGITUD_MINIMA_FTS]
+    return ' '.join(f'"{palabra}"' for palabra in largas), cortas
+
+
+def _filtro_like(palabras):
+    return db.and_(*(
+        or_(Asistente.nombre_busqueda.contains(palabra), Asistente.numero_documento.contains(palabra))
+        for palabra in palabras
+    ))
+
+
+def _coincide(consulta_fts):
+    return literal_column('asistentes_fts').op('MATCH')(consulta_fts)
+
+
+def _expresion_postgres():
+    return func.busqueda_normalizada(Asistente.nombres_apellidos + ' ' + Asistente.numero_documento)
+
+
+def filtro_busqueda(busqueda):
+    """Condición SQLAlchemy para filtrar asistentes por nombre o documento"""
+    busqueda = busqueda.strip()
+    if _indice_disponible():
+        if db.engine.dialect.name == 'postgresql':
+            patron = func.concat('%', func.busqueda_normalizada(busqueda), '%')
+            return _expresion_postgres().like(patron)
+
+        consulta, cortas = _consulta_fts(busqueda)
+        if not consulta and not cortas:
+            return db.false()
+        condiciones = [_filtro_like(cortas)] if cortas else []
+        if consulta:
+            condiciones.append(Asistente.id.in_(
+                db.select(ASISTENTES_FTS.c.rowid).where(_coincide(consulta))
+            ))
+        return db.and_(*condiciones)
+
+    return or_(
+        Asistente.nombres_apellidos.contains(busqueda),
+        Asistente.numero_documento.contains(busqueda)
+    )
+
+
+def buscar_asistentes(busqueda, condiciones=(), limite=50):
+    """
+    Asistentes que coinciden con la búsqueda, del más al menos relevante.
+    - condiciones: filtros adicionales (capacitación, fecha...)
+    Retorna una lista de (Asistente, puntaje); sin índice el puntaje es None
+    y el orden es por hora de llegada.
+    """
+    busqueda = busqueda.strip()
+    # to_dict() usa la capacitación: se trae en el mismo SELECT
+    consulta = db.select(Asistente).options(joinedload(Asistente.configuracion)).filter(*condiciones)
+
+    if _indice_disponible() and db.engine.dialect.name == 'postgresql':
+        puntaje = func.word_similarity(func.busqueda_normalizada(busqueda), _expresion_postgres())
+        consulta = consulta.add_columns(puntaje).filter(filtro_busqueda(busqueda)).order_by(
+            puntaje.desc(), Asistente.hora_llegada.desc()
+        )
+    elif _indice_disponible():
+        fts_consulta, cortas = _consulta_fts(busqueda)
+        if not fts_consulta and not cortas:
+            return []
+        if cortas:
+            consulta = consulta.filter(_filtro_like(cortas))
+        if fts_consulta:
+            # bm25 es negativo: más pequeño = más relevante
+            puntaje = literal_column('bm25(asistentes_fts, 10.0, 5.0)')
+            consulta = consulta.add_columns(-puntaje).join(
+                ASISTENTES_FTS, ASISTENTES_FTS.c.rowid == Asistente.id
+            ).where(_coincide(fts_consulta)).order_by(puntaje, Asistente.hora_llegada.desc())
+        else:
+            consulta = consulta.add_columns(db.null()).order_by(Asistente.hora_llegada.desc())
+    else:
+        consulta = consulta.add_columns(db.null()).filter(filtro_busqueda(busqueda)).order_by(
+            Asistente.hora_llegada.desc()
+        )
+
+    return [(asistente, puntaje) for asistente, puntaje in db.session.execute(consulta.limit(limite))]
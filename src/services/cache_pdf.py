@@ -0,0 +1,112 @@
+"""
+Caché en disco de los PDF de asistencia.
+
+La clave resume todo lo que cambia el documento (capacitaciones, fecha,
+cantidad e id máximo de asistentes, capacitador y su firma). Si nada cambió
+se sirve el archivo guardado; si llegó un asistente nuevo o la firma del
+capacitador, la clave cambia y el PDF se regenera. El directorio se limita
+por tamaño total y número de archivos, borrando primero los menos usados.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DIRECTORIO_POR_DEFECTO = os.path.join(tempfile.gettempdir(), 'registro_asistencia_pdf')
+MAX_BYTES_POR_DEFECTO = 200 * 1024 * 1024
+MAX_ARCHIVOS_POR_DEFECTO = 200
+
+
+def calcular_clave(*partes):
+    """Hash estable de los valores que determinan el contenido del PDF"""
+    texto = json.dumps(partes, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+class CachePDF:
+    """Archivos PDF nombrados por clave, con desalojo LRU por tamaño"""
+
+    def __init__(self, directorio=DIRECTORIO_POR_DEFECTO, max_bytes=MAX_BYTES_POR_DEFECTO,
+                 max_archivos=MAX_ARCHIVOS_POR_DEFECTO):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.max_archivos = max_archivos
+        self._lock = threading.Lock()
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pdf")
+
+    def obtener(self, clave):
+        """Retorna la ruta del PDF en caché o None"""
+        ruta = self._ruta(clave)
+        try:
+            # Actualizar la fecha de acceso para el desalojo LRU
+            os.utime(ruta, None)
+        except FileNotFoundError:
+            return None
+        return ruta
+
+    def archivo_temporal(self):
+        """Ruta temporal dentro del directorio del caché (para luego guardar)"""
+        fd, ruta = tempfile.mkstemp(suffix='.pdf.tmp', dir=self.directorio)
+        os.close(fd)
+        return ruta
+
+    def guardar(self, clave, ruta_temporal):
+        """Mueve el PDF generado al caché (reemplazo atómico) y aplica el límite"""
+        ruta = self._ruta(clave)
+        os.replace(ruta_temporal, ruta)
+        self._desalojar()
+        return ruta
+
+    def _desalojar(self):
+        with self._lock:
+            archivos = []
+            ahora = time.time()
+            for nombre in os.listdir(self.directorio):
+                ruta = os.path.join(self.directorio, nombre)
+                try:
+                    info = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                if nombre.endswith('.tmp'):
+                    # Temporales huérfanos de generaciones interrumpidas
+                    if ahora - info.st_mtime > 3600:
+                        self._borrar(ruta)
+                    continue
+                archivos.append((info.st_mtime, info.st_size, ruta))
+
+            archivos.sort()
+            total = sum(tamano for _, tamano, _ in archivos)
+            while archivos and (total > self.max_bytes or len(archivos) > self.max_archivos):
+                _, tamano, ruta = archivos.pop(0)
+                self._borrar(ruta)
+                total -= tamano
+
+    @staticmethod
+    def _borrar(ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache(config):
+    """Retorna el caché de PDF del proceso, configurado desde app.config"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CachePDF(
+                    directorio=config.get('PDF_CACHE_DIR', DIRECTORIO_POR_DEFECTO),
+                    max_bytes=config.get('PDF_CACHE_MAX_BYTES', MAX_BYTES_POR_DEFECTO),
+                    max_archivos=config.get('PDF_CACHE_MAX_ARCHIVOS', MAX_ARCHIVOS_POR_DEFECTO)
+                )
+    return _cache
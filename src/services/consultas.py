@@ -0,0 +1,164 @@
+"""
+Conteo de consultas SQL por bloque de código o por petición.
+
+Sirve para encontrar consultas N+1 (la misma sentencia ejecutada una vez por
+fila) y consultas duplicadas (misma sentencia y mismos parámetros):
+
+    with contar_consultas() as registro:
+        client.get('/admin/asistentes')
+    assert registro.total <= 6, registro.resumen()
+
+Con app.debug o CONSULTAS_DEBUG (config o variable de entorno) cada
+respuesta lleva los encabezados X-Consultas-SQL (cantidad),
+X-Consultas-Tiempo-ms y X-Consultas-Repetidas (sentencias ejecutadas más de
+una vez), y las repetidas quedan en la bitácora como aviso.
+
+Solo se cuentan las consultas del hilo que abrió el registro.
+"""
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g
+
+from src.models.asistencia import db
+from src.services.metricas import instrumentar_motor, observar_consultas
+
+logger = logging.getLogger(__name__)
+
+# Registros activos del hilo actual (se pueden anidar)
+_activos = threading.local()
+
+
+def _normalizar(sentencia):
+    return re.sub(r'\s+', ' ', sentencia).strip()
+
+
+class RegistroConsultas:
+    """Sentencias ejecutadas mientras el registro estuvo activo"""
+
+    def __init__(self):
+        self.sentencias = []  # (sql, parámetros, segundos)
+
+    @property
+    def total(self):
+        return len(self.sentencias)
+
+    @property
+    def segundos(self):
+        return sum(duracion for _, _, duracion in self.sentencias)
+
+    def repetidas(self, minimo=2):
+        """
+        Sentencias (mismo SQL) ejecutadas `minimo` veces o más:
+        [(sql, veces, combinaciones distintas de parámetros)], de más a menos.
+        Muchas veces con parámetros distintos suele ser un N+1; con los mismos
+        parámetros, una consulta duplicada.
+        """
+        veces = Counter(sql for sql, _, _ in self.sentencias)
+        parametros = {}
+        for sql, params, _ in self.sentencias:
+            parametros.setdefault(sql, set()).add(params)
+        return [
+            (sql, cantidad, len(parametros[sql]))
+            for sql, cantidad in veces.most_common()
+            if cantidad >= minimo
+        ]
+
+    def duplicadas(self):
+        """Sentencias repetidas con exactamente los mismos parámetros"""
+        return [(sql, veces) for sql, veces, distintos in self.repetidas() if distintos < veces]
+
+    def resumen(self, ancho=160):
+        lineas = [f'{self.total} consultas, {self.segundos * 1000:.1f} ms']
+        for sql, veces, distintos in self.repetidas():
+            lineas.append(f'  {veces}× ({distintos} parámetros distintos) {sql[:ancho]}')
+        return '\n'.join(lineas)
+
+
+def _registrar_consulta(statement, parameters, duracion):
+    pila = getattr(_activos, 'pila', None)
+    if not pila:
+        return
+    entrada = (_normalizar(statement), repr(parameters), duracion)
+    for registro in pila:
+        registro.sentencias.append(entrada)
+
+
+# El cronómetro es el de las métricas: un solo par de eventos por Engine
+observar_consultas(_registrar_consulta)
+
+
+def _abrir():
+    registro = RegistroConsultas()
+    if not hasattr(_activos, 'pila'):
+        _activos.pila = []
+    _activos.pila.append(registro)
+    return registro
+
+
+def _cerrar(registro):
+    pila = getattr(_activos, 'pila', [])
+    if registro in pila:
+        pila.remove(registro)
+
+
+@contextmanager
+def contar_consultas(engine=None):
+    """
+    Registra las consultas del bloque. Sin `engine` usa db.engine (requiere
+    app context); con un test_client sirve el de la app.
+    """
+    instrumentar_motor(engine if engine is not None else db.engine)
+    registro = _abrir()
+    try:
+        yield registro
+    finally:
+        _cerrar(registro)
+
+
+# --- Encabezados en modo debug ---
+
+def _activo():
+    return current_app.debug or bool(
+        current_app.config.get('CONSULTAS_DEBUG') or os.environ.get('CONSULTAS_DEBUG')
+    )
+
+
+def _antes_de_peticion():
+    if not _activo():
+        return
+    instrumentar_motor(db.engine)
+    g.registro_consultas = _abrir()
+
+
+def _despues_de_peticion(respuesta):
+    registro = g.pop('registro_consultas', None)
+    if registro is None:
+        return respuesta
+    _cerrar(registro)
+
+    repetidas = registro.repetidas()
+    respuesta.headers['X-Consultas-SQL'] = str(registro.total)
+    respuesta.headers['X-Consultas-Tiempo-ms'] = f'{registro.segundos * 1000:.1f}'
+    respuesta.headers['X-Consultas-Repetidas'] = str(len(repetidas))
+    if repetidas:
+        logger.warning('⚠️ Consultas repetidas en la petición\n%s', registro.resumen())
+    return respuesta
+
+
+def _cerrar_al_terminar(error=None):
+    # Si la vista falló, after_request no corre: no dejar el registro abierto
+    registro = g.pop('registro_consultas', None)
+    if registro is not None:
+        _cerrar(registro)
+
+
+def configurar_conteo_consultas(app):
+    """Agrega los encabezados X-Consultas-* (solo con app.debug o CONSULTAS_DEBUG)"""
+    app.before_request(_antes_de_peticion)
+    app.after_request(_despues_de_peticion)
+    app.teardown_request(_cerrar_al_terminar)
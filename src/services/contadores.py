@@ -0,0 +1,152 @@
+"""
+Contadores materializados de asistencia para el dashboard.
+
+registrar_asistencia suma 1 al total, al cargo y a la ruta de su
+(capacitación, fecha) dentro de la misma transacción del INSERT, con un
+UPSERT (INSERT ... ON CONFLICT DO UPDATE) que funciona en SQLite y
+PostgreSQL. Así el dashboard lee unas pocas filas por índice en lugar de
+contar la tabla de asistentes tres veces en cada actualización.
+
+reconstruir_contadores() vuelve a calcular todo desde las filas de
+asistentes (comando `flask reconstruir-contadores`).
+"""
+import logging
+
+from sqlalchemy import func, select, delete
+
+from src.models.asistencia import db, Asistente, ContadorAsistencia
+
+DIMENSIONES = ('cargo', 'ruta')
+
+logger = logging.getLogger(__name__)
+
+
+def _insert(session):
+    """INSERT con soporte de ON CONFLICT según el motor de la sesión"""
+    if session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(ContadorAsistencia)
+
+
+def incrementar_contadores(session, asistentes, cantidad=1):
+    """
+    Suma `cantidad` a los contadores de uno o varios asistentes (un solo
+    UPSERT). No hace commit: debe ejecutarse antes del commit que guarda a
+    los asistentes.
+    """
+    if isinstance(asistentes, (Asistente, dict)):
+        asistentes = [asistentes]
+
+    # Agrupar por fila de contador: ON CONFLICT no admite la misma fila dos
+    # veces en un mismo INSERT
+    sumas = {}
+    for asistente in asistentes:
+        # Acepta objetos Asistente o diccionarios de un INSERT masivo
+        campo = asistente.get if isinstance(asistente, dict) else (lambda nombre: getattr(asistente, nombre))
+        base = (campo('configuracion_id'), campo('fecha_registro'))
+        for dimension, valor in (('total', ''), ('cargo', campo('cargo') or ''), ('ruta', campo('ruta') or '')):
+            llave = base + (dimension, valor)
+            sumas[llave] = sumas.get(llave, 0) + cantidad
+
+    if not sumas:
+        return
+
+    filas = [
+        dict(configuracion_id=configuracion_id, fecha=fecha, dimension=dimension, valor=valor, cantidad=total)
+        for (configuracion_id, fecha, dimension, valor), total in sumas.items()
+    ]
+
+    sentencia = _insert(session).values(filas)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=['configuracion_id', 'fecha', 'dimension', 'valor'],
+        set_={'cantidad': ContadorAsistencia.cantidad + sentencia.excluded.cantidad}
+    )
+    session.execute(sentencia)
+
+
+def resumen_del_dia(fecha, configuracion_id=None):
+    """
+    Totales de una fecha (todas las capacitaciones o una sola):
+    {'total': n, 'por_cargo': {...}, 'por_ruta': {...}}
+    """
+    consulta = db.session.query(
+        ContadorAsistencia.dimension,
+        ContadorAsistencia.valor,
+        ContadorAsistencia.cantidad
+    ).filter(ContadorAsistencia.fecha == fecha)
+
+    if configuracion_id is not None:
+        consulta = consulta.filter(ContadorAsistencia.configuracion_id == configuracion_id)
+
+    resumen = {'total': 0, 'por_cargo': {}, 'por_ruta': {}}
+    for dimension, valor, cantidad in consulta.all():
+        if dimension == 'total':
+            resumen['total'] += cantidad
+        elif cantidad:
+            grupo = resumen[f'por_{dimension}']
+            grupo[valor] = grupo.get(valor, 0) + cantidad
+
+    return resumen
+
+
+def reconstruir_contadores(fecha=None):
+    """
+    Recalcula los contadores desde la tabla de asistentes (de una fecha o de
+    todas) en una sola transacción. Retorna cuántas filas de contador quedaron.
+    """
+    condiciones_contador = []
+    condiciones_asistente = []
+    if fecha is not None:
+        condiciones_contador.append(ContadorAsistencia.fecha == fecha)
+        condiciones_asistente.append(Asistente.fecha_registro == fecha)
+
+    nuevas = []
+
+    totales = db.session.execute(
+        select(Asistente.configuracion_id, Asistente.fecha_registro, func.count(Asistente.id))
+        .filter(*condiciones_asistente)
+        .group_by(Asistente.configuracion_id, Asistente.fecha_registro)
+    ).all()
+    for configuracion_id, fecha_registro, cantidad in totales:
+        nuevas.append(dict(
+            configuracion_id=configuracion_id, fecha=fecha_registro,
+            dimension='total', valor='', cantidad=cantidad
+        ))
+
+    for dimension in DIMENSIONES:
+        columna = getattr(Asistente, dimension)
+        grupos = db.session.execute(
+            select(Asistente.configuracion_id, Asistente.fecha_registro, columna, func.count(Asistente.id))
+            .filter(*condiciones_asistente)
+            .group_by(Asistente.configuracion_id, Asistente.fecha_registro, columna)
+        ).all()
+        for configuracion_id, fecha_registro, valor, cantidad in grupos:
+            nuevas.append(dict(
+                configuracion_id=configuracion_id, fecha=fecha_registro,
+                dimension=dimension, valor=valor or '', cantidad=cantidad
+            ))
+
+    try:
+        db.session.execute(delete(ContadorAsistencia).where(*condiciones_contador))
+        if nuevas:
+            db.session.execute(db.insert(ContadorAsistencia), nuevas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return len(nuevas)
+
+
+def inicializar_contadores():
+    """
+    Llena los contadores la primera vez que se despliega la tabla sobre una
+    base que ya tiene asistentes. Debe llamarse dentro de un app context.
+    """
+    hay_contadores = db.session.query(ContadorAsistencia.id).first() is not None
+    hay_asistentes = db.session.query(Asistente.id).first() is not None
+    if hay_asistentes and not hay_contadores:
+        filas = reconstruir_contadores()
+        logger.info("✅ Contadores de asistencia calculados (%s filas)", filas)
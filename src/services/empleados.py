@@ -0,0 +1,353 @@
+"""
+Nómina de empleados para autocompletar el registro.
+
+La mayoría de asistentes son empleados conocidos. Su nómina se carga desde
+un CSV (comando `flask importar-empleados` o POST /admin/empleados/importar)
+que se lee fila por fila y se guarda por lotes con un UPSERT por número de
+documento, así archivos grandes no se cargan completos en memoria.
+
+/api/empleado/<documento> responde desde un índice en memoria (documento ->
+datos). Vencido EMPLEADOS_INDICE_TTL, el índice se recarga en un hilo aparte
+y mientras tanto se sigue respondiendo con el anterior, así una llegada
+masiva no espera la lectura de toda la nómina; solo la primera carga y la
+que sigue a una importación en este proceso son síncronas. Con un empleado
+conocido, el formulario solo necesita el documento y la firma: nombre, cargo
+y ruta se toman de la nómina en el servidor, con un texto ya normalizado que
+agrupa bien en el dashboard y en los filtros.
+
+El endpoint es público, por eso solo devuelve lo que el formulario muestra
+(datos_publicos: nombre enmascarado, tipo de documento y cargo) y limita las
+consultas por cliente (EMPLEADOS_CONSULTAS_POR_MINUTO): no sirve para
+recorrer la nómina.
+"""
+import csv
+import itertools
+import logging
+import threading
+import time
+import unicodedata
+from collections import deque
+
+from flask import current_app
+
+from src.models.asistencia import db, Empleado, now_colombia
+
+LOTE_POR_DEFECTO = 1000
+TTL_INDICE_POR_DEFECTO = 300
+REINTENTO_RECARGA_SEGUNDOS = 30
+CONSULTAS_POR_MINUTO_POR_DEFECTO = 300
+MAX_CLIENTES_LIMITE = 10000
+MAX_ERRORES_REPORTADOS = 20
+
+logger = logging.getLogger(__name__)
+
+# Encabezados aceptados en el CSV (sin tildes, en minúscula) -> columna
+COLUMNAS = {
+    'numero_documento': 'numero_documento',
+    'documento': 'numero_documento',
+    'cedula': 'numero_documento',
+    'tipodocumento': 'tipodocumento',
+    'tipo_documento': 'tipodocumento',
+    'tipo': 'tipodocumento',
+    'nombres_apellidos': 'nombres_apellidos',
+    'nombre': 'nombres_apellidos',
+    'nombres': 'nombres_apellidos',
+    'nombre_completo': 'nombres_apellidos',
+    'cargo': 'cargo',
+    'ruta': 'ruta',
+    'ciudad': 'ciudad',
+    'activo': 'activo',
+}
+OBLIGATORIAS = ('numero_documento', 'nombres_apellidos', 'cargo', 'ruta')
+VALORES_INACTIVO = {'0', 'no', 'n', 'false', 'inactivo'}
+
+
+class ImportacionError(ValueError):
+    """El archivo no tiene las columnas necesarias"""
+
+
+def normalizar_documento(valor):
+    """'1.023.456 ' -> '1023456' (sin puntos, comas ni espacios)"""
+    return ''.join(c for c in str(valor or '') if c not in '., \t-')
+
+
+def normalizar_texto(valor):
+    """Espacios colapsados y mayúscula inicial en cada palabra ('operador  MOVIL' -> 'Operador Movil')"""
+    return ' '.join(str(valor or '').split()).title()
+
+
+def enmascarar_nombre(nombre):
+    """'José Gómez Pérez' -> 'José G. P.' (primer nombre e iniciales)"""
+    partes = str(nombre or '').split()
+    if not partes:
+        return ''
+    return ' '.join([partes[0]] + [f'{parte[0]}.' for parte in partes[1:]])
+
+
+def datos_publicos(empleado):
+    """Lo que el formulario público necesita de un empleado conocido"""
+    return {
+        'nombre': enmascarar_nombre(empleado['nombres_apellidos']),
+        'tipodocumento': empleado['tipodocumento'],
+        'cargo': empleado['cargo'],
+    }
+
+
+def _encabezado(nombre):
+    sin_tildes = unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode()
+    return '_'.join(sin_tildes.strip().lower().split())
+
+
+def _insert(session):
+    """INSERT con soporte de ON CONFLICT según el motor de la sesión"""
+    if session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(Empleado)
+
+
+def _guardar_lote(filas):
+    sentencia = _insert(db.session)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=['numero_documento'],
+        set_={
+            columna: sentencia.excluded[columna]
+            for columna in ('tipodocumento', 'nombres_apellidos', 'cargo', 'ruta', 'ciudad', 'activo', 'updated_at')
+        }
+    )
+    try:
+        db.session.execute(sentencia, list(filas.values()))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def importar_empleados(lineas, lote=LOTE_POR_DEFECTO):
+    """
+    Importa la nómina desde un iterable de líneas de texto (archivo abierto
+    en modo texto). Separador ',' o ';' (se detecta en el encabezado).
+    Debe llamarse dentro de un app context.
+    Retorna {'leidas', 'guardadas', 'rechazadas', 'errores': [...]}.
+    """
+    lineas = iter(lineas)
+    primera = next(lineas, '')
+    separador = ';' if primera.count(';') > primera.count(',') else ','
+    lector = csv.reader(itertools.chain([primera], lineas), delimiter=separador)
+
+    encabezado = next(lector, [])
+    indices = {}
+    for posicion, nombre in enumerate(encabezado):
+        columna = COLUMNAS.get(_encabezado(nombre))
+        if columna and columna not in indices:
+            indices[columna] = posicion
+
+    faltantes = [columna for columna in OBLIGATORIAS if columna not in indices]
+    if faltantes:
+        raise ImportacionError(f'Faltan columnas en el archivo: {", ".join(faltantes)}')
+
+    resultado = {'leidas': 0, 'guardadas': 0, 'rechazadas': 0, 'errores': []}
+    # Por documento: si se repite dentro del lote gana la última fila
+    pendientes = {}
+    ahora = now_colombia()
+
+    for numero_linea, fila in enumerate(lector, start=2):
+        if not any(celda.strip() for celda in fila):
+            continue
+        resultado['leidas'] += 1
+
+        def valor(columna):
+            posicion = indices.get(columna)
+            return fila[posicion].strip() if posicion is not None and posicion < len(fila) else ''
+
+        documento = normalizar_documento(valor('numero_documento'))
+        registro = {
+            'numero_documento': documento,
+            'tipodocumento': valor('tipodocumento').upper() or 'CC',
+            'nombres_apellidos': ' '.join(valor('nombres_apellidos').split()),
+            'cargo': normalizar_texto(valor('cargo')),
+            'ruta': normalizar_texto(valor('ruta')),
+            'ciudad': ' '.join(valor('ciudad').split()) or None,
+            'activo': valor('activo').lower() not in VALORES_INACTIVO,
+            'updated_at': ahora,
+        }
+
+        if not all(registro[columna] for columna in OBLIGATORIAS) or len(documento) > 50:
+            resultado['rechazadas'] += 1
+            if len(resultado['errores']) < MAX_ERRORES_REPORTADOS:
+                resultado['errores'].append(f'Línea {numero_linea}: faltan datos obligatorios')
+            continue
+
+        pendientes[documento] = registro
+        if len(pendientes) >= lote:
+            _guardar_lote(pendientes)
+            resultado['guardadas'] += len(pendientes)
+            pendientes = {}
+
+    if pendientes:
+        _guardar_lote(pendientes)
+        resultado['guardadas'] += len(pendientes)
+
+    if _indice is not None:
+        _indice.invalidar()
+    return resultado
+
+
+class IndiceEmpleados:
+    """
+    Documento -> datos del empleado activo. Vencido el `ttl` se recarga en
+    segundo plano; mientras tanto las búsquedas usan los datos anteriores.
+    """
+
+    def __init__(self, ttl=TTL_INDICE_POR_DEFECTO):
+        self.ttl = ttl
+        self._empleados = {}
+        self._cargado = False
+        self._recargando = False
+        self._valido_hasta = 0
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        consulta = db.select(
+            Empleado.numero_documento, Empleado.tipodocumento, Empleado.nombres_apellidos,
+            Empleado.cargo, Empleado.ruta, Empleado.ciudad
+        ).where(Empleado.activo == True).execution_options(yield_per=5000)
+
+        empleados = {}
+        for documento, tipodocumento, nombres, cargo, ruta, ciudad in db.session.execute(consulta):
+            empleados[documento] = {
+                'numero_documento': documento,
+                'tipodocumento': tipodocumento,
+                'nombres_apellidos': nombres,
+                'cargo': cargo,
+                'ruta': ruta,
+                'ciudad': ciudad,
+            }
+        return empleados
+
+    def _recargar_en_segundo_plano(self):
+        with self._lock:
+            if self._recargando:
+                return
+            self._recargando = True
+        app = current_app._get_current_object()
+
+        def recargar():
+            try:
+                with app.app_context():
+                    empleados = self._cargar()
+                self._empleados = empleados
+                self._valido_hasta = time.monotonic() + self.ttl
+            except Exception as e:
+                logger.warning("⚠️ No se pudo recargar la nómina, se reintenta en %ss: %s",
+                               REINTENTO_RECARGA_SEGUNDOS, e)
+                self._valido_hasta = time.monotonic() + REINTENTO_RECARGA_SEGUNDOS
+            finally:
+                self._recargando = False
+
+        threading.Thread(target=recargar, name='recarga-empleados', daemon=True).start()
+
+    def buscar(self, documento):
+        """Datos del empleado o None. Debe llamarse dentro de un app context."""
+        if not self._cargado:
+            with self._lock:
+                if not self._cargado:
+                    self._empleados = self._cargar()
+                    self._valido_hasta = time.monotonic() + self.ttl
+                    self._cargado = True
+        elif time.monotonic() >= self._valido_hasta:
+            self._recargar_en_segundo_plano()
+        return self._empleados.get(normalizar_documento(documento))
+
+    def invalidar(self):
+        """Fuerza una recarga síncrona en la próxima búsqueda (p. ej. después de importar)"""
+        self._cargado = False
+
+    def __len__(self):
+        return len(self._empleados)
+
+
+class LimiteConsultas:
+    """Ventana deslizante: hasta `limite` consultas por cliente cada `ventana` segundos"""
+
+    def __init__(self, limite=CONSULTAS_POR_MINUTO_POR_DEFECTO, ventana=60):
+        self.limite = limite
+        self.ventana = ventana
+        self._consultas = {}
+        self._lock = threading.Lock()
+
+    def permitir(self, cliente):
+        """Registra la consulta y retorna False si el cliente superó el límite"""
+        ahora = time.monotonic()
+        desde = ahora - self.ventana
+        with self._lock:
+            if len(self._consultas) >= MAX_CLIENTES_LIMITE:
+                # Olvidar clientes sin consultas recientes
+                self._consultas = {
+                    clave: instantes for clave, instantes in self._consultas.items() if instantes[-1] > desde
+                }
+            instantes = self._consultas.setdefault(cliente, deque())
+            while instantes and instantes[0] <= desde:
+                instantes.popleft()
+            if len(instantes) >= self.limite:
+                return False
+            instantes.append(ahora)
+            return True
+
+
+def completar_registro(datos, config=None):
+    """
+    Completa un registro del formulario con la nómina: si el documento es de
+    un empleado conocido, nombre, tipo de documento, cargo y ruta salen de
+    la nómina (la ciudad del formulario se respeta). Si no, se normalizan
+    documento, cargo y ruta. En ambos casos el documento queda sin puntos ni
+    espacios, como lo compara el índice único. Retorna un diccionario nuevo.
+    """
+    completo = dict(datos)
+    empleado = obtener_indice(config).buscar(datos.get('numero_documento'))
+
+    if empleado:
+        completo.update({
+            'numero_documento': empleado['numero_documento'],
+            'tipodocumento': empleado['tipodocumento'],
+            'nombres_apellidos': empleado['nombres_apellidos'],
+            'cargo': empleado['cargo'],
+            'ruta': empleado['ruta'],
+        })
+        completo['ciudad'] = datos.get('ciudad') or empleado['ciudad'] or ''
+    else:
+        completo['numero_documento'] = normalizar_documento(datos.get('numero_documento'))
+        completo['cargo'] = normalizar_texto(datos.get('cargo'))
+        completo['ruta'] = normalizar_texto(datos.get('ruta'))
+
+    return completo
+
+
+_indice = None
+_indice_lock = threading.Lock()
+_limite = None
+
+
+def obtener_indice(config=None):
+    """Retorna el índice de empleados del proceso (TTL desde app.config)"""
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                _indice = IndiceEmpleados(
+                    ttl=(config or {}).get('EMPLEADOS_INDICE_TTL', TTL_INDICE_POR_DEFECTO)
+                )
+    return _indice
+
+
+def obtener_limite_consultas(config=None):
+    """Retorna el límite de consultas a /api/empleado del proceso"""
+    global _limite
+    if _limite is None:
+        with _indice_lock:
+            if _limite is None:
+                _limite = LimiteConsultas(
+                    limite=(config or {}).get('EMPLEADOS_CONSULTAS_POR_MINUTO', CONSULTAS_POR_MINUTO_POR_DEFECTO)
+                )
+    return _limite
@@ -0,0 +1,285 @@
+"""
+SQLite en producción: WAL y un único escritor por proceso.
+
+Con la configuración por defecto de SQLite (journal DELETE) los lectores
+bloquean al escritor y los commits simultáneos de /api/registrar terminan en
+"database is locked". configurar_sqlite() aplica en cada conexión nueva:
+- journal_mode=WAL: los lectores no bloquean al escritor ni al revés,
+- synchronous=NORMAL: en WAL no se pierde consistencia, solo el último
+  commit si se cae el sistema operativo (no el proceso),
+- busy_timeout: espera el bloqueo en lugar de fallar de inmediato,
+- mmap_size: lecturas sin copiar páginas al espacio del proceso.
+
+Las escrituras de los endpoints de registro pasan por escribir(trabajo):
+con SQLite en archivo, un solo hilo por proceso (EscritorSQLite) toma los
+trabajos de una cola, ejecuta cada uno en su SAVEPOINT y confirma hasta
+SQLITE_LOTE_MAXIMO juntos en un commit (group commit). Un duplicado solo
+deshace su savepoint; el resto del lote se guarda. Con PostgreSQL (o
+SQLITE_ESCRITOR=0) escribir() usa db.session y confirma en la petición.
+
+El escritor es por proceso: entre workers de gunicorn la transacción
+empieza con BEGIN IMMEDIATE y espera el bloqueo con busy_timeout.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as EsperaAgotada
+
+from flask import current_app
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from src.models.asistencia import db
+from src.services.metricas import instrumentar_motor, registrar_lote_escritor, capturar_consultas, atribuir_consultas
+
+BUSY_TIMEOUT_MS_POR_DEFECTO = 5000
+MMAP_BYTES_POR_DEFECTO = 256 * 1024 * 1024
+LOTE_MAXIMO_POR_DEFECTO = 64
+ESPERA_LOTE_MS_POR_DEFECTO = 2
+ESPERA_RESULTADO_POR_DEFECTO = 30
+
+logger = logging.getLogger(__name__)
+
+
+def es_sqlite_en_archivo(url):
+    """True para sqlite:///ruta (no :memory: ni bases compartidas en memoria)"""
+    if url.get_backend_name() != 'sqlite':
+        return False
+    base = url.database or ''
+    return base not in ('', ':memory:') and 'mode=memory' not in str(url)
+
+
+def _pragmas(busy_timeout_ms, mmap_bytes):
+    def aplicar(conexion_dbapi, registro_conexion):
+        cursor = conexion_dbapi.cursor()
+        try:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+            cursor.execute(f'PRAGMA mmap_size={int(mmap_bytes)}')
+        finally:
+            cursor.close()
+    return aplicar
+
+
+def configurar_sqlite(app):
+    """
+    Agrega los PRAGMA de producción al Engine de la app si es SQLite en
+    archivo. Crear el Engine no abre conexiones: los PRAGMA corren con la
+    primera.
+    """
+    with app.app_context():
+        engine = db.engine
+    if not es_sqlite_en_archivo(engine.url):
+        return
+    event.listen(engine, 'connect', _pragmas(
+        app.config.get('SQLITE_BUSY_TIMEOUT_MS', BUSY_TIMEOUT_MS_POR_DEFECTO),
+        app.config.get('SQLITE_MMAP_BYTES', MMAP_BYTES_POR_DEFECTO)
+    ))
+
+
+class EscritorSQLite:
+    """
+    Hilo único que ejecuta los trabajos de escritura en lotes. Un trabajo
+    es una función trabajo(session) que agrega o inserta filas sin hacer
+    commit; su valor de retorno llega a quien llamó a ejecutar().
+    """
+
+    def __init__(self, url, busy_timeout_ms=BUSY_TIMEOUT_MS_POR_DEFECTO, mmap_bytes=MMAP_BYTES_POR_DEFECTO,
+                 lote_maximo=LOTE_MAXIMO_POR_DEFECTO, espera_lote_ms=ESPERA_LOTE_MS_POR_DEFECTO):
+        self.url = url
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_bytes = mmap_bytes
+        self.lote_maximo = lote_maximo
+        self.espera_lote = espera_lote_ms / 1000
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._engine = None
+        self._hilo = None
+        self._lotes = deque(maxlen=200)
+        self._trabajos = 0
+        self._commits = 0
+        self._errores = 0
+
+    def _crear_motor(self):
+        # Una conexión en modo autocommit del driver: SQLAlchemy emite BEGIN
+        # IMMEDIATE y los SAVEPOINT funcionan (receta de pysqlite)
+        engine = create_engine(self.url, pool_size=1, max_overflow=0)
+        aplicar_pragmas = _pragmas(self.busy_timeout_ms, self.mmap_bytes)
+
+        @event.listens_for(engine, 'connect')
+        def al_conectar(conexion_dbapi, registro_conexion):
+            conexion_dbapi.isolation_level = None
+            aplicar_pragmas(conexion_dbapi, registro_conexion)
+
+        @event.listens_for(engine, 'begin')
+        def al_empezar(conexion):
+            conexion.exec_driver_sql('BEGIN IMMEDIATE')
+
+        # Las escrituras cuentan en /metrics igual que las consultas de la app
+        instrumentar_motor(engine)
+        return engine
+
+    def _iniciar(self):
+        # El hilo y la conexión se crean en el primer uso (después del fork)
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self._engine = self._crear_motor()
+            self._hilo = threading.Thread(target=self._trabajar, name='escritor-sqlite', daemon=True)
+            self._hilo.start()
+
+    def ejecutar(self, trabajo, timeout=ESPERA_RESULTADO_POR_DEFECTO):
+        """
+        Encola el trabajo y espera su commit; relanza su excepción si falló.
+        Si pasa `timeout` y el trabajo sigue en la cola se cancela (no se
+        escribe después de haber respondido con error); si el escritor ya lo
+        tomó, se espera su resultado.
+        """
+        self._iniciar()
+        futuro = Future()
+        futuro.consultas = []
+        self._cola.put((trabajo, futuro))
+        try:
+            try:
+                return futuro.result(timeout=timeout)
+            except EsperaAgotada:
+                if futuro.cancel():
+                    logger.warning("⚠️ Escritura cancelada tras %ss en la cola del escritor de SQLite", timeout)
+                    raise
+                return futuro.result()
+        finally:
+            # Las consultas del trabajo cuentan en la petición que lo pidió
+            atribuir_consultas(futuro.consultas)
+
+    def _trabajar(self):
+        while True:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + self.espera_lote
+            while len(lote) < self.lote_maximo:
+                try:
+                    lote.append(self._cola.get(timeout=max(0, limite - time.monotonic())))
+                except queue.Empty:
+                    break
+            # Los trabajos cancelados por timeout en ejecutar() no se escriben;
+            # los demás pasan a "en ejecución" y ya no se pueden cancelar
+            lote = [(trabajo, futuro) for trabajo, futuro in lote if futuro.set_running_or_notify_cancel()]
+            if not lote:
+                continue
+            try:
+                self._confirmar_lote(lote)
+            except Exception as e:
+                logger.exception("❌ Error inesperado en el escritor de SQLite: %s", e)
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+
+    def _confirmar_lote(self, lote):
+        inicio = time.monotonic()
+        exitosos, fallidos = [], []
+        try:
+            with Session(self._engine) as session, session.begin():
+                for trabajo, futuro in lote:
+                    try:
+                        with capturar_consultas() as futuro.consultas, session.begin_nested():
+                            resultado = trabajo(session)
+                        exitosos.append((futuro, resultado))
+                    except Exception as e:
+                        fallidos.append((futuro, e))
+        except Exception as e:
+            # Falló el commit (p. ej. otro proceso retuvo el bloqueo más que
+            # busy_timeout): cada trabajo se reintenta en su propia transacción
+            if len(lote) > 1:
+                logger.warning("⚠️ Falló el commit de un lote de %s escrituras, se reintentan una por una: %s",
+                               len(lote), e)
+                for elemento in lote:
+                    self._confirmar_lote([elemento])
+                return
+            exitosos, fallidos = [], [(lote[0][1], e)]
+
+        segundos = time.monotonic() - inicio
+        with self._lock:
+            self._trabajos += len(lote)
+            self._commits += 1
+            self._errores += len(fallidos)
+            self._lotes.append({'trabajos': len(lote), 'fallidos': len(fallidos), 'ms': round(segundos * 1000, 2)})
+        registrar_lote_escritor(len(lote), segundos)
+
+        for futuro, resultado in exitosos:
+            futuro.set_result(resultado)
+        for futuro, error in fallidos:
+            futuro.set_exception(error)
+
+    def estadisticas(self):
+        """Profundidad de la cola y tamaño de los últimos lotes"""
+        with self._lock:
+            recientes = list(self._lotes)
+            trabajos, commits, errores = self._trabajos, self._commits, self._errores
+        return {
+            'en_cola': self._cola.qsize(),
+            'trabajos': trabajos,
+            'commits': commits,
+            'errores': errores,
+            'trabajos_por_commit': round(trabajos / commits, 2) if commits else None,
+            'recientes': recientes[-20:]
+        }
+
+
+_escritores = {}
+_escritores_lock = threading.Lock()
+
+
+def obtener_escritor(config):
+    """
+    Escritor del proceso para la base de la app actual (requiere app
+    context), o None si no es SQLite en archivo o SQLITE_ESCRITOR está apagado.
+    """
+    if not config.get('SQLITE_ESCRITOR', True):
+        return None
+    url = db.engine.url
+    if not es_sqlite_en_archivo(url):
+        return None
+
+    clave = url.render_as_string(hide_password=False)
+    escritor = _escritores.get(clave)
+    if escritor is None:
+        with _escritores_lock:
+            escritor = _escritores.get(clave)
+            if escritor is None:
+                escritor = _escritores[clave] = EscritorSQLite(
+                    url,
+                    busy_timeout_ms=config.get('SQLITE_BUSY_TIMEOUT_MS', BUSY_TIMEOUT_MS_POR_DEFECTO),
+                    mmap_bytes=config.get('SQLITE_MMAP_BYTES', MMAP_BYTES_POR_DEFECTO),
+                    lote_maximo=config.get('SQLITE_LOTE_MAXIMO', LOTE_MAXIMO_POR_DEFECTO),
+                    espera_lote_ms=config.get('SQLITE_ESPERA_LOTE_MS', ESPERA_LOTE_MS_POR_DEFECTO)
+                )
+    return escritor
+
+
+def escribir(trabajo, sesion_aparte=False):
+    """
+    Ejecuta trabajo(session) y lo confirma: en el escritor de SQLite si
+    corresponde, si no con db.session. Retorna lo que retorne el trabajo y
+    relanza sus errores (IntegrityError para duplicados).
+    - sesion_aparte: sin escritor, usa una Session propia en lugar de
+      db.session (el commit no expira los objetos que tiene cargados)
+    """
+    escritor = obtener_escritor(current_app.config)
+    if escritor is not None:
+        return escritor.ejecutar(
+            trabajo, timeout=current_app.config.get('SQLITE_ESPERA_RESULTADO', ESPERA_RESULTADO_POR_DEFECTO)
+        )
+
+    if sesion_aparte:
+        with Session(db.engine) as session, session.begin():
+            return trabajo(session)
+
+    try:
+        resultado = trabajo(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return resultado
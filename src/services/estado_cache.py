@@ -0,0 +1,145 @@
+"""
+Snapshot en memoria de la capacitación activa del día.
+
+/api/estado se consulta desde cada formulario al cargar y cada 30 segundos.
+En lugar de ejecutar la misma consulta de Configuracion en cada petición,
+se guarda una copia de la capacitación activa de hoy (y su to_dict())
+hasta el siguiente límite de horario (hora_inicio, hora_fin o medianoche
+en Bogotá), hasta que el administrador cree o active/desactive una
+configuración, o hasta que venza el TTL máximo (para que otros procesos
+del servidor no queden con datos viejos indefinidamente).
+"""
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, date, time
+from typing import Optional
+
+from src.models.asistencia import Configuracion
+
+# TTL máximo del snapshot, en segundos
+TTL_POR_DEFECTO = 30
+
+
+@dataclass(frozen=True)
+class EstadoSnapshot:
+    """Copia inmutable de la capacitación activa de un día"""
+    fecha: date
+    valido_hasta: datetime
+    config_id: Optional[int] = None
+    activo: bool = False
+    fecha_capacitacion: Optional[date] = None
+    hora_inicio: Optional[time] = None
+    hora_fin: Optional[time] = None
+    nombre_capacitacion: Optional[str] = None
+    config_dict: Optional[dict] = None
+
+    @property
+    def hay_configuracion(self):
+        return self.config_id is not None
+
+    def esta_en_horario(self, hora_actual):
+        """Compara la hora actual con el horario guardado"""
+        if not self.hay_configuracion:
+            return False
+        return self.hora_inicio <= hora_actual <= self.hora_fin
+
+
+_lock = threading.Lock()
+_snapshot: Optional[EstadoSnapshot] = None
+
+# Versión que aumenta con cada invalidación; la usan los streams SSE para
+# despertar de inmediato cuando el administrador cambia la configuración
+_cambios = threading.Condition()
+_version = 0
+
+
+def _siguiente_limite(ahora, snapshot_config, ttl):
+    """Calcula el próximo instante en el que el snapshot debe recalcularse"""
+    tz = ahora.tzinfo
+    medianoche = datetime.combine(ahora.date() + timedelta(days=1), time(0, 0), tzinfo=tz)
+    candidatos = [medianoche, ahora + timedelta(seconds=ttl)]
+
+    if snapshot_config is not None:
+        for hora in (snapshot_config.hora_inicio, snapshot_config.hora_fin):
+            if hora is None:
+                continue
+            limite = datetime.combine(ahora.date(), hora, tzinfo=tz)
+            if limite > ahora:
+                candidatos.append(limite)
+
+    return min(candidatos)
+
+
+def _construir_snapshot(ahora, ttl):
+    config = Configuracion.query.filter(
+        Configuracion.activo == True,
+        Configuracion.fecha_capacitacion == ahora.date()
+    ).first()
+
+    valido_hasta = _siguiente_limite(ahora, config, ttl)
+
+    if not config:
+        return EstadoSnapshot(fecha=ahora.date(), valido_hasta=valido_hasta)
+
+    return EstadoSnapshot(
+        fecha=ahora.date(),
+        valido_hasta=valido_hasta,
+        config_id=config.id,
+        activo=bool(config.activo),
+        fecha_capacitacion=config.fecha_capacitacion,
+        hora_inicio=config.hora_inicio,
+        hora_fin=config.hora_fin,
+        nombre_capacitacion=config.nombre_capacitacion,
+        config_dict=config.to_dict()
+    )
+
+
+def obtener_snapshot(ahora, ttl=TTL_POR_DEFECTO):
+    """
+    Retorna el snapshot vigente, reconstruyéndolo si ya venció.
+    - ahora: datetime con zona horaria de Colombia
+    - ttl: segundos máximos de vigencia; 0 desactiva el caché
+    """
+    global _snapshot
+
+    if ttl <= 0:
+        return _construir_snapshot(ahora, ttl)
+
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.fecha == ahora.date() and ahora < snapshot.valido_hasta:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is not None and snapshot.fecha == ahora.date() and ahora < snapshot.valido_hasta:
+            return snapshot
+
+        snapshot = _construir_snapshot(ahora, ttl)
+        _snapshot = snapshot
+        return snapshot
+
+
+def invalidar_snapshot():
+    """Descarta el snapshot actual (llamar después de modificar Configuracion)"""
+    global _snapshot, _version
+    with _lock:
+        _snapshot = None
+
+    with _cambios:
+        _version += 1
+        _cambios.notify_all()
+
+
+def version_actual():
+    """Retorna la versión actual de la configuración"""
+    return _version
+
+
+def esperar_cambio(version, timeout):
+    """
+    Bloquea hasta que haya una invalidación posterior a `version` o hasta
+    que pase `timeout` segundos. Retorna la versión vigente.
+    """
+    with _cambios:
+        _cambios.wait_for(lambda: _version != version, timeout=timeout)
+        return _version
@@ -0,0 +1,36 @@
+"""
+Aviso de nuevos registros para el stream del panel de administración.
+
+registrar_asistencia llama a notificar_registro() después del commit; los
+streams abiertos despiertan y leen de la BD solo los asistentes con id
+mayor al último enviado. El aviso es solo un despertador: si el registro
+ocurrió en otro proceso del servidor, el stream lo encuentra igual en su
+siguiente revisión periódica.
+"""
+import threading
+
+_cambios = threading.Condition()
+_version = 0
+
+
+def notificar_registro():
+    """Despierta a los streams abiertos (llamar después del commit)"""
+    global _version
+    with _cambios:
+        _version += 1
+        _cambios.notify_all()
+
+
+def version_actual():
+    """Retorna la cantidad de registros notificados en este proceso"""
+    return _version
+
+
+def esperar_registro(version, timeout):
+    """
+    Bloquea hasta que haya un registro posterior a `version` o hasta que
+    pase `timeout` segundos. Retorna la versión vigente.
+    """
+    with _cambios:
+        _cambios.wait_for(lambda: _version != version, timeout=timeout)
+        return _version
@@ -0,0 +1,138 @@
+"""
+Exportación de asistentes a CSV / XLSX por lotes.
+
+Las filas se leen con yield_per (cursor del lado del servidor en PostgreSQL),
+así que en memoria solo hay un lote a la vez, sin importar cuántos años de
+registros se exporten.
+
+Nombre, cargo, ruta y ciudad vienen del formulario público y el archivo se
+abre en Excel: los textos que empiezan como una fórmula se escriben con un
+apóstrofo delante (ver celda_segura).
+"""
+import csv
+import io
+import tempfile
+
+from src.models.asistencia import db, Asistente, Configuracion
+
+TAMANO_LOTE_POR_DEFECTO = 1000
+# Caracteres con los que Excel / LibreOffice interpretan una celda como fórmula
+INICIOS_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+COLUMNAS = [
+    ('id', 'ID'),
+    ('fecha_registro', 'Fecha'),
+    ('hora_llegada', 'Hora de llegada'),
+    ('nombre_capacitacion', 'Capacitación'),
+    ('tipodocumento', 'Tipo de documento'),
+    ('numero_documento', 'Número de documento'),
+    ('nombres_apellidos', 'Nombres y apellidos'),
+    ('cargo', 'Cargo'),
+    ('ruta', 'Ruta'),
+    ('ciudad', 'Ciudad'),
+    ('firma', 'Firma'),
+]
+
+
+def consultar_filas(condiciones, tamano_lote=TAMANO_LOTE_POR_DEFECTO):
+    """Genera tuplas con los valores de COLUMNAS, leyendo de a un lote"""
+    consulta = db.select(
+        Asistente.id,
+        Asistente.fecha_registro,
+        Asistente.hora_llegada,
+        Configuracion.nombre_capacitacion,
+        Asistente.tipodocumento,
+        Asistente.numero_documento,
+        Asistente.nombres_apellidos,
+        Asistente.cargo,
+        Asistente.ruta,
+        Asistente.ciudad,
+        Asistente.firma_digital,
+    ).outerjoin(
+        Configuracion, Asistente.configuracion_id == Configuracion.id
+    ).filter(
+        *condiciones
+    ).order_by(
+        Asistente.hora_llegada, Asistente.id
+    ).execution_options(yield_per=tamano_lote)
+
+    for fila in db.session.execute(consulta):
+        yield (
+            fila.id,
+            fila.fecha_registro.strftime('%Y-%m-%d') if fila.fecha_registro else '',
+            fila.hora_llegada.strftime('%H:%M:%S') if fila.hora_llegada else '',
+            fila.nombre_capacitacion or '',
+            fila.tipodocumento or '',
+            fila.numero_documento or '',
+            fila.nombres_apellidos or '',
+            fila.cargo or '',
+            fila.ruta or '',
+            fila.ciudad or '',
+            'Sí' if fila.firma_digital else 'No',
+        )
+
+
+def celda_segura(valor):
+    """Antepone un apóstrofo a los textos que una hoja de cálculo tomaría como fórmula"""
+    if isinstance(valor, str) and valor.startswith(INICIOS_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def generar_csv(filas, tamano_lote=TAMANO_LOTE_POR_DEFECTO):
+    """Convierte las filas a CSV y lo entrega por bloques de tamano_lote filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM para que Excel reconozca las tildes
+    buffer.write('\ufeff')
+    writer.writerow([titulo for _, titulo in COLUMNAS])
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pendientes = 0
+    for fila in filas:
+        writer.writerow([celda_segura(valor) for valor in fila])
+        pendientes += 1
+        if pendientes >= tamano_lote:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+
+    if pendientes:
+        yield buffer.getvalue()
+
+
+def generar_xlsx(filas, tamano_bloque=64 * 1024):
+    """
+    Escribe las filas en un libro XLSX (modo write_only de openpyxl) y entrega
+    el archivo por bloques. El XLSX es un ZIP, así que solo puede enviarse
+    cuando está completo; las filas van a disco, no a memoria.
+    """
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Asistentes')
+    hoja.append([titulo for _, titulo in COLUMNAS])
+    for fila in filas:
+        hoja.append([celda_segura(valor) for valor in fila])
+
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        while True:
+            bloque = archivo.read(tamano_bloque)
+            if not bloque:
+                break
+            yield bloque
+
+
+def xlsx_disponible():
+    """Indica si openpyxl está instalado"""
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
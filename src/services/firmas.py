@@ -0,0 +1,216 @@
+"""
+Procesamiento de firmas digitales en segundo plano.
+
+Los endpoints de registro solo validan la firma (base64 + encabezado de la
+imagen) y guardan la fila con la ruta donde quedará el archivo (ver
+almacen_firmas). La decodificación completa, la conversión a RGBA y la
+escritura del archivo las hace un grupo acotado de hilos trabajadores. Si la cola está llena, la firma
+se procesa en el mismo hilo de la petición (backpressure en lugar de perderla).
+"""
+import base64
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from io import BytesIO
+
+from PIL import Image
+
+from src.services.almacenamiento import obtener_almacenamiento
+from src.services.metricas import registrar_firma
+from src.services.almacen_firmas import (
+    configuracion_almacen, verificar_limites, ruta_por_contenido, guardar_codificada, LimiteFirmaError
+)
+
+WORKERS_POR_DEFECTO = 2
+COLA_MAXIMA_POR_DEFECTO = 100
+FORMATOS_PERMITIDOS = {'PNG', 'JPEG', 'GIF'}
+
+logger = logging.getLogger(__name__)
+
+
+class FirmaInvalidaError(ValueError):
+    """La firma enviada no es una imagen válida"""
+
+
+@dataclass
+class TrabajoFirma:
+    """Firma validada, pendiente de escribir en el almacén"""
+    ruta_relativa: str
+    datos: bytes
+    almacen: object
+    encolado_en: float = field(default_factory=time.monotonic)
+
+
+def preparar_firma(firma_base64, static_dir, subcarpeta, config=None):
+    """
+    Valida la firma (data URL o base64) y calcula su ruta en el almacén
+    (nombre = hash del contenido). No decodifica los píxeles: solo lee el
+    encabezado de la imagen, después de comprobar el tamaño en bytes.
+    - static_dir: carpeta static de la app
+    - subcarpeta: por ejemplo 'uploads/firmas'
+    - config: app.config (FIRMAS_FORMATO, FIRMAS_MAX_BYTES, FIRMAS_MAX_PIXELES)
+    """
+    formato, max_bytes, max_pixeles = configuracion_almacen(config or {})
+
+    if firma_base64.startswith("data:image"):
+        firma_base64 = firma_base64.split(",", 1)[1]
+
+    # Cota del tamaño decodificado sin decodificar (4 caracteres = 3 bytes)
+    if len(firma_base64) * 3 // 4 > max_bytes:
+        registrar_firma()
+        raise FirmaInvalidaError(f'La firma supera el tamaño máximo ({max_bytes} bytes)')
+
+    try:
+        datos = base64.b64decode(firma_base64, validate=True)
+        with Image.open(BytesIO(datos)) as imagen:
+            formato_origen = imagen.format
+            verificar_limites(imagen, len(datos), max_bytes, max_pixeles)
+    except LimiteFirmaError as e:
+        registrar_firma()
+        raise FirmaInvalidaError(str(e)) from e
+    except Exception as e:
+        registrar_firma()
+        raise FirmaInvalidaError(f'Firma inválida: {e}') from e
+
+    if formato_origen not in FORMATOS_PERMITIDOS:
+        registrar_firma()
+        raise FirmaInvalidaError(f'Formato de firma no permitido: {formato_origen}')
+
+    registrar_firma(len(datos))
+
+    return TrabajoFirma(
+        ruta_relativa=ruta_por_contenido(datos, subcarpeta, formato),
+        datos=datos,
+        almacen=obtener_almacenamiento(config or {}, static_dir)
+    )
+
+
+def escribir_firma(trabajo):
+    """Guarda la firma re-codificada (si ese contenido no existe ya)"""
+    guardar_codificada(trabajo.datos, trabajo.ruta_relativa, trabajo.almacen)
+
+
+class ProcesadorFirmas:
+    """Grupo acotado de hilos que escribe las firmas en el almacén"""
+
+    def __init__(self, workers=WORKERS_POR_DEFECTO, cola_maxima=COLA_MAXIMA_POR_DEFECTO):
+        self.workers = workers
+        self._cola = queue.Queue(maxsize=cola_maxima)
+        self._pendientes = set()
+        self._condicion = threading.Condition()
+        self._duraciones = deque(maxlen=200)
+        self._procesadas = 0
+        self._errores = 0
+        self._hilos = []
+        self._iniciado = False
+
+    def _iniciar(self):
+        # Los hilos se crean en el primer uso (después del fork del servidor)
+        with self._condicion:
+            if self._iniciado:
+                return
+            for i in range(self.workers):
+                hilo = threading.Thread(target=self._trabajar, name=f'firmas-{i}', daemon=True)
+                hilo.start()
+                self._hilos.append(hilo)
+            self._iniciado = True
+
+    def encolar(self, trabajo):
+        """Agrega una firma a la cola; si está llena la procesa de inmediato"""
+        self._iniciar()
+        with self._condicion:
+            self._pendientes.add(trabajo.ruta_relativa)
+
+        try:
+            self._cola.put_nowait(trabajo)
+        except queue.Full:
+            logger.warning("⚠️ Cola de firmas llena (%s), procesando en la petición", self._cola.maxsize)
+            self._procesar(trabajo)
+
+    def _trabajar(self):
+        while True:
+            trabajo = self._cola.get()
+            try:
+                self._procesar(trabajo)
+            finally:
+                self._cola.task_done()
+
+    def _procesar(self, trabajo):
+        inicio = time.monotonic()
+        try:
+            escribir_firma(trabajo)
+            error = None
+        except Exception as e:
+            error = e
+
+        fin = time.monotonic()
+        with self._condicion:
+            self._pendientes.discard(trabajo.ruta_relativa)
+            self._duraciones.append({
+                'ruta': trabajo.ruta_relativa,
+                'espera_ms': round((inicio - trabajo.encolado_en) * 1000, 2),
+                'proceso_ms': round((fin - inicio) * 1000, 2),
+                'ok': error is None
+            })
+            if error is None:
+                self._procesadas += 1
+            else:
+                self._errores += 1
+            self._condicion.notify_all()
+
+        if error is not None:
+            logger.error("❌ Error al guardar firma %s: %s", trabajo.ruta_relativa, error)
+
+    def esperar(self, rutas=None, timeout=30):
+        """
+        Espera a que se escriban las firmas indicadas (o todas si rutas es None).
+        Retorna True si no quedó ninguna pendiente.
+        """
+        rutas = set(rutas) if rutas is not None else None
+
+        def listo():
+            if rutas is None:
+                return not self._pendientes
+            return self._pendientes.isdisjoint(rutas)
+
+        with self._condicion:
+            return self._condicion.wait_for(listo, timeout=timeout)
+
+    def estadisticas(self):
+        """Profundidad de la cola y tiempos de los últimos trabajos"""
+        with self._condicion:
+            recientes = list(self._duraciones)
+            pendientes = len(self._pendientes)
+            procesadas = self._procesadas
+            errores = self._errores
+
+        tiempos = [d['proceso_ms'] for d in recientes]
+        return {
+            'workers': self.workers,
+            'en_cola': self._cola.qsize(),
+            'pendientes': pendientes,
+            'procesadas': procesadas,
+            'errores': errores,
+            'proceso_promedio_ms': round(sum(tiempos) / len(tiempos), 2) if tiempos else None,
+            'recientes': recientes[-20:]
+        }
+
+
+_procesador = None
+_procesador_lock = threading.Lock()
+
+
+def obtener_procesador(config):
+    """Retorna el procesador de firmas del proceso, creándolo si no existe"""
+    global _procesador
+    if _procesador is None:
+        with _procesador_lock:
+            if _procesador is None:
+                _procesador = ProcesadorFirmas(
+                    workers=config.get('FIRMAS_WORKERS', WORKERS_POR_DEFECTO),
+                    cola_maxima=config.get('FIRMAS_COLA_MAXIMA', COLA_MAXIMA_POR_DEFECTO)
+                )
+    return _procesador
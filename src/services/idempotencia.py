@@ -0,0 +1,133 @@
+"""
+Claves de idempotencia para /api/registrar (encabezado Idempotency-Key).
+
+Si el trabajador toca dos veces "Registrar" o el teléfono reintenta la
+petición, la segunda llegada se resuelve aquí antes de tocar la firma: se
+devuelve la misma respuesta 201 de la primera, sin volver a consultar
+duplicados, decodificar la imagen ni escribir otro archivo.
+
+Las respuestas recientes se guardan en memoria con un TTL corto. Mientras
+la primera petición con una clave sigue en curso, las demás esperan su
+resultado. Como cada proceso del servidor tiene su propia memoria, la clave
+también se guarda en la tabla claves_registro (la misma del registro por
+lote): un reintento que cae en otro proceso se responde con una consulta
+por llave primaria.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+ENCABEZADO = 'Idempotency-Key'
+LONGITUD_MAXIMA = 64
+TTL_POR_DEFECTO = 600
+MAX_CLAVES_POR_DEFECTO = 10000
+ESPERA_POR_DEFECTO = 10
+
+
+class ClaveIdempotenciaError(ValueError):
+    """La clave enviada no es válida o ya se usó con otros datos"""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+class AlmacenIdempotencia:
+    """
+    Claves recientes -> respuesta (status, cuerpo), con TTL y un máximo de
+    entradas (se descartan primero las más antiguas).
+    """
+
+    def __init__(self, ttl=TTL_POR_DEFECTO, max_claves=MAX_CLAVES_POR_DEFECTO):
+        self.ttl = ttl
+        self.max_claves = max_claves
+        self._respuestas = OrderedDict()
+        self._en_curso = {}
+        self._condicion = threading.Condition()
+
+    def _purgar(self, ahora):
+        while self._respuestas:
+            vence = next(iter(self._respuestas.values()))[0]
+            if vence > ahora and len(self._respuestas) <= self.max_claves:
+                break
+            self._respuestas.popitem(last=False)
+
+    def reservar(self, clave, huella, espera=ESPERA_POR_DEFECTO):
+        """
+        Marca la clave como en curso. Retorna None si la petición debe
+        procesarse, o (status, cuerpo) si ya hay una respuesta guardada.
+        - huella: identifica los datos del registro (una clave reutilizada
+          con otro documento se rechaza con 422)
+        """
+        limite = time.monotonic() + espera
+        with self._condicion:
+            while True:
+                ahora = time.monotonic()
+                self._purgar(ahora)
+
+                guardada = self._respuestas.get(clave)
+                if guardada is not None:
+                    _, huella_guardada, status, cuerpo = guardada
+                    if huella_guardada != huella:
+                        raise ClaveIdempotenciaError('La clave de idempotencia ya se usó con otros datos', 422)
+                    return status, cuerpo
+
+                if clave not in self._en_curso:
+                    self._en_curso[clave] = huella
+                    return None
+
+                # Otra petición con la misma clave está en curso: esperar su resultado
+                if ahora >= limite:
+                    raise ClaveIdempotenciaError('Hay una petición en curso con la misma clave', 409)
+                self._condicion.wait(timeout=limite - ahora)
+
+    def completar(self, clave, status, cuerpo):
+        """Guarda la respuesta de la clave reservada"""
+        with self._condicion:
+            huella = self._en_curso.pop(clave, None)
+            self._respuestas[clave] = (time.monotonic() + self.ttl, huella, status, cuerpo)
+            self._respuestas.move_to_end(clave)
+            self._purgar(time.monotonic())
+            self._condicion.notify_all()
+
+    def liberar(self, clave):
+        """Quita la reserva sin guardar respuesta (el cliente puede reintentar)"""
+        with self._condicion:
+            self._en_curso.pop(clave, None)
+            self._condicion.notify_all()
+
+    def estadisticas(self):
+        with self._condicion:
+            return {
+                'guardadas': len(self._respuestas),
+                'en_curso': len(self._en_curso),
+                'ttl': self.ttl
+            }
+
+
+def leer_clave(headers):
+    """Clave del encabezado (None si no viene); valida su longitud"""
+    clave = (headers.get(ENCABEZADO) or '').strip()
+    if not clave:
+        return None
+    if len(clave) > LONGITUD_MAXIMA:
+        raise ClaveIdempotenciaError(f'{ENCABEZADO} admite máximo {LONGITUD_MAXIMA} caracteres')
+    return clave
+
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def obtener_almacen_idempotencia(config):
+    """Retorna el almacén de claves del proceso, configurado desde app.config"""
+    global _almacen
+    if _almacen is None:
+        with _almacen_lock:
+            if _almacen is None:
+                _almacen = AlmacenIdempotencia(
+                    ttl=config.get('IDEMPOTENCIA_TTL', TTL_POR_DEFECTO),
+                    max_claves=config.get('IDEMPOTENCIA_MAX_CLAVES', MAX_CLAVES_POR_DEFECTO)
+                )
+    return _almacen
@@ -0,0 +1,256 @@
+"""
+Métricas de la aplicación en formato Prometheus (GET /metrics).
+
+- Latencia de cada ruta (histograma por blueprint, endpoint y método) y
+  peticiones por status.
+- Consultas a la base por petición: cantidad y tiempo, con los eventos
+  before/after_cursor_execute de SQLAlchemy.
+- Pool de conexiones: conexiones prestadas y overflow en uso.
+- Bytes de firmas recibidas y duración de la construcción del PDF por
+  asistente.
+- Escritor de SQLite: trabajos confirmados en cada commit y su duración.
+
+Con varios workers (src.servidor) cada proceso escribe sus valores en
+archivos de PROMETHEUS_MULTIPROC_DIR y /metrics suma los de todos, así no
+importa qué worker atiende la petición. La variable debe existir antes de
+importar prometheus_client; src.servidor la define. Sin ella (servidor de
+desarrollo) las métricas viven en memoria del proceso.
+"""
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from prometheus_client import (
+    CollectorRegistry, CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+from sqlalchemy import event
+
+from src.models.asistencia import db
+
+PREFIJO = 'asistencia'
+# Además de los tramos por defecto, los de /admin/generar-pdf (síncrono)
+TRAMOS_LATENCIA = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+TRAMOS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+TRAMOS_TIEMPO_BD = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 5)
+TRAMOS_PDF_ASISTENTE = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+TRAMOS_LOTE_ESCRITOR = (1, 2, 4, 8, 16, 32, 64, 128)
+
+PETICION_SEGUNDOS = Histogram(
+    f'{PREFIJO}_http_peticion_segundos', 'Duración de las peticiones HTTP',
+    ('blueprint', 'endpoint', 'metodo'), buckets=TRAMOS_LATENCIA
+)
+PETICIONES = Counter(
+    f'{PREFIJO}_http_peticiones', 'Peticiones HTTP por status',
+    ('blueprint', 'endpoint', 'metodo', 'status')
+)
+CONSULTAS_POR_PETICION = Histogram(
+    f'{PREFIJO}_bd_consultas_por_peticion', 'Consultas SQL ejecutadas en cada petición',
+    ('blueprint', 'endpoint'), buckets=TRAMOS_CONSULTAS
+)
+TIEMPO_BD_POR_PETICION = Histogram(
+    f'{PREFIJO}_bd_segundos_por_peticion', 'Tiempo en consultas SQL de cada petición',
+    ('blueprint', 'endpoint'), buckets=TRAMOS_TIEMPO_BD
+)
+CONSULTAS = Counter(f'{PREFIJO}_bd_consultas', 'Consultas SQL ejecutadas (con o sin petición)')
+CONSULTA_SEGUNDOS = Histogram(
+    f'{PREFIJO}_bd_consulta_segundos', 'Duración de cada consulta SQL', buckets=TRAMOS_TIEMPO_BD
+)
+# livesum: suma de los workers vivos
+POOL_PRESTADAS = Gauge(
+    f'{PREFIJO}_bd_pool_conexiones_prestadas', 'Conexiones del pool en uso', multiprocess_mode='livesum'
+)
+POOL_OVERFLOW = Gauge(
+    f'{PREFIJO}_bd_pool_overflow', 'Conexiones abiertas por encima de pool_size', multiprocess_mode='livesum'
+)
+POOL_TAMANO = Gauge(
+    f'{PREFIJO}_bd_pool_tamano', 'pool_size (suma de los workers)', multiprocess_mode='livesum'
+)
+FIRMAS = Counter(f'{PREFIJO}_firmas', 'Firmas recibidas', ('resultado',))
+FIRMAS_BYTES = Counter(f'{PREFIJO}_firmas_bytes', 'Bytes de firmas aceptadas (decodificadas)')
+PDF_SEGUNDOS = Histogram(
+    f'{PREFIJO}_pdf_construccion_segundos', 'Duración de la construcción del PDF de asistencia',
+    buckets=TRAMOS_LATENCIA
+)
+PDF_SEGUNDOS_POR_ASISTENTE = Histogram(
+    f'{PREFIJO}_pdf_segundos_por_asistente', 'Duración de la construcción del PDF dividida por asistentes',
+    buckets=TRAMOS_PDF_ASISTENTE
+)
+ESCRITOR_TRABAJOS_POR_COMMIT = Histogram(
+    f'{PREFIJO}_sqlite_trabajos_por_commit', 'Escrituras confirmadas juntas por el escritor de SQLite',
+    buckets=TRAMOS_LOTE_ESCRITOR
+)
+ESCRITOR_COMMIT_SEGUNDOS = Histogram(
+    f'{PREFIJO}_sqlite_commit_segundos', 'Duración de cada lote del escritor de SQLite', buckets=TRAMOS_TIEMPO_BD
+)
+
+# Funciones que reciben cada consulta terminada (ver observar_consultas)
+_observadores = []
+# Consultas que este hilo ejecuta por encargo de otro (ver capturar_consultas)
+_captura = threading.local()
+
+# Por pool instrumentado de este proceso (app y escritor de SQLite):
+# pool -> [prestadas, pool_size]; un Engine descartado sale solo
+_pools = weakref.WeakKeyDictionary()
+_pool_lock = threading.Lock()
+
+
+def multiproceso():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def exponer():
+    """(cuerpo, content-type) con las métricas de todos los procesos"""
+    if multiproceso():
+        from prometheus_client import multiprocess
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
+
+
+# --- Base de datos ---
+
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    # En el contexto de ejecución (uno por sentencia), no en la conexión: si
+    # la sentencia falla after_cursor_execute no corre y no queda nada colgado
+    if context is not None:
+        context.inicio_metricas = time.perf_counter()
+
+
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, 'inicio_metricas', None)
+    if inicio is None:
+        return
+    duracion = time.perf_counter() - inicio
+    CONSULTAS.inc()
+    CONSULTA_SEGUNDOS.observe(duracion)
+    if has_request_context() and 'metricas_consultas' in g:
+        g.metricas_consultas += 1
+        g.metricas_tiempo_bd += duracion
+    for observador in _observadores:
+        observador(statement, parameters, duracion)
+    capturadas = getattr(_captura, 'consultas', None)
+    if capturadas is not None:
+        capturadas.append((statement, parameters, duracion))
+
+
+@contextmanager
+def capturar_consultas():
+    """
+    Junta en una lista las consultas que este hilo ejecuta dentro del bloque
+    (p. ej. el escritor de SQLite con el trabajo de una petición), para
+    atribuirlas después con atribuir_consultas() en el hilo que las pidió.
+    """
+    anteriores = getattr(_captura, 'consultas', None)
+    _captura.consultas = consultas = []
+    try:
+        yield consultas
+    finally:
+        _captura.consultas = anteriores
+
+
+def atribuir_consultas(consultas):
+    """
+    Cuenta en la petición del hilo actual (g y observadores) consultas que
+    otro hilo ejecutó por ella. Los totales globales ya las incluyen.
+    """
+    for statement, parameters, duracion in consultas:
+        if has_request_context() and 'metricas_consultas' in g:
+            g.metricas_consultas += 1
+            g.metricas_tiempo_bd += duracion
+        for observador in _observadores:
+            observador(statement, parameters, duracion)
+
+
+def observar_consultas(funcion):
+    """
+    Llama a funcion(sql, parámetros, segundos) después de cada consulta de
+    los motores instrumentados (mismo cronómetro que las métricas)
+    """
+    if funcion not in _observadores:
+        _observadores.append(funcion)
+
+
+def _actualizar_pool(pool, cambio):
+    # El evento checkin llega antes de que el pool descuente la conexión, así
+    # que la cuenta se lleva aquí en lugar de leer pool.checkedout(). Los
+    # gauges suman todos los pools del proceso
+    with _pool_lock:
+        cuenta = _pools.setdefault(pool, [0, pool.size() if hasattr(pool, 'size') else 0])
+        cuenta[0] += cambio
+        prestadas = sum(p for p, _ in _pools.values())
+        overflow = sum(max(0, p - t) for p, t in _pools.values())
+        tamano = sum(t for _, t in _pools.values())
+    POOL_PRESTADAS.set(prestadas)
+    POOL_OVERFLOW.set(overflow)
+    POOL_TAMANO.set(tamano)
+
+
+def instrumentar_motor(engine):
+    """Conecta los eventos de consultas y del pool a un Engine (idempotente)"""
+    if event.contains(engine, 'before_cursor_execute', _antes_de_consulta):
+        return
+    event.listen(engine, 'before_cursor_execute', _antes_de_consulta)
+    event.listen(engine, 'after_cursor_execute', _despues_de_consulta)
+
+    pool = engine.pool
+    event.listen(engine, 'checkout', lambda *args: _actualizar_pool(pool, 1))
+    event.listen(engine, 'checkin', lambda *args: _actualizar_pool(pool, -1))
+    _actualizar_pool(pool, 0)
+
+
+# --- Peticiones ---
+
+def _etiquetas():
+    return request.blueprint or 'app', request.endpoint or 'sin_ruta'
+
+
+def _antes_de_peticion():
+    # El Engine se crea con la primera petición (create_app no lo toca)
+    instrumentar_motor(db.engine)
+    g.metricas_inicio = time.perf_counter()
+    g.metricas_consultas = 0
+    g.metricas_tiempo_bd = 0.0
+
+
+def _despues_de_peticion(respuesta):
+    if 'metricas_inicio' not in g:
+        return respuesta
+    blueprint, endpoint = _etiquetas()
+    PETICION_SEGUNDOS.labels(blueprint, endpoint, request.method).observe(time.perf_counter() - g.metricas_inicio)
+    PETICIONES.labels(blueprint, endpoint, request.method, str(respuesta.status_code)).inc()
+    CONSULTAS_POR_PETICION.labels(blueprint, endpoint).observe(g.metricas_consultas)
+    TIEMPO_BD_POR_PETICION.labels(blueprint, endpoint).observe(g.metricas_tiempo_bd)
+    return respuesta
+
+
+def configurar_metricas(app):
+    """Mide cada petición de la app (latencia, status y consultas a la base)"""
+    app.before_request(_antes_de_peticion)
+    app.after_request(_despues_de_peticion)
+
+
+# --- Firmas, PDF y escritor de SQLite ---
+
+def registrar_firma(bytes_decodificados=None):
+    """Firma aceptada (con su tamaño) o rechazada (sin tamaño)"""
+    if bytes_decodificados is None:
+        FIRMAS.labels('rechazada').inc()
+        return
+    FIRMAS.labels('aceptada').inc()
+    FIRMAS_BYTES.inc(bytes_decodificados)
+
+
+def registrar_pdf(segundos, asistentes):
+    PDF_SEGUNDOS.observe(segundos)
+    if asistentes:
+        PDF_SEGUNDOS_POR_ASISTENTE.observe(segundos / asistentes)
+
+
+def registrar_lote_escritor(trabajos, segundos):
+    ESCRITOR_TRABAJOS_POR_COMMIT.observe(trabajos)
+    ESCRITOR_COMMIT_SEGUNDOS.observe(segundos)
@@ -0,0 +1,147 @@
+"""
+Miniaturas de firmas para el PDF de asistencia.
+
+Cada firma se reduce una sola vez al tamaño de su celda (75x25 puntos para
+asistentes, 70x25 para capacitadores) a una resolución de impresión, con una
+paleta de pocos colores. El archivo y sus dimensiones quedan guardados en
+MiniaturaFirma, así que el PDF no vuelve a abrir la imagen original ni a
+consultar su tamaño. Original y miniatura se leen y escriben a través del
+backend de almacenamiento.
+"""
+import logging
+import os
+from io import BytesIO
+
+from PIL import Image
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.models.asistencia import db, MiniaturaFirma
+
+# Tamaño máximo de la celda en puntos (ancho, alto)
+CAJAS = {
+    'asistente': (75, 25),
+    'capacitador': (70, 25),
+}
+
+# Píxeles por punto de la miniatura (3 ≈ 216 dpi)
+ESCALA = 3
+COLORES_PALETA = 16
+SUBCARPETA = 'uploads/miniaturas'
+
+logger = logging.getLogger(__name__)
+
+
+def dimensiones_en_celda(ancho, alto, tipo):
+    """Mismo escalado proporcional que ajustar_firma: solo reduce, nunca amplía"""
+    max_width, max_height = CAJAS[tipo]
+    aspect = alto / float(ancho)
+
+    if ancho > max_width:
+        ancho = max_width
+        alto = ancho * aspect
+    if alto > max_height:
+        alto = max_height
+        ancho = alto / aspect
+
+    return ancho, alto
+
+
+def crear_miniatura(ruta_original, almacen, tipo):
+    """
+    Genera la miniatura, la guarda en el almacén y retorna
+    (ruta_relativa, ancho, alto) con las dimensiones en puntos.
+    """
+    origen = almacen.ruta_local(ruta_original)
+    if origen is None:
+        raise FileNotFoundError(ruta_original)
+
+    with Image.open(origen) as imagen:
+        imagen = imagen.convert("RGBA")
+        ancho, alto = dimensiones_en_celda(imagen.width, imagen.height, tipo)
+
+        # Fondo blanco (la celda del PDF es blanca) y paleta reducida
+        fondo = Image.new("RGBA", imagen.size, (255, 255, 255, 255))
+        fondo.alpha_composite(imagen)
+        pixeles = (max(1, round(ancho * ESCALA)), max(1, round(alto * ESCALA)))
+        reducida = fondo.convert("RGB").resize(pixeles, Image.LANCZOS)
+        reducida = reducida.quantize(colors=COLORES_PALETA)
+
+    nombre = os.path.splitext(os.path.basename(ruta_original))[0] + '.png'
+    ruta_relativa = f"{SUBCARPETA}/{tipo}/{nombre[:2]}/{nombre}"
+    salida = BytesIO()
+    reducida.save(salida, format="PNG", optimize=True)
+    almacen.guardar(ruta_relativa, salida.getvalue())
+
+    return ruta_relativa, ancho, alto
+
+
+def obtener_miniaturas(firmas, almacen):
+    """
+    Retorna (miniaturas, faltantes) para las firmas indicadas, creando las
+    miniaturas que falten:
+    - miniaturas: {ruta_original: (ruta_local, ancho, alto)}. Las rutas son
+      archivos locales (el almacén los descarga a su caché si no están en
+      disco). Si la miniatura no se pudo generar, ruta_local es el original
+      y ancho/alto son None (el PDF lo ajusta al armar la celda).
+    - faltantes: originales que todavía no están en el almacén (otro worker
+      o nodo no terminó de escribirlos); el PDF sale sin ellos y no debe
+      guardarse en caché.
+    - firmas: iterable de (ruta_original, tipo)
+    """
+    firmas = dict(firmas)
+    if not firmas:
+        return {}, set()
+
+    resultado = {}
+    existentes = MiniaturaFirma.query.filter(
+        MiniaturaFirma.ruta_original.in_(list(firmas))
+    ).all()
+
+    for miniatura in existentes:
+        ruta = almacen.ruta_local(miniatura.ruta_miniatura)
+        if ruta:
+            resultado[miniatura.ruta_original] = (ruta, miniatura.ancho, miniatura.alto)
+
+    conocidas = {m.ruta_original for m in existentes}
+    nuevas = []
+    faltantes = set()
+
+    for ruta_original, tipo in firmas.items():
+        if ruta_original in resultado:
+            continue
+
+        try:
+            ruta_miniatura, ancho, alto = crear_miniatura(ruta_original, almacen, tipo)
+        except FileNotFoundError:
+            faltantes.add(ruta_original)
+            continue
+        except Exception as e:
+            logger.warning("⚠️ Error creando miniatura de %s: %s", ruta_original, e)
+            original = almacen.ruta_local(ruta_original)
+            if original:
+                resultado[ruta_original] = (original, None, None)
+            continue
+
+        resultado[ruta_original] = (almacen.ruta_local(ruta_miniatura), ancho, alto)
+        if ruta_original not in conocidas:
+            nuevas.append(MiniaturaFirma(
+                ruta_original=ruta_original,
+                ruta_miniatura=ruta_miniatura,
+                tipo=tipo,
+                ancho=ancho,
+                alto=alto
+            ))
+
+    if nuevas:
+        # Sesión aparte: un commit en db.session expiraría los asistentes ya
+        # cargados por el PDF y los volvería a consultar uno por uno
+        with Session(db.engine) as sesion:
+            try:
+                sesion.add_all(nuevas)
+                sesion.commit()
+            except IntegrityError:
+                # Otra petición generó las mismas miniaturas al mismo tiempo
+                sesion.rollback()
+
+    return resultado, faltantes
@@ -0,0 +1,254 @@
+"""
+Registro de asistentes por lotes (/api/registrar/lote).
+
+En línea el formulario registra por /api/registrar. Sin conexión guarda el
+envío en IndexedDB con una clave de idempotencia generada en el navegador
+(la misma del Idempotency-Key) y sube la cola completa cuando vuelve la red. Aquí
+el lote se valida con pocas consultas (claves ya vistas, documentos ya
+registrados, capacitaciones) y se inserta en una sola transacción con un
+INSERT masivo. Cada elemento recibe su resultado: 'creado', 'duplicado' o
+'rechazado'. Reenviar el mismo lote no crea nada nuevo.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from src.models.asistencia import db, Asistente, Configuracion, ClaveRegistro
+from src.services.contadores import incrementar_contadores
+from src.services.empleados import completar_registro
+from src.services.escritor_sqlite import escribir
+from src.services.firmas import preparar_firma, FirmaInvalidaError
+
+LOTE_MAXIMO_POR_DEFECTO = 200
+# Máximo entre la hora que informa el dispositivo y la subida del lote
+RETRASO_HORAS_POR_DEFECTO = 4
+CAMPOS_OBLIGATORIOS = ('nombres_apellidos', 'tipodocumento', 'numero_documento', 'cargo', 'ruta', 'ciudad')
+
+logger = logging.getLogger(__name__)
+
+
+class LoteInvalidoError(ValueError):
+    """El cuerpo de la petición no es un lote válido"""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+def _hora_llegada(registrado_en, ahora, hora_inicio, hora_fin, retraso_maximo):
+    """
+    Hora en que se llenó el formulario (puede ser anterior a la subida si
+    el dispositivo estuvo sin conexión). Si falta, es de otro día o está en
+    el futuro, se usa la hora del servidor. La hora informada se ajusta al
+    horario de la capacitación [hora_inicio, hora_fin]. Retorna None si es
+    anterior a la subida por más de `retraso_maximo` (el registro se rechaza).
+    """
+    if not registrado_en:
+        return ahora
+    try:
+        hora = datetime.fromisoformat(str(registrado_en).replace('Z', '+00:00'))
+    except ValueError:
+        return ahora
+    if hora.tzinfo is None:
+        return ahora
+    hora = hora.astimezone(ahora.tzinfo)
+    if hora > ahora:
+        return ahora
+    if ahora - hora > retraso_maximo:
+        return None
+    if hora.date() != ahora.date():
+        return ahora
+    if hora.time() < hora_inicio:
+        return datetime.combine(hora.date(), hora_inicio, tzinfo=hora.tzinfo)
+    if hora.time() > hora_fin:
+        return datetime.combine(hora.date(), hora_fin, tzinfo=hora.tzinfo)
+    return hora
+
+
+def registrar_lote(registros, ahora, static_dir, config, config_activa=None, lote_maximo=LOTE_MAXIMO_POR_DEFECTO):
+    """
+    Procesa el lote y retorna (resultados, trabajos_firma).
+    - registros: lista de dicts con 'clave', los campos del formulario,
+      'firma_digital' opcional, 'configuracion_id' y 'registrado_en' opcionales
+    - config_activa: snapshot de la capacitación en horario ahora (para los
+      registros que no traen configuracion_id)
+    Los trabajos de firma se deben encolar después del commit.
+    """
+    if not isinstance(registros, list) or not registros:
+        raise LoteInvalidoError('Se espera una lista "registros" no vacía')
+    if len(registros) > lote_maximo:
+        raise LoteInvalidoError(f'El lote supera el máximo de {lote_maximo} registros', 413)
+
+    hoy = ahora.date()
+    retraso_maximo = timedelta(hours=config.get('REGISTRO_LOTE_RETRASO_HORAS', RETRASO_HORAS_POR_DEFECTO))
+    resultados = [None] * len(registros)
+
+    def rechazar(i, clave, mensaje):
+        resultados[i] = {'clave': clave, 'estado': 'rechazado', 'error': mensaje}
+
+    # ✅ Claves ya procesadas en envíos anteriores (una consulta)
+    claves = [str(r.get('clave') or '').strip() if isinstance(r, dict) else '' for r in registros]
+    vistas = dict(db.session.query(ClaveRegistro.clave, ClaveRegistro.asistente_id).filter(
+        ClaveRegistro.clave.in_([c for c in claves if c])
+    ).all())
+
+    # ✅ Capacitaciones referenciadas (una consulta)
+    ids_registros = []
+    for registro in registros:
+        try:
+            valor = registro.get('configuracion_id') if isinstance(registro, dict) else None
+            ids_registros.append(int(valor) if valor not in (None, '') else None)
+        except (TypeError, ValueError):
+            ids_registros.append(-1)
+    ids_config = {c for c in ids_registros if c is not None}
+    configuraciones = {
+        c.id: c for c in Configuracion.query.filter(Configuracion.id.in_(ids_config)).all()
+    } if ids_config else {}
+
+    candidatos = []
+    claves_en_lote = set()
+    for i, registro in enumerate(registros):
+        clave = claves[i]
+        if not isinstance(registro, dict):
+            rechazar(i, clave, 'Registro inválido')
+            continue
+        if not clave or len(clave) > 64:
+            rechazar(i, clave, 'Falta la clave del registro (máximo 64 caracteres)')
+            continue
+        if clave in vistas or clave in claves_en_lote:
+            resultados[i] = {'clave': clave, 'estado': 'duplicado', 'asistente_id': vistas.get(clave)}
+            continue
+        claves_en_lote.add(clave)
+
+        datos = completar_registro(
+            {campo: str(registro.get(campo) or '').strip() for campo in CAMPOS_OBLIGATORIOS}, config
+        )
+        if not all(datos.values()):
+            rechazar(i, clave, 'Todos los campos son obligatorios')
+            continue
+
+        configuracion_id = ids_registros[i]
+        if configuracion_id is not None:
+            configuracion = configuraciones.get(configuracion_id)
+            # Se acepta fuera de horario: pudo llenarse sin conexión durante la sesión
+            if not configuracion or not configuracion.activo or configuracion.fecha_capacitacion != hoy:
+                rechazar(i, clave, 'La capacitación no está activa hoy')
+                continue
+        elif config_activa is not None and config_activa.activo and config_activa.esta_en_horario(ahora.time()):
+            configuracion_id = config_activa.config_id
+            configuracion = config_activa
+        else:
+            rechazar(i, clave, 'No hay capacitaciones disponibles en este momento')
+            continue
+
+        hora = _hora_llegada(
+            registro.get('registrado_en'), ahora, configuracion.hora_inicio, configuracion.hora_fin, retraso_maximo
+        )
+        if hora is None:
+            rechazar(i, clave, 'El registro se llenó hace demasiado tiempo')
+            continue
+
+        candidatos.append((i, clave, configuracion_id, datos, registro, hora))
+
+    # ✅ Documentos ya registrados en esas capacitaciones (una consulta)
+    existentes = {}
+    if candidatos:
+        documentos = {datos['numero_documento'] for _, _, _, datos, _, _ in candidatos}
+        existentes = {
+            (configuracion_id, documento): asistente_id
+            for asistente_id, configuracion_id, documento in db.session.query(
+                Asistente.id, Asistente.configuracion_id, Asistente.numero_documento
+            ).filter(
+                Asistente.configuracion_id.in_({c for _, _, c, _, _, _ in candidatos}),
+                Asistente.numero_documento.in_(documentos)
+            ).all()
+        }
+
+    nuevos = []
+    trabajos_firma = []
+    en_lote = {}
+    for i, clave, configuracion_id, datos, registro, hora in candidatos:
+        llave = (configuracion_id, datos['numero_documento'])
+        if llave in existentes or llave in en_lote:
+            resultados[i] = {
+                'clave': clave,
+                'estado': 'duplicado',
+                'asistente_id': existentes.get(llave),
+                'error': 'Ya está registrado en esta capacitación'
+            }
+            continue
+
+        trabajo_firma = None
+        firma = str(registro.get('firma_digital') or '').strip()
+        if firma:
+            try:
+                trabajo_firma = preparar_firma(firma, static_dir, 'uploads/firmas', config)
+            except FirmaInvalidaError as e:
+                logger.warning("❌ Error al guardar firma (%s): %s", clave, e)
+
+        fila = dict(
+            datos,
+            hora_llegada=hora,
+            fecha_registro=hoy,
+            firma_digital=trabajo_firma.ruta_relativa if trabajo_firma else None,
+            configuracion_id=configuracion_id
+        )
+        en_lote[llave] = i
+        nuevos.append((i, clave, fila, trabajo_firma))
+
+    if nuevos:
+        creados = _insertar(nuevos)
+        for i, clave, fila, trabajo_firma in nuevos:
+            asistente_id = creados.get(i)
+            if asistente_id is None:
+                resultados[i] = {'clave': clave, 'estado': 'duplicado', 'error': 'Ya está registrado en esta capacitación'}
+                continue
+            resultados[i] = {
+                'clave': clave,
+                'estado': 'creado',
+                'asistente_id': asistente_id,
+                'hora_llegada': fila['hora_llegada'].strftime('%H:%M:%S')
+            }
+            if trabajo_firma:
+                trabajos_firma.append(trabajo_firma)
+
+    return resultados, trabajos_firma
+
+
+def _insertar_filas(session, nuevos):
+    """Trabajo de escritura: INSERT masivo con RETURNING, claves y contadores (sin commit)"""
+    filas = [fila for _, _, fila, _ in nuevos]
+    ids = session.execute(
+        insert(Asistente).returning(Asistente.id, sort_by_parameter_order=True),
+        filas
+    ).scalars().all()
+    session.execute(insert(ClaveRegistro), [
+        {'clave': clave, 'asistente_id': asistente_id}
+        for (_, clave, _, _), asistente_id in zip(nuevos, ids)
+    ])
+    incrementar_contadores(session, filas)
+    return {i: asistente_id for (i, _, _, _), asistente_id in zip(nuevos, ids)}
+
+
+def _insertar(nuevos):
+    """
+    Inserta todas las filas en una transacción (ver escritor_sqlite.escribir).
+    Si otra petición registró el mismo documento entre la validación y el
+    INSERT, se reintenta fila por fila para aislar el duplicado.
+    Retorna {indice: asistente_id} de los insertados.
+    """
+    try:
+        return escribir(lambda session: _insertar_filas(session, nuevos))
+    except IntegrityError:
+        pass
+
+    creados = {}
+    for nuevo in nuevos:
+        try:
+            creados.update(escribir(lambda session: _insertar_filas(session, [nuevo])))
+        except IntegrityError:
+            pass
+    return creados
@@ -0,0 +1,429 @@
+"""
+Construcción del PDF de la lista de asistencia (formato FR-TH-01).
+
+Los estilos se crean una sola vez al importar el módulo; cada capacitación
+se arma como una sección independiente del documento.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from types import SimpleNamespace
+
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.utils import ImageReader
+
+# Se incrementa cuando cambia el diseño, para invalidar los PDF en caché
+VERSION_FORMATO = 2
+
+logger = logging.getLogger(__name__)
+
+styles = getSampleStyleSheet()
+
+style_small_title = ParagraphStyle(name='SmallTitle', fontSize=12, alignment=TA_CENTER)
+style_main_title = ParagraphStyle(name='MainTitle', fontSize=16, alignment=TA_CENTER)
+style_info = ParagraphStyle(name='InfoStyle', fontSize=9, alignment=TA_CENTER)
+
+style_label = ParagraphStyle(
+    name='Label',
+    fontSize=7,
+    fontName='Helvetica-Bold',
+    alignment=TA_CENTER
+)
+
+style_value = ParagraphStyle(
+    name='Value',
+    fontSize=7,
+    fontName='Helvetica',
+    alignment=TA_CENTER
+)
+
+style_header = ParagraphStyle(
+    name='Header',
+    fontSize=7,
+    fontName='Helvetica-Bold',
+    alignment=TA_CENTER,
+    leading=8
+)
+
+style_data = ParagraphStyle(
+    name='Data',
+    fontSize=8,
+    fontName='Helvetica',
+    alignment=TA_CENTER,
+    leading=7
+)
+
+style_total_general = ParagraphStyle(name='TotalGeneral', fontSize=12, fontName='Helvetica-Bold')
+
+ENCABEZADO_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+    ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+    ('ALIGN', (2, 0), (2, 0), 'CENTER'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+INFO_STYLE = TableStyle([
+    ('SPAN', (1, 0), (5, 0)),
+    ('SPAN', (2, 2), (3, 2)),
+    ('SPAN', (4, 2), (5, 2)),
+    ('SPAN', (0, 3), (1, 3)),
+    ('SPAN', (3, 3), (4, 3)),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('LEFTPADDING', (0, 0), (-1, -1), 2),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 2),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+ASISTENTES_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 7),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ('TOPPADDING', (0, 0), (-1, -1), 4),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 5),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+
+def ajustar_firma(ruta_firma, es_capacitador=False):
+    """
+    Ajusta la imagen de la firma para que se vea bien sin deformar la celda.
+    - es_capacitador: True para firmas de capacitadores
+    """
+    try:
+        firma_reader = ImageReader(ruta_firma)
+
+        # Tamaños equilibrados
+        if es_capacitador:
+            max_width = 70
+            max_height = 25
+        else:
+            max_width = 75
+            max_height = 25
+
+        width, height = firma_reader.getSize()
+        aspect = height / float(width)
+
+        # Escalado proporcional
+        if width > max_width:
+            width = max_width
+            height = width * aspect
+        if height > max_height:
+            height = max_height
+            width = height / aspect
+
+        return Image(ruta_firma, width=width, height=height)
+    except Exception as e:
+        logger.warning("⚠️ Error ajustando firma %s: %s", ruta_firma, e)
+        return ""
+
+
+def imagen_firma(ruta_relativa, miniaturas, es_capacitador=False):
+    """
+    Flowable de la firma: usa la miniatura precalculada (sin abrir la imagen)
+    y solo si no se pudo generar recurre a ajustar_firma sobre la copia local
+    del original (ver obtener_miniaturas). Sin ninguna de las dos, celda vacía.
+    """
+    if ruta_relativa in miniaturas:
+        ruta, ancho, alto = miniaturas[ruta_relativa]
+        if ancho is None:
+            return ajustar_firma(ruta, es_capacitador=es_capacitador)
+        return Image(ruta, width=ancho, height=alto)
+
+    return Paragraph("", styles['Normal'])
+
+
+def _encabezado(static_dir):
+    # ======== Encabezado Superior ========
+    logo_path = os.path.join(static_dir, 'logotipo.png')
+    if os.path.exists(logo_path):
+        logo = Image(logo_path)
+        logo._restrictSize(1.5*inch, 1.5*inch)
+    else:
+        logo = Paragraph("LOGO", styles['Normal'])
+
+    titulo_centro = [
+        Paragraph("<b>GESTIÓN DEL TALENTO HUMANO</b>", style_small_title),
+        Spacer(1, 4),
+        Paragraph("<b>REGISTRO DE ASISTENCIA</b>", style_main_title)
+    ]
+
+    info_derecha = [
+        Paragraph("<b>Código: FR-TH-01</b>", style_info),
+        Paragraph("<b>Versión: 04</b>", style_info),
+        Paragraph("<b>Fecha de actualización:</b><br/>12/Nov/2025", style_info)
+    ]
+
+    encabezado_table = Table([[logo, titulo_centro, info_derecha]], colWidths=[1.8*inch, 4.4*inch, 1.8*inch])
+    encabezado_table.setStyle(ENCABEZADO_STYLE)
+    return encabezado_table
+
+
+def construir_seccion(config, capacitador, asistentes, fecha_obj, static_dir, miniaturas=None):
+    """
+    Retorna los elementos (flowables) de la sección de una capacitación:
+    encabezado, datos generales, capacitador y tabla de asistentes.
+    - miniaturas: {ruta_firma: (ruta_miniatura, ancho, alto)}
+    """
+    miniaturas = miniaturas or {}
+    story = [_encabezado(static_dir), Spacer(1, 6)]
+
+    # ======== Información del capacitador de ESTA capacitación ========
+    nombre_instructor = ""
+    firma_img = Paragraph("", styles['Normal'])
+
+    if capacitador:
+        nombre_instructor = capacitador.nombre_completo
+
+        if capacitador.firma_digital:
+            firma_img = imagen_firma(capacitador.firma_digital, miniaturas, es_capacitador=True)
+
+    intensidad_horaria = ""
+    if config.hora_inicio and config.hora_fin:
+        intensidad_horaria = f"{config.hora_inicio.strftime('%H:%M')} - {config.hora_fin.strftime('%H:%M')}"
+
+    col_width = 8*inch / 6
+
+    info_general = [
+        [Paragraph('<b>TEMA:</b>', style_label),
+        Paragraph(config.nombre_capacitacion or '', style_value),
+        '', '', '', ''],
+
+        [Paragraph('<b>CIUDAD:</b>', style_label),
+        Paragraph(config.ciudad_capacitacion or '', style_value),
+        Paragraph('<b>MODALIDAD:</b>', style_label),
+        Paragraph(config.modalidad_capacitacion or '', style_value),
+        Paragraph('<b>FECHA:</b>', style_label),
+        Paragraph(fecha_obj.strftime('%d/%m/%Y'), style_value)],
+
+        [Paragraph('<b>INTENSIDAD HORARIA:</b>', style_label),
+        Paragraph(intensidad_horaria, style_value),
+        Paragraph('<b>ENTIDAD CAPACITADORA:</b>', style_label),
+        '',
+        Paragraph(config.asesor_externo or config.nombre_empresa or '', style_value),
+        ''],
+
+        [Paragraph('<b>NOMBRE DEL CAPACITADOR:</b>', style_label),
+        '',
+        Paragraph(nombre_instructor, style_value),
+        Paragraph('<b>FIRMA DEL CAPACITADOR:</b>', style_label),
+        '',
+        firma_img]
+    ]
+
+    tabla_info = Table(info_general, colWidths=[col_width] * 6)
+    tabla_info.setStyle(INFO_STYLE)
+
+    story.append(tabla_info)
+    story.append(Spacer(1, 12))
+
+    # ======== Tabla de asistentes ========
+    data = [[
+        Paragraph('<b>N°</b>', style_header),
+        Paragraph('<b>Tipo de documento</b>', style_header),
+        Paragraph('<b>Número de documento</b>', style_header),
+        Paragraph('<b>Nombre y apellidos completos</b>', style_header),
+        Paragraph('<b>Cargo</b>', style_header),
+        Paragraph('<b>Ciudad</b>', style_header),
+        Paragraph('<b>Firma</b>', style_header),
+        Paragraph('<b>N° Ruta</b>', style_header)
+    ]]
+
+    for i, asistente in enumerate(asistentes, 1):
+        firma_asistente = Paragraph("", styles['Normal'])
+        if asistente.firma_digital:
+            firma_asistente = imagen_firma(asistente.firma_digital, miniaturas)
+
+        data.append([
+            Paragraph(str(i), style_data),
+            Paragraph(asistente.tipodocumento or 'CC', style_data),
+            Paragraph(asistente.numero_documento, style_data),
+            Paragraph(asistente.nombres_apellidos, style_data),
+            Paragraph(asistente.cargo, style_data),
+            Paragraph(asistente.ciudad, style_data),
+            firma_asistente,
+            Paragraph(asistente.ruta, style_data)
+        ])
+
+    row_heights = [28] + [23] * len(asistentes)
+
+    table = Table(data,
+                 colWidths=[
+                     0.3*inch, 0.7*inch, 0.9*inch, 2.2*inch,
+                     1.3*inch, 0.8*inch, 1.2*inch, 0.6*inch
+                 ],
+                 rowHeights=row_heights)
+    table.setStyle(ASISTENTES_STYLE)
+
+    story.append(table)
+    story.append(Spacer(1, 15))
+    story.append(Paragraph(
+        f"<b>Total de asistentes:</b> {len(asistentes)}",
+        styles['Normal']
+    ))
+
+    return story
+
+
+def construir_pdf(destino, secciones, fecha_obj, static_dir, miniaturas=None):
+    """
+    Genera el PDF completo en `destino` (ruta o archivo).
+    - secciones: lista de (config, capacitador, asistentes) con al menos un asistente
+    - miniaturas: {ruta_firma: (ruta_miniatura, ancho, alto)}
+    """
+    doc = SimpleDocTemplate(destino, pagesize=A4)
+    story = []
+    total = 0
+
+    for idx, (config, capacitador, asistentes) in enumerate(secciones):
+        story.extend(construir_seccion(config, capacitador, asistentes, fecha_obj, static_dir, miniaturas))
+        total += len(asistentes)
+
+        if len(secciones) > 1 and idx < len(secciones) - 1:
+            story.append(Spacer(1, 0.5*inch))
+            story.append(Paragraph("<br/><hr/><br/>", styles['Normal']))
+
+    if len(secciones) > 1:
+        story.append(Spacer(1, 20))
+        story.append(Paragraph(
+            f"<b>Total general de asistentes:</b> {total}",
+            style_total_general
+        ))
+
+    doc.build(story)
+
+
+# ======== Construcción en paralelo (una capacitación por proceso) ========
+
+_CAMPOS_CONFIG = ('id', 'nombre_capacitacion', 'ciudad_capacitacion', 'modalidad_capacitacion',
+                  'hora_inicio', 'hora_fin', 'asesor_externo', 'nombre_empresa')
+_CAMPOS_CAPACITADOR = ('nombre_completo', 'firma_digital')
+_CAMPOS_ASISTENTE = ('tipodocumento', 'numero_documento', 'nombres_apellidos', 'cargo',
+                     'ciudad', 'ruta', 'firma_digital')
+
+PROCESOS_MAXIMOS = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def paralelo_disponible():
+    """La unión de los PDF parciales requiere pypdf"""
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _copiar(objeto, campos):
+    """Copia plana (serializable entre procesos) de un modelo"""
+    if objeto is None:
+        return None
+    return SimpleNamespace(**{campo: getattr(objeto, campo) for campo in campos})
+
+
+def _renderizar_seccion(config, capacitador, asistentes, fecha_obj, static_dir, miniaturas, total_general):
+    """Genera el PDF de una sola capacitación y retorna sus bytes (corre en otro proceso)"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    story = construir_seccion(config, capacitador, asistentes, fecha_obj, static_dir, miniaturas)
+
+    if total_general is not None:
+        story.append(Spacer(1, 20))
+        story.append(Paragraph(
+            f"<b>Total general de asistentes:</b> {total_general}",
+            style_total_general
+        ))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _obtener_pool(procesos):
+    """
+    Pool de procesos del worker, de a lo sumo PROCESOS_MAXIMOS y nunca más
+    que los CPU. Los procesos salen de un forkserver y no de un fork del
+    worker: no heredan sus hilos (escritor de SQLite, logs, SSE) ni las
+    conexiones abiertas del pool de SQLAlchemy.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                contexto = multiprocessing.get_context('forkserver')
+                # ReportLab se importa una vez en el forkserver, no en cada proceso
+                contexto.set_forkserver_preload([__name__])
+            else:
+                contexto = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, min(procesos, PROCESOS_MAXIMOS, os.cpu_count() or 1)),
+                mp_context=contexto
+            )
+        return _pool
+
+
+def construir_pdf_paralelo(destino, secciones, fecha_obj, static_dir, miniaturas=None, procesos=None,
+                           avance=None):
+    """
+    Igual que construir_pdf, pero cada capacitación se renderiza en un proceso
+    del pool y luego se unen los PDF. Cada capacitación empieza en una página nueva.
+    - avance: función avance(terminadas, total) llamada al terminar cada sección
+    """
+    from pypdf import PdfWriter
+
+    miniaturas = miniaturas or {}
+    procesos = procesos or PROCESOS_MAXIMOS
+    pool = _obtener_pool(procesos)
+    total = sum(len(asistentes) for _, _, asistentes in secciones)
+
+    futuros = []
+    for idx, (config, capacitador, asistentes) in enumerate(secciones):
+        # Solo se envían a cada proceso las miniaturas de su capacitación
+        rutas = {a.firma_digital for a in asistentes if a.firma_digital}
+        if capacitador is not None and capacitador.firma_digital:
+            rutas.add(capacitador.firma_digital)
+
+        es_ultima = idx == len(secciones) - 1
+        futuros.append(pool.submit(
+            _renderizar_seccion,
+            _copiar(config, _CAMPOS_CONFIG),
+            _copiar(capacitador, _CAMPOS_CAPACITADOR),
+            [_copiar(a, _CAMPOS_ASISTENTE) for a in asistentes],
+            fecha_obj,
+            static_dir,
+            {ruta: miniaturas[ruta] for ruta in rutas if ruta in miniaturas},
+            total if es_ultima and len(secciones) > 1 else None
+        ))
+
+    if avance is not None:
+        for terminadas, _ in enumerate(as_completed(futuros), 1):
+            avance(terminadas, len(futuros))
+
+    writer = PdfWriter()
+    for futuro in futuros:
+        writer.append(BytesIO(futuro.result()))
+
+    if isinstance(destino, (str, os.PathLike)):
+        with open(destino, 'wb') as archivo:
+            writer.write(archivo)
+    else:
+        writer.write(destino)
@@ -0,0 +1,414 @@
+"""
+Generación de reportes: lista de asistencia en PDF y exportaciones CSV/XLSX.
+
+generar_pdf_lista() arma el PDF (con caché, miniaturas y modo paralelo) y lo
+usan tanto /admin/generar-pdf como los trabajos en segundo plano. Los
+trabajos se guardan en la tabla trabajos_reporte y corren en un grupo
+acotado de hilos; el archivo final queda en disco para que un reinicio no
+pierda los reportes ya terminados.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+
+from src.models.asistencia import db, Asistente, Configuracion, Capacitador, TrabajoReporte, now_colombia
+from src.services.cache_pdf import obtener_cache, calcular_clave
+from src.services.escritor_sqlite import escribir
+from src.services.firmas import obtener_procesador
+from src.services.metricas import registrar_pdf
+from src.services.miniaturas import obtener_miniaturas
+from src.services.almacenamiento import obtener_almacenamiento
+from src.services.exportacion import consultar_filas, generar_csv, generar_xlsx, xlsx_disponible, TAMANO_LOTE_POR_DEFECTO
+
+TIPOS = ('pdf', 'csv', 'xlsx')
+CONCURRENCIA_POR_DEFECTO = 2
+COLA_MAXIMA_POR_DEFECTO = 20
+RETENCION_HORAS_POR_DEFECTO = 24
+# Un trabajo sin actualizaciones por más de este tiempo se considera interrumpido
+MINUTOS_SIN_ACTUALIZAR = 15
+# Mientras un trabajo corre se toca updated_at con esta frecuencia, aunque
+# el progreso no cambie (p. ej. durante doc.build de un PDF grande)
+LATIDO_SEGUNDOS = 60
+
+logger = logging.getLogger(__name__)
+
+MIMETYPES = {
+    'pdf': 'application/pdf',
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ReporteError(Exception):
+    """Error esperado al generar un reporte (filtros inválidos, sin datos...)"""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+@dataclass
+class ArchivoReporte:
+    ruta: str
+    nombre: str
+    mimetype: str
+    # True si la ruta es un temporal que debe borrarse después de usarlo
+    temporal: bool = False
+
+
+def _sin_progreso(porcentaje, mensaje):
+    pass
+
+
+def generar_pdf_lista(fecha_obj, capacitacion_id, config, root_path, progreso=_sin_progreso):
+    """
+    Genera (o toma del caché) el PDF de asistencia de una fecha.
+    - capacitacion_id: id de una capacitación o None para todas las del día
+    - config: app.config
+    Lanza ReporteError si no hay datos.
+    """
+    # ReportLab se importa con el primer PDF, no al arrancar cada worker
+    from src.services.reporte_pdf import construir_pdf, construir_pdf_paralelo, paralelo_disponible, VERSION_FORMATO
+
+    fecha_filtro = fecha_obj.strftime('%Y-%m-%d')
+    progreso(5, 'Consultando asistentes')
+
+    # ✅ Resumen por capacitación (cantidad e id máximo): sirve para saber
+    # qué capacitaciones incluir y como clave del caché, sin cargar filas
+    resumen_query = db.session.query(
+        Asistente.configuracion_id,
+        db.func.count(Asistente.id),
+        db.func.max(Asistente.id)
+    ).filter(Asistente.fecha_registro == fecha_obj)
+
+    if capacitacion_id:
+        config_unica = Configuracion.query.get(int(capacitacion_id))
+        if not config_unica:
+            raise ReporteError('Capacitación no encontrada', 404)
+        resumen_query = resumen_query.filter(Asistente.configuracion_id == config_unica.id)
+
+    resumen = resumen_query.group_by(Asistente.configuracion_id).all()
+
+    if not resumen:
+        if capacitacion_id:
+            raise ReporteError('No hay asistentes registrados para los filtros seleccionados', 404)
+        raise ReporteError('No hay asistentes registrados para esta fecha', 404)
+
+    capacitaciones_ids = [configuracion_id for configuracion_id, _, _ in resumen]
+    capacitaciones = Configuracion.query.filter(
+        Configuracion.id.in_(capacitaciones_ids)
+    ).order_by(Configuracion.id).all()
+
+    # ✅ Capacitadores de todas las capacitaciones en una sola consulta
+    capacitadores = {}
+    for capacitador in Capacitador.query.filter(
+        Capacitador.configuracion_id.in_(capacitaciones_ids)
+    ).order_by(Capacitador.id).all():
+        capacitadores.setdefault(capacitador.configuracion_id, capacitador)
+
+    if capacitacion_id and len(capacitaciones) == 1:
+        nombre_cap = capacitaciones[0].nombre_capacitacion.replace(" ", "_")[:30]
+        nombre_archivo = f"Lista_{nombre_cap}_{fecha_filtro}.pdf"
+    else:
+        nombres_caps = "_".join([cap.nombre_capacitacion.replace(" ", "_")[:15] for cap in capacitaciones])
+        nombre_archivo = f"Lista_{nombres_caps}_{fecha_filtro}.pdf"
+
+    # ✅ Varias capacitaciones: cada sección se arma en un proceso aparte
+    # (por defecto solo si hay más de un CPU; con uno es más lento). En
+    # paralelo cada capacitación empieza en una página nueva, así que el
+    # modo es parte de la clave del caché
+    usar_paralelo = bool(
+        len(capacitaciones) > 1
+        and config.get('PDF_PARALELO', (os.cpu_count() or 1) > 1)
+        and paralelo_disponible()
+    )
+
+    clave = calcular_clave(
+        VERSION_FORMATO,
+        usar_paralelo,
+        fecha_obj,
+        sorted(resumen),
+        [c.to_dict() for c in capacitaciones],
+        sorted(
+            (c.configuracion_id, c.id, c.nombre_completo, c.firma_digital)
+            for c in capacitadores.values()
+        )
+    )
+
+    cache = obtener_cache(config)
+    ruta_cache = cache.obtener(clave)
+    if ruta_cache:
+        logger.info("✅ PDF servido desde caché: %s", ruta_cache)
+        progreso(100, 'PDF tomado del caché')
+        return ArchivoReporte(ruta_cache, nombre_archivo, MIMETYPES['pdf'])
+
+    asistentes = Asistente.query.filter(
+        Asistente.fecha_registro == fecha_obj,
+        Asistente.configuracion_id.in_(capacitaciones_ids)
+    ).order_by(Asistente.hora_llegada).all()
+
+    # ✅ Esperar las firmas de estas capacitaciones que aún se están escribiendo
+    progreso(20, 'Esperando firmas pendientes')
+    rutas_firmas = [a.firma_digital for a in asistentes if a.firma_digital]
+    rutas_firmas += [c.firma_digital for c in capacitadores.values() if c.firma_digital]
+    firmas_completas = obtener_procesador(config).esperar(rutas_firmas, timeout=30)
+    if not firmas_completas:
+        logger.warning("⚠️ Algunas firmas siguen pendientes; el PDF puede salir sin ellas")
+
+    secciones = []
+    for capacitacion in capacitaciones:
+        asistentes_capacitacion = [a for a in asistentes if a.configuracion_id == capacitacion.id]
+        if asistentes_capacitacion:
+            secciones.append((capacitacion, capacitadores.get(capacitacion.id), asistentes_capacitacion))
+
+    static_dir = os.path.join(root_path, 'static')
+
+    # ✅ Firmas reducidas al tamaño de la celda (se generan una sola vez)
+    progreso(40, 'Preparando firmas')
+    inicio_construccion = time.perf_counter()
+    firmas = [(a.firma_digital, 'asistente') for a in asistentes if a.firma_digital]
+    firmas += [(c.firma_digital, 'capacitador') for c in capacitadores.values() if c.firma_digital]
+    miniaturas, faltantes = obtener_miniaturas(firmas, obtener_almacenamiento(config, static_dir))
+    if faltantes:
+        # esperar() solo ve la cola de este proceso: otro worker o nodo aún escribe estas
+        logger.warning("⚠️ %s firmas aún no están en el almacén; el PDF no se guarda en caché", len(faltantes))
+        firmas_completas = False
+
+    progreso(60, 'Construyendo PDF')
+    temp_path = cache.archivo_temporal()
+    try:
+        if usar_paralelo:
+            construir_pdf_paralelo(
+                temp_path, secciones, fecha_obj, static_dir, miniaturas,
+                procesos=config.get('PDF_PROCESOS'),
+                avance=lambda terminadas, total: progreso(
+                    60 + 35 * terminadas // total, f'Construyendo PDF ({terminadas}/{total} capacitaciones)'
+                )
+            )
+        else:
+            construir_pdf(temp_path, secciones, fecha_obj, static_dir, miniaturas)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    registrar_pdf(time.perf_counter() - inicio_construccion, len(asistentes))
+    progreso(100, 'PDF generado')
+
+    if firmas_completas:
+        ruta_pdf = cache.guardar(clave, temp_path)
+        logger.info("✅ PDF generado exitosamente: %s", ruta_pdf)
+        return ArchivoReporte(ruta_pdf, nombre_archivo, MIMETYPES['pdf'])
+
+    # Sin todas las firmas no se guarda en caché
+    return ArchivoReporte(temp_path, nombre_archivo, MIMETYPES['pdf'], temporal=True)
+
+
+def generar_exportacion(formato, condiciones, destino, config, sufijo, progreso=_sin_progreso):
+    """Escribe la exportación CSV/XLSX en `destino` y retorna el ArchivoReporte"""
+    if formato == 'xlsx' and not xlsx_disponible():
+        raise ReporteError('La exportación a XLSX requiere openpyxl', 501)
+
+    tamano_lote = config.get('EXPORTACION_TAMANO_LOTE', TAMANO_LOTE_POR_DEFECTO)
+    total = db.session.query(db.func.count(Asistente.id)).filter(*condiciones).scalar() or 0
+
+    def filas_con_progreso():
+        for i, fila in enumerate(consultar_filas(condiciones, tamano_lote), 1):
+            if i % tamano_lote == 0 and total:
+                progreso(min(95, int(i * 95 / total)), f'{i} de {total} filas')
+            yield fila
+
+    with open(destino, 'wb') as archivo:
+        if formato == 'csv':
+            for bloque in generar_csv(filas_con_progreso(), tamano_lote):
+                archivo.write(bloque.encode('utf-8'))
+        else:
+            for bloque in generar_xlsx(filas_con_progreso()):
+                archivo.write(bloque)
+
+    progreso(100, f'{total} filas exportadas')
+    return ArchivoReporte(destino, f"asistentes_{sufijo}.{formato}", MIMETYPES[formato])
+
+
+# ======== Trabajos en segundo plano ========
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _obtener_executor(config):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.get('REPORTES_CONCURRENCIA', CONCURRENCIA_POR_DEFECTO),
+                thread_name_prefix='reportes'
+            )
+        return _executor
+
+
+def directorio_reportes(config, root_path):
+    directorio = config.get('REPORTES_DIR') or os.path.join(root_path, 'database', 'reportes')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _ahora():
+    # Las columnas DateTime se guardan sin zona horaria
+    return now_colombia().replace(tzinfo=None)
+
+
+def _actualizar(trabajo_id, **campos):
+    """
+    Actualiza el trabajo en una sesión aparte, para no expirar los objetos
+    que la generación del reporte tiene cargados en db.session. Con SQLite
+    pasa por el escritor único, como los registros.
+    """
+    campos['updated_at'] = _ahora()
+    escribir(
+        lambda sesion: sesion.query(TrabajoReporte).filter_by(id=trabajo_id).update(campos),
+        sesion_aparte=True
+    )
+
+
+def _limpiar_antiguos(config):
+    """Borra los trabajos (y sus archivos) más viejos que la retención"""
+    horas = config.get('REPORTES_RETENCION_HORAS', RETENCION_HORAS_POR_DEFECTO)
+    limite = _ahora() - timedelta(hours=horas)
+    antiguos = TrabajoReporte.query.filter(TrabajoReporte.created_at < limite).all()
+    for trabajo in antiguos:
+        if trabajo.ruta_archivo and os.path.exists(trabajo.ruta_archivo):
+            try:
+                os.remove(trabajo.ruta_archivo)
+            except OSError:
+                pass
+        db.session.delete(trabajo)
+    if antiguos:
+        db.session.commit()
+
+
+def crear_trabajo(app, tipo, parametros, admin_id=None):
+    """
+    Registra un trabajo y lo envía al pool. Lanza ReporteError si el tipo no
+    es válido o si ya hay demasiados trabajos esperando.
+    """
+    if tipo not in TIPOS:
+        raise ReporteError(f'Tipo de reporte no soportado. Use {", ".join(TIPOS)}')
+
+    _limpiar_antiguos(app.config)
+
+    en_espera = TrabajoReporte.query.filter(
+        TrabajoReporte.estado.in_(('pendiente', 'en_proceso'))
+    ).count()
+    if en_espera >= app.config.get('REPORTES_COLA_MAXIMA', COLA_MAXIMA_POR_DEFECTO):
+        raise ReporteError('Hay demasiados reportes en proceso, intente en unos minutos', 429)
+
+    trabajo = TrabajoReporte(
+        id=uuid.uuid4().hex,
+        tipo=tipo,
+        parametros=json.dumps(parametros),
+        estado='pendiente',
+        progreso=0,
+        mensaje='En cola',
+        admin_id=admin_id
+    )
+    db.session.add(trabajo)
+    db.session.commit()
+
+    _obtener_executor(app.config).submit(_ejecutar, app, trabajo.id)
+    return trabajo
+
+
+def marcar_interrumpido(trabajo):
+    """Si el trabajo dejó de actualizarse (p. ej. reinicio del servidor), marcarlo como error"""
+    if trabajo.estado not in ('pendiente', 'en_proceso') or not trabajo.updated_at:
+        return trabajo
+
+    if _ahora() - trabajo.updated_at > timedelta(minutes=MINUTOS_SIN_ACTUALIZAR):
+        trabajo.estado = 'error'
+        trabajo.mensaje = 'El trabajo se interrumpió (reinicio del servidor). Vuelva a solicitarlo.'
+        trabajo.finished_at = _ahora()
+        db.session.commit()
+
+    return trabajo
+
+
+def _latir(app, trabajo_id, terminado):
+    """Actualiza updated_at cada LATIDO_SEGUNDOS hasta que el trabajo termine"""
+    with app.app_context():
+        while not terminado.wait(LATIDO_SEGUNDOS):
+            try:
+                _actualizar(trabajo_id)
+            except Exception as e:
+                logger.warning("⚠️ No se pudo actualizar el latido del reporte %s: %s", trabajo_id, e)
+
+
+def _ejecutar(app, trabajo_id):
+    with app.app_context():
+        trabajo = db.session.get(TrabajoReporte, trabajo_id)
+        if trabajo is None:
+            return
+
+        tipo = trabajo.tipo
+        parametros = json.loads(trabajo.parametros or '{}')
+        _actualizar(trabajo_id, estado='en_proceso', progreso=1, mensaje='Iniciando')
+
+        def progreso(porcentaje, mensaje):
+            _actualizar(trabajo_id, progreso=porcentaje, mensaje=mensaje)
+
+        # ✅ Latido: un trabajo largo no se confunde con uno interrumpido
+        terminado = threading.Event()
+        threading.Thread(
+            target=_latir, args=(app, trabajo_id, terminado), name=f'latido-{trabajo_id[:8]}', daemon=True
+        ).start()
+
+        directorio = directorio_reportes(app.config, app.root_path)
+        try:
+            if tipo == 'pdf':
+                fecha_obj = datetime.strptime(parametros['fecha'], '%Y-%m-%d').date()
+                archivo = generar_pdf_lista(
+                    fecha_obj, parametros.get('capacitacion_id'), app.config, app.root_path, progreso
+                )
+                destino = os.path.join(directorio, f"{trabajo_id}.pdf")
+                if archivo.temporal:
+                    shutil.move(archivo.ruta, destino)
+                else:
+                    # Copia propia: el caché de PDF puede desalojar su archivo
+                    shutil.copyfile(archivo.ruta, destino)
+                archivo.ruta = destino
+            else:
+                from src.routes.admin import construir_filtros_asistentes
+                condiciones = construir_filtros_asistentes(parametros)
+                sufijo = parametros.get('fecha') or _ahora().strftime('%Y-%m-%d')
+                archivo = generar_exportacion(
+                    tipo, condiciones, os.path.join(directorio, f"{trabajo_id}.{tipo}"),
+                    app.config, sufijo, progreso
+                )
+
+            _actualizar(
+                trabajo_id,
+                estado='completado',
+                progreso=100,
+                mensaje='Reporte listo',
+                ruta_archivo=archivo.ruta,
+                nombre_archivo=archivo.nombre,
+                mimetype=archivo.mimetype,
+                finished_at=_ahora()
+            )
+            logger.info("✅ Reporte %s (%s) completado", trabajo_id, tipo)
+
+        except ReporteError as e:
+            _actualizar(trabajo_id, estado='error', mensaje=e.mensaje, finished_at=_ahora())
+        except Exception as e:
+            logger.exception("❌ Error en reporte %s: %s", trabajo_id, e)
+            _actualizar(trabajo_id, estado='error', mensaje=str(e)[:500], finished_at=_ahora())
+        finally:
+            terminado.set()
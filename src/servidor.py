@@ -0,0 +1,214 @@
+"""
+Servidor de producción (gunicorn) con workers, hilos y timeouts calculados.
+
+`python src/main.py` levanta el servidor de desarrollo de Werkzeug. En
+producción se usa este módulo:
+
+    python -m src.servidor                  # escucha en 0.0.0.0:$PORT
+    python -m src.servidor --perfil         # solo muestra el cálculo
+
+Cada worker tiene su propio pool de SQLAlchemy (pool_size + max_overflow de
+SQLALCHEMY_ENGINE_OPTIONS), así que el número de workers se limita para que
+workers × (pool_size + max_overflow) no supere DB_MAX_CONEXIONES, y cada
+worker gthread tiene tantos hilos como conexiones puede abrir su pool: un
+hilo nunca espera una conexión que el pool no puede dar. Con el pool por
+defecto (10 + 20) y 50 conexiones queda un solo worker; para repartir en
+más núcleos se baja DB_POOL_SIZE / DB_MAX_OVERFLOW (p. ej. 5 + 5 -> 5
+workers de 10 hilos).
+
+Los streams SSE (/api/estado/stream, /admin/asistentes/stream) ocupan un
+hilo gthread mientras el cliente está conectado (hasta 300 s, sin retener
+conexión a la base). Por eso cada worker gthread suma, a los hilos del
+pool, su parte de GUNICORN_STREAMS (formularios abiertos a la vez, 300 por
+defecto): un registro no espera detrás de un stream. Con muchos más
+formularios conviene GUNICORN_CLASE=gevent, donde cada stream es una
+corrutina; con PostgreSQL requiere psycogreen para que psycopg2 no bloquee
+el worker.
+
+Con SQLite hay un solo worker: el escritor de registros
+(services/escritor_sqlite) es único dentro de un proceso, y varios
+procesos volverían a competir por el bloqueo del archivo.
+
+Variables de entorno (todas opcionales): PORT, GUNICORN_CLASE (gthread |
+gevent), GUNICORN_WORKERS, GUNICORN_THREADS, GUNICORN_CONEXIONES,
+GUNICORN_TIMEOUT, GUNICORN_STREAMS, DB_MAX_CONEXIONES, PROMETHEUS_MULTIPROC_DIR (carpeta de
+las métricas compartidas entre workers; por defecto una temporal).
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+APP_POR_DEFECTO = 'src.main:create_app()'
+CLASES = ('gthread', 'gevent')
+# Valores por defecto de SQLAlchemy para QueuePool (SQLite en archivo)
+POOL_SIZE_POR_DEFECTO = 5
+MAX_OVERFLOW_POR_DEFECTO = 10
+# Conexiones que la app puede abrir en total (Supabase: 60, menos margen)
+MAX_CONEXIONES_BD_POR_DEFECTO = 50
+# /admin/generar-pdf sigue siendo síncrono y puede tardar con días grandes
+TIMEOUT_POR_DEFECTO = 120
+CONEXIONES_GEVENT_POR_DEFECTO = 1000
+# Streams SSE abiertos a la vez (un formulario o página del capacitador cada uno)
+STREAMS_POR_DEFECTO = 300
+
+# Con `python -m src.servidor` __name__ es '__main__': el nombre fijo cuelga
+# del logger 'src', que la bitácora de create_app ya configuró
+logger = logging.getLogger('src.servidor')
+
+
+def _entero(nombre, por_defecto=None):
+    valor = os.environ.get(nombre)
+    return int(valor) if valor not in (None, '') else por_defecto
+
+
+def calcular_perfil(cpus, pool_size, max_overflow, motor, clase='gthread',
+                    max_conexiones_bd=MAX_CONEXIONES_BD_POR_DEFECTO,
+                    workers=None, threads=None, conexiones=None, timeout=TIMEOUT_POR_DEFECTO,
+                    streams=STREAMS_POR_DEFECTO):
+    """
+    Configuración de gunicorn para `cpus` núcleos y el pool de cada worker.
+    - streams: streams SSE abiertos a la vez en total (hilos extra en gthread)
+    Los valores explícitos (workers, threads, conexiones) tienen prioridad.
+    """
+    if clase not in CLASES:
+        raise ValueError(f'Clase de worker desconocida: {clase}. Use {", ".join(CLASES)}')
+
+    conexiones_por_worker = pool_size + max_overflow
+
+    if workers is None:
+        # gthread: 2 × núcleos + 1; gevent: uno por núcleo (la concurrencia la dan las corrutinas)
+        workers = 2 * cpus + 1 if clase == 'gthread' else cpus
+        if motor != 'sqlite':
+            workers = min(workers, max(1, max_conexiones_bd // conexiones_por_worker))
+    # SQLite: un proceso, un escritor (aunque se pida más de un worker)
+    workers = 1 if motor == 'sqlite' else max(1, workers)
+
+    perfil = {
+        'worker_class': clase,
+        'workers': workers,
+        'timeout': timeout,
+        'graceful_timeout': 30,
+        'keepalive': 5,
+        # Reciclar workers de vez en cuando (memoria de Pillow/ReportLab)
+        'max_requests': 2000,
+        'max_requests_jitter': 200,
+    }
+
+    if clase == 'gthread':
+        # Hilos del pool más los que retienen los streams SSE de este worker
+        streams_por_worker = -(-streams // workers)
+        perfil['threads'] = max(1, threads if threads is not None else conexiones_por_worker + streams_por_worker)
+    else:
+        perfil['worker_connections'] = conexiones or CONEXIONES_GEVENT_POR_DEFECTO
+
+    perfil['conexiones_bd_maximas'] = workers * conexiones_por_worker
+    return perfil
+
+
+def _pool_de_la_app(app):
+    opciones = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    motor = app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0].split('+', 1)[0]
+    return (
+        opciones.get('pool_size', POOL_SIZE_POR_DEFECTO),
+        opciones.get('max_overflow', MAX_OVERFLOW_POR_DEFECTO),
+        motor,
+    )
+
+
+def perfil_desde_entorno(app, clase=None):
+    """Calcula el perfil con los núcleos de la máquina y el pool configurado en la app"""
+    pool_size, max_overflow, motor = _pool_de_la_app(app)
+    return calcular_perfil(
+        cpus=os.cpu_count() or 1,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        motor=motor,
+        clase=clase or os.environ.get('GUNICORN_CLASE', 'gthread'),
+        max_conexiones_bd=_entero('DB_MAX_CONEXIONES', MAX_CONEXIONES_BD_POR_DEFECTO),
+        workers=_entero('GUNICORN_WORKERS'),
+        threads=_entero('GUNICORN_THREADS'),
+        conexiones=_entero('GUNICORN_CONEXIONES'),
+        timeout=_entero('GUNICORN_TIMEOUT', TIMEOUT_POR_DEFECTO),
+        streams=_entero('GUNICORN_STREAMS', STREAMS_POR_DEFECTO),
+    )
+
+
+def preparar_metricas_multiproceso():
+    """
+    Define PROMETHEUS_MULTIPROC_DIR (antes de importar la app) y borra los
+    archivos de una ejecución anterior, para que /metrics sume los workers.
+    """
+    carpeta = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not carpeta:
+        carpeta = os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='metricas_')
+    os.makedirs(carpeta, exist_ok=True)
+    for archivo in glob.glob(os.path.join(carpeta, '*.db')):
+        os.remove(archivo)
+    return carpeta
+
+
+def _child_exit(server, worker):
+    # Los gauges 'livesum' dejan de contar al worker que terminó
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def _post_fork_gevent(server, worker):
+    # psycopg2 bloquea el hilo en cada consulta; psycogreen lo vuelve cooperativo
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        logger.warning("⚠️ psycogreen no está instalado: con PostgreSQL las consultas bloquean el worker gevent")
+        return
+    patch_psycopg()
+
+
+def crear_servidor(app_spec, bind, perfil):
+    """Aplicación gunicorn con el perfil calculado (import diferido de gunicorn)"""
+    from gunicorn.app.base import BaseApplication
+    from gunicorn.util import import_app
+
+    class Servidor(BaseApplication):
+        def load_config(self):
+            opciones = {k: v for k, v in perfil.items() if k != 'conexiones_bd_maximas'}
+            opciones['bind'] = bind
+            opciones['child_exit'] = _child_exit
+            if perfil['worker_class'] == 'gevent':
+                opciones['post_fork'] = _post_fork_gevent
+            for clave, valor in opciones.items():
+                self.cfg.set(clave, valor)
+
+        def load(self):
+            # Cada worker construye su propia app (create_app no abre conexiones)
+            return import_app(app_spec)
+
+    return Servidor()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor de producción (gunicorn)')
+    parser.add_argument('--app', default=APP_POR_DEFECTO, help='Módulo:fábrica de la app')
+    parser.add_argument('--bind', default=f"0.0.0.0:{os.environ.get('PORT', 5001)}")
+    parser.add_argument('--clase', choices=CLASES, default=None, help='Tipo de worker')
+    parser.add_argument('--perfil', action='store_true', help='Mostrar la configuración calculada y salir')
+    args = parser.parse_args()
+
+    preparar_metricas_multiproceso()
+    from gunicorn.util import import_app
+    perfil = perfil_desde_entorno(import_app(args.app), clase=args.clase)
+
+    logger.info("🚀 gunicorn %s: %s", perfil['worker_class'], json.dumps(perfil))
+    if args.perfil:
+        return
+
+    crear_servidor(args.app, args.bind, perfil).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,11 @@ let adminState = {
     adminData: null,
     currentTab: 'dashboard',
     asistentesData: [],
+    asistentesFiltros: {},
+    asistentesCursor: null,
     configData: null,
-    dashboardData: null
+    dashboardData: null,
+    asistentesStream: null
 };
 
 // ✅ FUNCIÓN ACTUALIZADA - Ahora acepta fecha
@@ -91,6 +94,7 @@ const adminElements = {
     get filtroCargoAsistente() { return getElement('filtroCargoAsistente'); },
     get filtroRutaAsistente() { return getElement('filtroRutaAsistente'); },
     get tablaAsistentes() { return getElement('tablaAsistentes'); },
+    get cargarMasAsistentes() { return getElement('cargarMasAsistentes'); },
 
     // Configuración
     get configForm() { return getElement('configForm'); },
@@ -317,10 +321,18 @@ const adminUI = {
         }
     },
 
-    updateAsistentesTable: (data) => {
+    // ✅ append = true agrega la siguiente página en lugar de reemplazar la tabla
+    updateAsistentesTable: (data, append = false) => {
         if (!adminElements.tablaAsistentes) return;
 
-        if (!data.asistentes || data.asistentes.length === 0) {
+        adminState.asistentesCursor = data.paginacion ? data.paginacion.siguiente_cursor : null;
+        if (adminElements.cargarMasAsistentes) {
+            adminElements.cargarMasAsistentes.classList.toggle('d-none', !adminState.asistentesCursor);
+        }
+
+        const offset = append ? adminElements.tablaAsistentes.querySelectorAll('tr[data-asistente]').length : 0;
+
+        if (!append && (!data.asistentes || data.asistentes.length === 0)) {
             adminElements.tablaAsistentes.innerHTML = `
             <tr>
                 <td colspan="9" class="text-center">No hay asistentes registrados</td>
@@ -336,8 +348,8 @@ const adminUI = {
                 'Sin capacitación';
 
             html += `
-            <tr>
-                <td>${index + 1}</td>
+            <tr data-asistente="${asistente.id}">
+                <td>${offset + index + 1}</td>
                 <td>${asistente.nombres_apellidos}</td>
                 <td>${asistente.tipodocumento}</td>
                 <td>${asistente.numero_documento}</td>
@@ -357,13 +369,20 @@ const adminUI = {
         `;
         });
 
-        adminElements.tablaAsistentes.innerHTML = html;
-        adminUI.updateFilters(data);
+        if (append) {
+            adminElements.tablaAsistentes.insertAdjacentHTML('beforeend', html);
+        } else {
+            adminElements.tablaAsistentes.innerHTML = html;
+            adminUI.updateFilters(data);
+        }
     },
 
     updateFilters: (data) => {
+        // ✅ Cargos y rutas vienen calculados por el servidor para todos los registros filtrados
+        const estadisticas = data.estadisticas || {};
+
         if (adminElements.filtroCargoAsistente) {
-            const cargos = [...new Set(data.asistentes.map(a => a.cargo))];
+            const cargos = estadisticas.cargos || [];
             adminElements.filtroCargoAsistente.innerHTML = '<option value="">Todos los cargos</option>';
             cargos.forEach(cargo => {
                 adminElements.filtroCargoAsistente.innerHTML += `<option value="${cargo}">${cargo}</option>`;
@@ -371,7 +390,7 @@ const adminUI = {
         }
 
         if (adminElements.filtroRutaAsistente) {
-            const rutas = [...new Set(data.asistentes.map(a => a.ruta))];
+            const rutas = estadisticas.rutas || [];
             adminElements.filtroRutaAsistente.innerHTML = '<option value="">Todas las rutas</option>';
             rutas.forEach(ruta => {
                 adminElements.filtroRutaAsistente.innerHTML += `<option value="${ruta}">${ruta}</option>`;
@@ -544,6 +563,7 @@ const adminEventHandlers = {
 window.logout = async () => {
     try {
         await adminApi.logout();
+        adminApp.unsubscribeFromAsistentes();
         adminState.isAuthenticated = false;
         adminState.adminData = null;
         adminUI.showLoginSection();
@@ -569,6 +589,7 @@ window.filtrarAsistentes = async () => {
 
     try {
         adminUtils.showLoading();
+        adminState.asistentesFiltros = filtros;
         const data = await adminApi.obtenerAsistentes(filtros);
         adminUI.updateAsistentesTable(data);
         adminUtils.hideLoading();
@@ -578,6 +599,44 @@ window.filtrarAsistentes = async () => {
     }
 };
 
+// ✅ Siguiente página del listado (paginación por cursor)
+window.cargarMasAsistentes = async () => {
+    if (!adminState.asistentesCursor) return;
+
+    try {
+        adminUtils.showLoading();
+        const data = await adminApi.obtenerAsistentes({
+            ...adminState.asistentesFiltros,
+            cursor: adminState.asistentesCursor
+        });
+        adminUI.updateAsistentesTable(data, true);
+        adminUtils.hideLoading();
+    } catch (error) {
+        adminUtils.hideLoading();
+        adminUtils.showNotification(error.message, 'danger');
+    }
+};
+
+// ✅ Consultar el estado de un reporte encolado hasta que termine
+const esperarReporte = async (trabajoId, intervalo = 1000) => {
+    while (true) {
+        const response = await fetch(`/admin/reportes/${trabajoId}`);
+        const trabajo = await response.json();
+
+        if (!response.ok) {
+            throw new Error(trabajo.error || 'Error al consultar el reporte');
+        }
+        if (trabajo.estado === 'completado') {
+            return trabajo;
+        }
+        if (trabajo.estado === 'error') {
+            throw new Error(trabajo.mensaje || 'Error al generar el reporte');
+        }
+
+        await new Promise(resolve => setTimeout(resolve, intervalo));
+    }
+};
+
 window.generarPDF = async () => {
     const fecha = adminElements.fechaFiltro?.value;
     const capacitacionId = document.getElementById('filtroCapacitacion')?.value;  // ✅ Obtener capacitación
@@ -590,36 +649,31 @@ window.generarPDF = async () => {
     try {
         adminUtils.showLoading();
 
-        // ✅ Construir URL con parámetros
-        let url = `/admin/generar-pdf?fecha=${fecha}`;
+        // ✅ El PDF se genera en segundo plano; aquí solo se encola
+        const parametros = { tipo: 'pdf', fecha };
         if (capacitacionId) {
-            url += `&capacitacion_id=${capacitacionId}`;
+            parametros.capacitacion_id = capacitacionId;
         }
 
-        // ✅ Hacer fetch con los parámetros
-        const response = await fetch(url);
+        const response = await fetch('/admin/reportes', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(parametros)
+        });
+        const data = await response.json();
 
         if (!response.ok) {
-            const errorData = await response.json();
-            throw new Error(errorData.error || 'Error al generar PDF');
+            throw new Error(data.error || 'Error al generar PDF');
         }
 
-        const blob = await response.blob();
-        const urlBlob = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = urlBlob;
-
-        // ✅ Nombre personalizado según filtro
-        let nombreArchivo = `lista_asistencia_${fecha}`;
-        if (capacitacionId && adminState.capacitacionesData[capacitacionId]) {
-            const nombreCap = adminState.capacitacionesData[capacitacionId].replace(/\s/g, '_');
-            nombreArchivo = `lista_${nombreCap}_${fecha}`;
-        }
-        a.download = `${nombreArchivo}.pdf`;
+        const trabajo = await esperarReporte(data.trabajo.id);
 
+        // ✅ Descarga directa del archivo terminado (sin pasar por un blob en memoria)
+        const a = document.createElement('a');
+        a.href = `/admin/reportes/${trabajo.id}/archivo`;
+        a.download = trabajo.nombre_archivo || `lista_asistencia_${fecha}.pdf`;
         document.body.appendChild(a);
         a.click();
-        window.URL.revokeObjectURL(urlBlob);
         document.body.removeChild(a);
 
         adminUtils.hideLoading();
@@ -631,6 +685,20 @@ window.generarPDF = async () => {
     }
 };
 
+// ✅ Exportar con los filtros actuales; el navegador descarga el archivo a medida que llega
+window.exportarAsistentes = (formato = 'csv') => {
+    const filtros = {
+        formato,
+        fecha: adminElements.fechaFiltro?.value || '',
+        capacitacion_id: document.getElementById('filtroCapacitacion')?.value || '',
+        busqueda: adminElements.busquedaAsistente?.value || '',
+        cargo: adminElements.filtroCargoAsistente?.value || '',
+        ruta: adminElements.filtroRutaAsistente?.value || ''
+    };
+
+    window.location.href = `/admin/exportar?${new URLSearchParams(filtros)}`;
+};
+
 // Aplicación principal de admin
 const adminApp = {
     loadInitialData: async () => {
@@ -640,6 +708,7 @@ const adminApp = {
             await adminApp.loadDashboard();
             await adminApp.loadAsistentes();
             await adminApp.loadConfiguration();
+            adminApp.subscribeToAsistentes();
         } catch (error) {
             console.error('Error al cargar datos iniciales:', error);
             adminUtils.showNotification('Error al cargar algunos datos', 'warning');
@@ -663,6 +732,7 @@ const adminApp = {
                 adminElements.fechaFiltro.value = fecha;
             }
 
+            adminState.asistentesFiltros = { fecha };
             const data = await adminApi.obtenerAsistentes({ fecha });
             adminState.asistentesData = data;
             adminUI.updateAsistentesTable(data);
@@ -671,6 +741,67 @@ const adminApp = {
         }
     },
 
+    // ✅ Llegadas en vivo: el servidor envía solo los asistentes nuevos y los
+    // contadores del día; el navegador reconecta solo con el último id recibido
+    subscribeToAsistentes: () => {
+        if (!window.EventSource || adminState.asistentesStream) return;
+
+        const source = new EventSource('/admin/asistentes/stream');
+        adminState.asistentesStream = source;
+
+        source.addEventListener('asistentes', (event) => {
+            const data = JSON.parse(event.data);
+            adminApp.applyAsistentesDelta(data);
+        });
+
+        source.onerror = () => {
+            // Sesión vencida o servidor caído: dejar de reintentar
+            if (source.readyState === EventSource.CLOSED) {
+                adminApp.unsubscribeFromAsistentes();
+            }
+        };
+    },
+
+    unsubscribeFromAsistentes: () => {
+        if (adminState.asistentesStream) {
+            adminState.asistentesStream.close();
+            adminState.asistentesStream = null;
+        }
+    },
+
+    applyAsistentesDelta: (data) => {
+        // Contadores del dashboard (el estado del sistema se conserva)
+        adminState.dashboardData = {
+            ...(adminState.dashboardData || {}),
+            asistentes_hoy: data.contadores.total,
+            por_cargo: data.contadores.por_cargo,
+            por_ruta: data.contadores.por_ruta
+        };
+        adminUI.updateDashboardStats(adminState.dashboardData);
+
+        if (!data.asistentes.length) return;
+
+        // Solo se agregan filas si la tabla muestra el día completo, sin
+        // búsqueda y con la última página ya cargada
+        const filtros = adminState.asistentesFiltros || {};
+        if (filtros.fecha !== data.fecha || filtros.busqueda || filtros.cargo || filtros.ruta) return;
+        if (adminState.asistentesCursor) return;
+
+        // Al reconectar el servidor reenvía los últimos registros: omitir los que ya están
+        const nuevos = data.asistentes.filter(asistente =>
+            (!filtros.capacitacion_id || String(asistente.configuracion_id) === String(filtros.capacitacion_id)) &&
+            !(adminElements.tablaAsistentes &&
+              adminElements.tablaAsistentes.querySelector(`tr[data-asistente="${asistente.id}"]`))
+        );
+        if (!nuevos.length || !adminElements.tablaAsistentes) return;
+
+        // Quitar la fila de "No hay asistentes registrados"
+        if (!adminElements.tablaAsistentes.querySelector('tr[data-asistente]')) {
+            adminElements.tablaAsistentes.innerHTML = '';
+        }
+        adminUI.updateAsistentesTable({ asistentes: nuevos }, true);
+    },
+
     loadConfiguration: async () => {
         try {
             const config = await adminApi.obtenerConfiguracion();
@@ -709,9 +840,12 @@ const adminApp = {
         document.querySelectorAll('[data-bs-toggle="tab"]').forEach(tab => {
             tab.addEventListener('shown.bs.tab', (e) => {
                 const target = e.target.getAttribute('data-bs-target');
-                if (target === '#asistentes') {
+                // Con el stream conectado la tabla y los contadores ya están al día
+                const enVivo = adminState.asistentesStream &&
+                    adminState.asistentesStream.readyState === EventSource.OPEN;
+                if (target === '#asistentes' && !enVivo) {
                     adminApp.loadAsistentes();
-                } else if (target === '#dashboard') {
+                } else if (target === '#dashboard' && !enVivo) {
                     adminApp.loadDashboard();
                 }
             });
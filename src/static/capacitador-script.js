@@ -2,7 +2,8 @@
 let appState = {
     systemStatus: null,
     configuration: null,
-    isLoading: false
+    isLoading: false,
+    pollingTimer: null
 };
 
 // Elementos del DOM
@@ -258,10 +259,67 @@ const app = {
         });
     },
     
+    // Aplica una actualización de estado recibida por SSE o por polling
+    applyStatusUpdate: (statusData) => {
+        const configId = statusData.configuracion ? statusData.configuracion.id : null;
+        const configActualId = appState.configuration ? appState.configuration.id : null;
+        
+        if (statusData.disponible === appState.systemStatus && configId === configActualId) return;
+        
+        appState.systemStatus = statusData.disponible;
+        appState.configuration = statusData.configuracion;
+        if (statusData.configuracion) ui.updateCompanyInfo(statusData.configuracion);
+        ui.updateSystemStatus(statusData.disponible, statusData.mensaje);
+    },
+    
+    // Verificación periódica (cada 30 segundos) - respaldo si no hay SSE
+    startStatusPolling: () => {
+        if (appState.pollingTimer) return;
+        
+        appState.pollingTimer = setInterval(async () => {
+            if (appState.isLoading) return;
+            try {
+                app.applyStatusUpdate(await api.getSystemStatus());
+            } catch (error) {
+                console.error('Error en verificación periódica:', error);
+            }
+        }, 30000);
+    },
+    
+    // Suscripción al canal SSE: el servidor avisa solo cuando cambia el estado
+    subscribeToStatus: () => {
+        if (!window.EventSource) {
+            app.startStatusPolling();
+            return;
+        }
+        
+        const source = new EventSource('/api/estado/stream');
+        let erroresSeguidos = 0;
+        
+        source.addEventListener('estado', (event) => {
+            erroresSeguidos = 0;
+            try {
+                app.applyStatusUpdate(JSON.parse(event.data));
+            } catch (error) {
+                console.error('Error al procesar evento de estado:', error);
+            }
+        });
+        
+        source.onerror = () => {
+            erroresSeguidos += 1;
+            if (source.readyState === EventSource.CLOSED || erroresSeguidos >= 3) {
+                console.warn('SSE no disponible, usando verificación periódica');
+                source.close();
+                app.startStatusPolling();
+            }
+        };
+    },
+    
     init: () => {
         console.log('Inicializando formulario de capacitador...');
         app.setupEventListeners();
         app.loadInitialState();
+        app.subscribeToStatus();
         
         // Inicializar canvas de firma
         if (elements.signatureCanvas) {
@@ -2,7 +2,8 @@
 let appState = {
     systemStatus: null,
     configuration: null,
-    isLoading: false
+    isLoading: false,
+    pollingTimer: null
 };
 
 // Elementos del DOM
@@ -73,6 +74,12 @@ const utils = {
         return timeString.substring(0, 5);
     },
 
+    // Clave de idempotencia del registro (el servidor ignora los reenvíos)
+    generateKey: () => {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}-${Math.random().toString(16).slice(2)}`;
+    },
+
     showNotification: (message, type = 'info') => {
         elements.systemAlert.className = `alert alert-${type} fade-in`;
         elements.systemMessage.textContent = message;
@@ -109,11 +116,28 @@ const api = {
         return await response.json();
     },
 
-    registerAttendance: async (formData) => {
-        const response = await fetch('/api/registrar', {
-            method: 'POST',
-            body: formData
-        });
+    // Empleado de la nómina (null si el documento no está)
+    getEmployee: async (documento) => {
+        const response = await fetch(`/api/empleado/${encodeURIComponent(documento)}`);
+        if (response.status === 404) return null;
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        return await response.json();
+    },
+
+    // La misma clave en un reintento devuelve la respuesta original
+    // Sin respuesta del servidor el error lleva sinConexion = true
+    registerAttendance: async (formData, idempotencyKey = utils.generateKey()) => {
+        let response;
+        try {
+            response = await fetch('/api/registrar', {
+                method: 'POST',
+                headers: { 'Idempotency-Key': idempotencyKey },
+                body: formData
+            });
+        } catch (error) {
+            error.sinConexion = true;
+            throw error;
+        }
 
         const data = await response.json();
         if (!response.ok) throw new Error(data.error || `HTTP error! status: ${response.status}`);
@@ -121,6 +145,121 @@ const api = {
     }
 };
 
+// ✅ Cola local de registros (IndexedDB): si se cae la red, el registro y su
+// firma quedan en el dispositivo y se suben en lote al volver la conexión
+const offlineQueue = {
+    DB_NAME: 'registro_asistencia',
+    STORE: 'registros_pendientes',
+    LOTE: 50,
+    db: null,
+    memoria: [],
+    sincronizando: null,
+
+    open: () => {
+        if (offlineQueue.db) return Promise.resolve(offlineQueue.db);
+        if (!window.indexedDB) return Promise.resolve(null);
+
+        return new Promise((resolve) => {
+            const request = indexedDB.open(offlineQueue.DB_NAME, 1);
+            request.onupgradeneeded = () => {
+                request.result.createObjectStore(offlineQueue.STORE, { keyPath: 'clave' });
+            };
+            request.onsuccess = () => {
+                offlineQueue.db = request.result;
+                resolve(offlineQueue.db);
+            };
+            request.onerror = () => {
+                console.warn('⚠️ IndexedDB no disponible, la cola queda solo en memoria');
+                resolve(null);
+            };
+        });
+    },
+
+    // Ejecuta una operación sobre el store y resuelve con su resultado
+    store: async (modo, operacion) => {
+        const db = await offlineQueue.open();
+        if (!db) return null;
+
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(offlineQueue.STORE, modo);
+            const request = operacion(tx.objectStore(offlineQueue.STORE));
+            tx.oncomplete = () => resolve(request ? request.result : null);
+            tx.onerror = () => reject(tx.error);
+        });
+    },
+
+    add: async (registro) => {
+        const db = await offlineQueue.open();
+        if (!db) {
+            offlineQueue.memoria.push(registro);
+            return;
+        }
+        await offlineQueue.store('readwrite', store => store.put(registro));
+    },
+
+    list: async () => {
+        const db = await offlineQueue.open();
+        if (!db) return [...offlineQueue.memoria];
+        return await offlineQueue.store('readonly', store => store.getAll()) || [];
+    },
+
+    remove: async (claves) => {
+        const db = await offlineQueue.open();
+        if (!db) {
+            offlineQueue.memoria = offlineQueue.memoria.filter(r => !claves.includes(r.clave));
+            return;
+        }
+        await offlineQueue.store('readwrite', store => {
+            claves.forEach(clave => store.delete(clave));
+            return null;
+        });
+    },
+
+    // Sube la cola por lotes. Retorna {clave: resultado} de lo que el servidor
+    // procesó, o null si no hubo conexión (los registros siguen en la cola)
+    sync: () => {
+        if (offlineQueue.sincronizando) return offlineQueue.sincronizando;
+
+        offlineQueue.sincronizando = (async () => {
+            const resultados = {};
+            try {
+                const pendientes = await offlineQueue.list();
+                for (let i = 0; i < pendientes.length; i += offlineQueue.LOTE) {
+                    const lote = pendientes.slice(i, i + offlineQueue.LOTE);
+                    let response;
+                    try {
+                        response = await fetch('/api/registrar/lote', {
+                            method: 'POST',
+                            headers: { 'Content-Type': 'application/json' },
+                            body: JSON.stringify({ registros: lote })
+                        });
+                    } catch (error) {
+                        console.warn('⚠️ Sin conexión, la cola se enviará más tarde');
+                        return null;
+                    }
+                    if (!response.ok) {
+                        console.error(`❌ Error al subir la cola: HTTP ${response.status}`);
+                        return null;
+                    }
+
+                    const data = await response.json();
+                    data.resultados.forEach(resultado => {
+                        resultados[resultado.clave] = resultado;
+                    });
+                    // Creados, duplicados y rechazados ya no se reintentan
+                    await offlineQueue.remove(data.resultados.map(r => r.clave));
+                    console.log('✅ Cola sincronizada:', data.resumen);
+                }
+                return resultados;
+            } finally {
+                offlineQueue.sincronizando = null;
+            }
+        })();
+
+        return offlineQueue.sincronizando;
+    }
+};
+
 // UI
 const ui = {
     updateCompanyInfo: (config) => {
@@ -207,6 +346,19 @@ const ui = {
         window.scrollTo({ top: 0, behavior: 'smooth' });
     },
 
+    // Campos que completa el servidor con la nómina: deshabilitados no se envían ni se validan
+    setRosterFields: (desdeNomina, nombre = '') => {
+        [elements.nombresApellidos, elements.ruta].forEach(input => {
+            if (!input || (!desdeNomina && !input.dataset.nomina)) return;
+            input.disabled = desdeNomina;
+            input.required = !desdeNomina;
+            input.value = desdeNomina && input === elements.nombresApellidos ? nombre : '';
+            input.placeholder = desdeNomina ? 'Se toma de la nómina' : '';
+            input.classList.remove('is-invalid', 'is-valid');
+            if (desdeNomina) input.dataset.nomina = '1'; else delete input.dataset.nomina;
+        });
+    },
+
     validateForm: () => {
         const inputs = elements.registrationForm.querySelectorAll('input[required], select[required]');
         let isValid = true;
@@ -256,12 +408,15 @@ const eventHandlers = {
                 return;
             }
         } catch {
-            utils.hideLoading();
-            utils.showNotification('Error al verificar el estado del sistema.', 'danger');
-            return;
+            // ✅ Sin conexión: si la capacitación ya estaba cargada, el registro
+            // se guarda en el dispositivo y se envía después
+            if (!appState.configuration) {
+                utils.hideLoading();
+                utils.showNotification('Error al verificar el estado del sistema.', 'danger');
+                return;
+            }
         }
 
-        const formData = new FormData();
         const ciudadSeleccionada = elements.ciudad.value.trim();
         
         if (!ciudadSeleccionada) {
@@ -270,18 +425,24 @@ const eventHandlers = {
             return;
         }
 
-        formData.append('nombres_apellidos', elements.nombresApellidos.value.trim());
-        formData.append('tipodocumento', elements.tipodocumento.value.trim());
-        formData.append('numero_documento', elements.numeroDocumento.value.trim());
-        formData.append('cargo', elements.cargo.value.trim());
-        formData.append('ruta', elements.ruta.value.trim());
-        formData.append('ciudad', ciudadSeleccionada);
+        // Los campos tomados de la nómina van vacíos: el servidor los completa
+        const valor = input => input.disabled ? '' : input.value.trim();
+        const registro = {
+            clave: utils.generateKey(),
+            nombres_apellidos: valor(elements.nombresApellidos),
+            tipodocumento: elements.tipodocumento.value.trim(),
+            numero_documento: elements.numeroDocumento.value.trim(),
+            cargo: elements.cargo.value.trim(),
+            ruta: valor(elements.ruta),
+            ciudad: ciudadSeleccionada,
+            configuracion_id: appState.configuration ? appState.configuration.id : null,
+            registrado_en: new Date().toISOString()
+        };
 
         // ✅ CAPTURAR Y ENVIAR FIRMA DEL CANVAS
         if (elements.signatureCanvas) {
             try {
-                const signatureData = elements.signatureCanvas.toDataURL("image/png");
-                formData.append('firma_digital', signatureData);
+                registro.firma_digital = elements.signatureCanvas.toDataURL("image/png");
                 console.log("✅ Firma capturada correctamente");
             } catch (error) {
                 console.error("❌ Error al capturar firma:", error);
@@ -295,11 +456,31 @@ const eventHandlers = {
             elements.submitBtn.disabled = true;
             elements.submitBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Registrando...';
             
-            const result = await api.registerAttendance(formData);
+            // ✅ En línea se registra por /api/registrar (horario y capacitación
+            // activa los valida el servidor); solo sin conexión va a la cola local.
+            // La clave del registro es la de idempotencia: si la respuesta se
+            // perdió, la cola no lo duplica al subirlo
+            const formData = new FormData();
+            ['nombres_apellidos', 'tipodocumento', 'numero_documento', 'cargo', 'ruta', 'ciudad', 'firma_digital']
+                .forEach(campo => formData.append(campo, registro[campo] || ''));
+
+            let data = null;
+            try {
+                data = await api.registerAttendance(formData, registro.clave);
+            } catch (error) {
+                if (!error.sinConexion) throw error;
+                await offlineQueue.add(registro);
+            }
             
             utils.hideLoading();
-            utils.showNotification(result.mensaje, 'success');
-            ui.showSuccessSection(result);
+            if (data) {
+                utils.showNotification('Asistencia registrada exitosamente', 'success');
+                ui.showSuccessSection(data);
+                offlineQueue.sync();
+            } else {
+                utils.showNotification('Sin conexión: el registro quedó guardado en este dispositivo y se enviará automáticamente.', 'warning');
+                ui.showSuccessSection({ asistente: { hora_llegada: new Date().toLocaleTimeString('es-CO', { hour12: false }) } });
+            }
             
             // Limpiar canvas
             if (elements.signatureCanvas) {
@@ -331,6 +512,39 @@ const eventHandlers = {
         }
     },
 
+    // ✅ Autocompletar con la nómina al salir del número de documento
+    handleDocumentChange: async () => {
+        const documento = elements.numeroDocumento.value.trim();
+        ui.setRosterFields(false);
+        if (!documento) return;
+
+        let empleado;
+        try {
+            empleado = await api.getEmployee(documento);
+        } catch (error) {
+            console.warn('⚠️ No se pudo consultar la nómina:', error);
+            return;
+        }
+        if (!empleado || elements.numeroDocumento.value.trim() !== documento) return;
+
+        const asignar = (input, valor) => {
+            if (!input || !valor) return;
+            // Los select solo aceptan valores existentes: agregar la opción si falta
+            if (input.tagName === 'SELECT' && ![...input.options].some(option => option.value === valor)) {
+                input.add(new Option(valor, valor));
+            }
+            input.value = valor;
+            input.classList.remove('is-invalid');
+            input.classList.add('is-valid');
+        };
+
+        asignar(elements.tipodocumento, empleado.tipodocumento);
+        asignar(elements.cargo, empleado.cargo);
+        // Nombre completo y ruta no se exponen: el servidor los toma de la nómina
+        ui.setRosterFields(true, empleado.nombre);
+        utils.showNotification(`Hola ${empleado.nombre}, sus datos se completaron automáticamente.`, 'info');
+    },
+
     handleInputChange: (e) => {
         const input = e.target;
         if (input.value.trim()) {
@@ -350,6 +564,7 @@ window.removeImage = () => {
 
 window.resetForm = () => {
     elements.registrationForm.reset();
+    ui.setRosterFields(false);
     ui.clearFormValidation();
     elements.imagePreview.classList.add('d-none');
     elements.successSection.classList.add('d-none');
@@ -410,6 +625,8 @@ const app = {
         elements.registrationForm.addEventListener('submit', eventHandlers.handleFormSubmit);
         if (elements.firmaDigital) elements.firmaDigital.addEventListener('change', eventHandlers.handleImageChange);
 
+        if (elements.numeroDocumento) elements.numeroDocumento.addEventListener('change', eventHandlers.handleDocumentChange);
+
         const textInputs = [elements.nombresApellidos, elements.tipodocumento, elements.numeroDocumento, elements.cargo, elements.ruta, elements.ciudad];
         textInputs.forEach(input => {
             if (input) {
@@ -417,35 +634,41 @@ const app = {
                 input.addEventListener('blur', eventHandlers.handleInputChange);
             }
         });
+    },
 
-        // ✅ Verificación periódica del estado (cada 30 segundos)
-        setInterval(async () => {
+    // ✅ Aplica una actualización de estado recibida por SSE o por polling
+    applyStatusUpdate: (statusData) => {
+        // ✅ Verificar si hay configuración antes de comparar
+        if (!statusData.configuracion) {
+            if (appState.systemStatus !== false) {
+                appState.systemStatus = false;
+                appState.configuration = null;
+                ui.updateCompanyInfo(null); // ✅ Limpiar campos
+                ui.updateSystemStatus(false, statusData.mensaje || 'No hay capacitaciones programadas');
+            }
+            return;
+        }
+
+        const configCambio = !appState.configuration || appState.configuration.id !== statusData.configuracion.id;
+
+        // ✅ Si el estado o la capacitación cambiaron, actualizar
+        if (statusData.disponible !== appState.systemStatus || configCambio) {
+            appState.systemStatus = statusData.disponible;
+            appState.configuration = statusData.configuracion;
+            ui.updateSystemStatus(statusData.disponible, statusData.mensaje);
+            ui.updateCompanyInfo(statusData.configuracion);
+        }
+    },
+
+    // ✅ Verificación periódica del estado (cada 30 segundos) - respaldo si no hay SSE
+    startStatusPolling: () => {
+        if (appState.pollingTimer) return;
+
+        appState.pollingTimer = setInterval(async () => {
             if (!appState.isLoading) {
                 try {
                     const statusData = await api.getSystemStatus();
-                    
-                    // ✅ Verificar si hay configuración antes de comparar
-                    if (!statusData.configuracion) {
-                        if (appState.systemStatus !== false) {
-                            appState.systemStatus = false;
-                            appState.configuration = null;
-                            ui.updateCompanyInfo(null); // ✅ Limpiar campos
-                            ui.updateSystemStatus(false, statusData.mensaje || 'No hay capacitaciones programadas');
-                        }
-                        return;
-                    }
-                    
-                    // ✅ Si el estado cambió, actualizar
-                    if (statusData.disponible !== appState.systemStatus) {
-                        appState.systemStatus = statusData.disponible;
-                        appState.configuration = statusData.configuracion;
-                        ui.updateSystemStatus(statusData.disponible, statusData.mensaje);
-                        
-                        // Si cambió la configuración, actualizar la info
-                        if (statusData.configuracion) {
-                            ui.updateCompanyInfo(statusData.configuracion);
-                        }
-                    }
+                    app.applyStatusUpdate(statusData);
                 } catch (error) {
                     console.error('Error en verificación periódica:', error);
                     // ✅ No mostrar errores en verificaciones periódicas para no molestar al usuario
@@ -454,10 +677,48 @@ const app = {
         }, 30000);
     },
 
+    // ✅ Suscripción al canal SSE: el servidor avisa solo cuando cambia el estado
+    subscribeToStatus: () => {
+        if (!window.EventSource) {
+            app.startStatusPolling();
+            return;
+        }
+
+        const source = new EventSource('/api/estado/stream');
+        let erroresSeguidos = 0;
+
+        source.addEventListener('estado', (event) => {
+            erroresSeguidos = 0;
+            try {
+                app.applyStatusUpdate(JSON.parse(event.data));
+            } catch (error) {
+                console.error('Error al procesar evento de estado:', error);
+            }
+        });
+
+        source.onerror = () => {
+            erroresSeguidos += 1;
+            // El navegador reintenta solo; si no logra reconectar, pasar a polling
+            if (source.readyState === EventSource.CLOSED || erroresSeguidos >= 3) {
+                console.warn('⚠️ SSE no disponible, usando verificación periódica');
+                source.close();
+                app.startStatusPolling();
+            }
+        };
+    },
+
     init: () => {
         console.log('🚀 Inicializando aplicación...');
         app.setupEventListeners();
         app.loadInitialState();
+        app.subscribeToStatus();
+
+        // ✅ Subir lo que haya quedado en la cola local
+        offlineQueue.sync();
+        window.addEventListener('online', () => offlineQueue.sync());
+        setInterval(() => {
+            if (navigator.onLine) offlineQueue.sync();
+        }, 60000);
 
         // ======================================================
         // 🎨 FIRMA DIGITAL (CANVAS) - OPTIMIZADO PARA MÓVILES
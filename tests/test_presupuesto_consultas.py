@@ -0,0 +1,34 @@
+"""
+Presupuesto de consultas SQL por endpoint (ver benchmarks/presupuesto_consultas.py).
+
+Cada endpoint se mide con dos tamaños de base: debe responder sin error,
+quedarse dentro de su máximo, no repetir sentencias con los mismos
+parámetros y no crecer con los datos.
+"""
+import pytest
+
+from benchmarks.presupuesto_consultas import PRESUPUESTOS, configuracion_prueba, medir, problemas
+
+TAMANOS = (3, 30)
+
+
+@pytest.fixture(scope='module')
+def mediciones(tmp_path_factory):
+    directorio = str(tmp_path_factory.mktemp('presupuesto_consultas'))
+    config = configuracion_prueba(directorio)
+    return {tamano: medir(tamano, config, directorio) for tamano in TAMANOS}
+
+
+@pytest.mark.parametrize('nombre', list(PRESUPUESTOS))
+def test_endpoint_dentro_del_presupuesto(mediciones, nombre):
+    encontrados = problemas(nombre, mediciones)
+    detalle = mediciones[TAMANOS[-1]][nombre][1].resumen()
+    assert not encontrados, f"{nombre}: {'; '.join(encontrados)}\n{detalle}"
+
+
+def test_registrar_cuenta_las_escrituras_del_escritor(mediciones):
+    # Con SQLite el INSERT corre en el hilo del escritor; igual se cuenta en la petición
+    _, registro = mediciones[TAMANOS[0]]['registrar']
+    sentencias = [sql for sql, _, _ in registro.sentencias]
+    assert any(sql.startswith('INSERT INTO asistentes') for sql in sentencias), registro.resumen()
+    assert any(sql.startswith('SAVEPOINT') for sql in sentencias), registro.resumen()